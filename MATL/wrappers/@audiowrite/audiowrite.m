@@ -4,7 +4,7 @@ function varargout = audiowrite(varargin)
     % The filename is input #1. We want to replace this with the filename
     % that we actually want/need.
     filename = generateUniqueFilename(pwd, 'audio', '.wav');
-    builtin('disp', ['[AUDIO]', filename])
+    matlFrame('AUDIO', filename)
 
     [varargout{1:nargout}] = builtin('audiowrite', filename, varargin{2:end});
 end
@@ -1,5 +1,7 @@
 function varargout = clc(varargin)
-    % Writes a [CLC] to stdout when executed to alert any listeners
+    % Emits a CLC record when executed to alert any listeners
 
-    builtin('disp', '[CLC]')
+    % Figures which haven't been printed yet would be cleared right away
+    matlFigures('DISCARD')
+    matlFrame('CLC')
 end
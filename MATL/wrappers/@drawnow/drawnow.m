@@ -21,15 +21,7 @@ function varargout = drawnow(varargin)
         % calls to drawnow just pass through to the built-in
         [varargout{1:nargout}] = builtin('drawnow', varargin{:});
     else
-        % Set this so that we dont' try to re-print on every internal call
-        % to drawnow
-        set(currentFigure, 'UserData', 1)
-
-        filename = generateUniqueFilename(pwd, 'image', '.png');
-        builtin('disp', (['[IMAGE]', filename]))
-        print(currentFigure, filename, '-dpng', '-r72');
-
-        % Release this status so we're ready to print again if necessary
-        set(currentFigure, 'UserData', 0)
+        % Print the figure now or once output is sent (see matlFigures)
+        matlFigures('DRAW', currentFigure)
     end
 end
@@ -7,9 +7,9 @@ function fprintf(fid, varargin)
 
     switch fid
         case 1
-            builtin('disp', ['[STDOUT]', sprintf(varargin{:})]);
+            matlFrame('STDOUT', sprintf(varargin{:}));
         case 2
-            builtin('disp', ['[STDERR]', sprintf(varargin{:})]);
+            matlFrame('STDERR', sprintf(varargin{:}));
         otherwise
             builtin('fprintf', fid, varargin{:});
     end
@@ -11,6 +11,6 @@ function varargout = imwrite(varargin)
     % Filename is going to be input #2. We want to replace this with the
     % filename that we actually want
     varargin{filename_ind} = generateUniqueFilename(pwd, 'image', '.png');
-    builtin('disp', ['[IMAGE_NN]', varargin{filename_ind}])
+    matlFrame('IMAGE_NN', varargin{filename_ind})
     [varargout{1:nargout}] = builtin('imwrite', varargin{:});
 end
@@ -38,6 +38,8 @@ function result = input(prompt, varargin)
         end
     end
 
+    matlDeadline('CHECK');
+
     if isempty(values) || ~iscell(values)
         error('Unable to fetch user input');
     end
@@ -1,5 +1,5 @@
 function varargout = pause(varargin)
-    % Writes a [PAUSE] to stdout when executed to alert any listeners
+    % Emits a PAUSE record when executed to alert any listeners
 
     % Special wrapper to prevent the symbolic package from emitting a
     % stream of pause events while it waits for input.
@@ -9,7 +9,8 @@ function varargout = pause(varargin)
         return;
     end
 
-    % Flush the output before calling pause
-    builtin('disp', '[PAUSE]')
+    % Flush the output (including any figures) before calling pause
+    matlFigures('RENDER')
+    matlFrame('PAUSE')
     [varargout{1:nargout}] = builtin('pause', varargin{:});
 end
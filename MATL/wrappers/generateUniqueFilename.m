@@ -1,15 +1,41 @@
 function name = generateUniqueFilename(folder, prefix, extension)
     % Helper function for generating a unique filename
+    %
+    %   Files are numbered consecutively (starting at 0) for each prefix and
+    %   extension just in case we care at the other end. The next number is
+    %   remembered so that each call only needs to check a single name
+    %   (unless the program created such a file itself).
+    %
+    %   generateUniqueFilename('RESET') restarts the numbering, which is done
+    %   by matl_runner at the start of every run.
 
-    % Anonymous function to generate the name. We keep them numbered
-    % consecutively just in case we care at the other end
+    persistent counters
+
+    if isempty(counters) || strcmp(folder, 'RESET')
+        counters = containers.Map();
+
+        if nargin == 1
+            return;
+        end
+    end
+
+    % Anonymous function to generate the name
     generateName = @(x)fullfile(folder, [prefix, num2str(x), extension]);
 
+    key = [prefix, extension];
+
+    if isKey(counters, key)
+        k = counters(key);
+    else
+        k = 0;
+    end
+
     % Increment until we find an available name
-    k = 0;
     while exist(generateName(k), 'file')
         k = k + 1;
     end
 
+    counters(key) = k + 1;
+
     name = generateName(k);
 end
@@ -0,0 +1,16 @@
+function matlCleanup()
+    % matlCleanup - Remove everything a program leaves behind after a run
+
+    % Flush all inputs so they don't stick around to the next run
+    input('clear');
+
+    % Remove the time limit of the last case
+    matlDeadline('SET', 0);
+
+    % Turn off all listeners for printing figures. Trick drawnow into
+    % thinking that they are printing which will just do a normal
+    % drawnow rather than trying to save
+    figs = findall(0, 'type', 'figure');
+    set(figs, 'UserData', 1)
+    delete(figs)
+end
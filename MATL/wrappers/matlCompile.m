@@ -0,0 +1,49 @@
+function compiled = matlCompile(flags, command, cached)
+    % matlCompile - Compile a program (without running it) unless it is cached
+    %
+    %   Returns the cached compiled program if it exists. Otherwise the
+    %   program is compiled into the current directory of the run (which is
+    %   still empty since nothing has run yet) and, if cached is not empty,
+    %   added to the cache at that path right away. Nothing that the program
+    %   writes while it runs can therefore end up in the cache.
+
+    if ~isempty(cached) && exist(cached, 'file')
+        compiled = cached;
+        return;
+    end
+
+    matl(strrep(flags, 'r', 'c'), command)
+
+    files = dir('*.m');
+    if isempty(files)
+        error('MATL:compile', 'Unable to compile the program');
+    end
+
+    [~, order] = sort([files.datenum]);
+    compiled = fullfile(pwd, files(order(end)).name);
+
+    if ~isempty(cached)
+        cacheProgram(compiled, cached);
+    end
+end
+
+function cacheProgram(compiled, cached)
+    % Other workers may add the same program at the same time, so the
+    % program is copied to a temporary file which is then renamed
+    temporary = sprintf('%s.%d.tmp', cached, getpid());
+
+    try
+        folder = fileparts(cached);
+        if ~exist(folder, 'dir')
+            mkdir(folder);
+        end
+
+        copyfile(compiled, temporary);
+        rename(temporary, cached);
+    catch
+        % The program still runs when it can't be cached
+        if exist(temporary, 'file')
+            delete(temporary);
+        end
+    end
+end
@@ -0,0 +1,27 @@
+function matlDeadline(action, seconds)
+    % matlDeadline - Cooperative time limit of the current case
+    %
+    %   matlDeadline('SET', seconds) starts the time limit of a case. A
+    %   limit of zero removes the time limit.
+    %
+    %   matlDeadline('CHECK') throws an error once the time limit has
+    %   passed. Octave can't interrupt a running program by itself, so this
+    %   is checked whenever the program produces output or reads an input.
+    %   Programs which do neither are stopped by the time limit of the task.
+
+    persistent deadline
+
+    switch action
+        case 'SET'
+            if seconds > 0
+                deadline = tic() + seconds * 1e6;
+            else
+                deadline = [];
+            end
+        case 'CHECK'
+            if ~isempty(deadline) && tic() > deadline
+                deadline = [];
+                error('MATL:timeout', 'Case timed out');
+            end
+    end
+end
@@ -0,0 +1,10 @@
+function matlError(ME)
+    % matlError - Send the message of an error to the worker (one record per line)
+
+    pieces = regexp(ME.message, '\n', 'split');
+    for k = 1:numel(pieces)
+        if ~isempty(strtrim(pieces{k}))
+            matlFrame('STDERR', pieces{k})
+        end
+    end
+end
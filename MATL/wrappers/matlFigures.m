@@ -0,0 +1,64 @@
+function matlFigures(action, varargin)
+    % matlFigures - Render figures to images which are sent to the worker
+    %
+    %   matlFigures('MODE', mode) sets the render mode for a run:
+    %
+    %       eager   Every call to drawnow prints the figure right away
+    %       lazy    drawnow only marks the figure as dirty and dirty figures
+    %               are printed once the output is about to be sent
+    %               (pause and the end of the program)
+    %
+    %   matlFigures('DRAW', fig) is called by drawnow for a figure.
+    %
+    %   matlFigures('RENDER') prints all dirty figures.
+    %
+    %   matlFigures('DISCARD') forgets about all dirty figures. This is used
+    %   by clc since the images would be cleared right away.
+
+    persistent mode dirty
+
+    if isempty(mode)
+        mode = 'eager';
+    end
+
+    switch action
+        case 'MODE'
+            mode = varargin{1};
+            dirty = [];
+        case 'DRAW'
+            fig = varargin{1};
+
+            if strcmp(mode, 'lazy')
+                % Figures are printed in the order they were first drawn
+                if ~any(dirty == fig)
+                    dirty(end+1) = fig;
+                end
+            else
+                printFigure(fig);
+            end
+        case 'RENDER'
+            figs = dirty;
+            dirty = [];
+
+            for k = 1:numel(figs)
+                if ishghandle(figs(k))
+                    printFigure(figs(k));
+                end
+            end
+        case 'DISCARD'
+            dirty = [];
+    end
+end
+
+function printFigure(fig)
+    % Set this so that we don't try to re-print on every internal call to
+    % drawnow
+    set(fig, 'UserData', 1)
+
+    filename = generateUniqueFilename(pwd, 'image', '.png');
+    matlFrame('IMAGE', filename)
+    print(fig, filename, '-dpng', '-r72');
+
+    % Release this status so we're ready to print again if necessary
+    set(fig, 'UserData', 0)
+end
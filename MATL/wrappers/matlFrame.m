@@ -0,0 +1,39 @@
+function matlFrame(type, payload)
+    % matlFrame - Emit a framed record which is decoded by the worker
+    %
+    %   Events (output to stdout/stderr, images, pauses, etc.) are sent to
+    %   the worker as records which each occupy a single line of output:
+    %
+    %       <RS><token> <type> <length> <payload><ETX>
+    %
+    %   The length is the number of bytes in the payload. Percent
+    %   signs, newlines and carriage returns within the payload are
+    %   percent-encoded so that a record never spans multiple lines. The
+    %   record ends with ETX rather than a whitespace character, since the
+    %   worker receives each line with any trailing whitespace removed.
+    %
+    %   The token is provided by the worker for every run (via
+    %   matlFrame('TOKEN', token)) so that regular output of a program is
+    %   never mistaken for a record.
+
+    persistent token
+
+    if nargin < 2
+        payload = '';
+    end
+
+    if strcmp(type, 'TOKEN')
+        token = payload;
+        return;
+    end
+
+    % Output is where the time limit of a case is enforced
+    matlDeadline('CHECK');
+
+    escaped = strrep(payload, '%', '%25');
+    escaped = strrep(escaped, char(10), '%0A');
+    escaped = strrep(escaped, char(13), '%0D');
+
+    builtin('disp', [char(30), token, ' ', type, ' ', ...
+                     num2str(numel(payload)), ' ', escaped, char(3)]);
+end
@@ -0,0 +1,17 @@
+function matlRun(compiled)
+    % matlRun - Run a compiled program in a workspace of its own
+    %
+    %   source is used rather than run since run changes to the directory
+    %   of the program, which may be the cache rather than the directory
+    %   of the run.
+    %
+    %   MATL's own run step reports errors of a program under a
+    %   "MATL run-time error:" heading, so errors of a compiled program are
+    %   reported the same way (see matlError).
+
+    try
+        source(compiled);
+    catch ME
+        error('MATL:runtime', 'MATL run-time error:\n%s', ME.message);
+    end
+end
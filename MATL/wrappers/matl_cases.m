@@ -0,0 +1,51 @@
+function matl_cases(token, render, flags, command, cached, timeout, varargin)
+    % matl_cases - Run a program once for each of several sets of inputs
+    %
+    %   This behaves like matl_runner except that every additional argument
+    %   is a cell array with the inputs of one case. The program is parsed
+    %   and compiled only once (or not at all if it is cached, see
+    %   matlCompile) and the compiled program is then run for each case in
+    %   turn.
+    %
+    %   A CASE record (with the zero-based index of the case) precedes the
+    %   output of each case. Each case may run for at most timeout seconds
+    %   (see matlDeadline) and an error within a case doesn't affect the
+    %   remaining cases.
+
+    matlFrame('TOKEN', token);
+    matlFigures('MODE', render);
+    generateUniqueFilename('RESET');
+    matlDeadline('SET', 0);
+
+    warning off %#ok
+
+    if iscell(command)
+        command = strjoin(command, '\n');
+    end
+
+    try
+        compiled = matlCompile(flags, command, cached);
+    catch ME
+        matlError(ME);
+        matlCleanup();
+        return;
+    end
+
+    for k = 1:numel(varargin)
+        matlFrame('CASE', num2str(k - 1));
+
+        input('INIT', varargin{k}{:});
+        matlDeadline('SET', timeout);
+
+        try
+            matlRun(compiled);
+        catch ME
+            matlDeadline('SET', 0);
+            matlError(ME);
+        end
+
+        matlDeadline('SET', 0);
+        matlFigures('RENDER');
+        matlCleanup();
+    end
+end
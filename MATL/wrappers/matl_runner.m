@@ -1,4 +1,4 @@
-function matl_runner(flags, command, varargin)
+function matl_runner(token, render, flags, command, cached, varargin)
     % matl_runner - Wrapper function for dealing with MATL gracefully
     %
     %   We have to wrap calls to MATL for two primary reasons:
@@ -8,6 +8,22 @@ function matl_runner(flags, command, varargin)
     %
     %   This function serves both of these functions and allows us to use
     %   the MATL source directly without any modification.
+    %
+    %   The token is used to frame all records sent to the worker for this
+    %   run (see matlFrame) and render is the mode used to render figures
+    %   (see matlFigures).
+    %
+    %   If cached is not empty, the program is compiled separately so that
+    %   the compiled program can be cached at that path (see matlCompile).
+
+    matlFrame('TOKEN', token);
+    matlFigures('MODE', render);
+
+    % Number the images and audio of this run from zero again
+    generateUniqueFilename('RESET');
+
+    % Don't inherit the time limit of a case which was interrupted
+    matlDeadline('SET', 0);
 
     % If any inputs are provided, go ahead and fill up the inputs queue
     input('INIT', varargin{:});
@@ -22,29 +38,19 @@ function matl_runner(flags, command, varargin)
 
     try
         % Execute the command
-        matl(flags, command)
+        if isempty(cached)
+            matl(flags, command)
+        else
+            matlRun(matlCompile(flags, command, cached));
+        end
     catch ME
         % Ensure that we cleanup everything in case of an error
-        pieces = regexp(ME.message, '\n', 'split');
-        for k = 1:numel(pieces)
-            if ~isempty(strtrim(pieces{k}))
-                builtin('disp', ['[STDERR]', pieces{k}])
-            end
-        end
+        matlError(ME);
     end
 
+    % Send any figures which haven't been rendered yet
+    matlFigures('RENDER');
+
     % Clean up necessary pieces
-    cleanup();
-
-    function cleanup()
-        % Flush all inputs so they don't stick around to the next run
-        input('clear');
-
-        % Turn off all listeners for printing figures. Trick drawnow into
-        % thinking that they are printing which will just do a normal
-        % drawnow rather than trying to save
-        figs = findall(0, 'type', 'figure');
-        set(figs, 'UserData', 1)
-        delete(figs)
-    end
+    matlCleanup();
 end
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Measure the latency of explanations while a backlog of runs is queued.
+
+A backlog of slow interactive runs is queued first and explanations are then
+requested one at a time, like the /explain route does. With explanations
+routed to their own queue (and workers), their latency doesn't depend on the
+backlog. This requires the broker and the workers to be running.
+
+    python -m benchmarks.explain_latency --version 23.0.0 --backlog 200
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from matl_online.app import create_app
+from matl_online.tasks import matl_task
+from matl_online.types import MATLExplainTaskParameters, MATLRunTaskParameters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--version", required=True)
+    parser.add_argument("--backlog", type=int, default=200)
+    parser.add_argument("--explanations", type=int, default=20)
+    # A program which takes a while (it pauses for a second, five times)
+    parser.add_argument("--code", default='5:"1Y.')
+    args = parser.parse_args()
+
+    create_app()
+
+    # Runs with a session are interactive (their output is simply not read)
+    backlog = [
+        matl_task.delay(
+            MATLRunTaskParameters(
+                code=args.code, version=args.version, session_id=uuid.uuid4().hex
+            )
+        )
+        for _ in range(args.backlog)
+    ]
+
+    latencies = []
+
+    for _ in range(args.explanations):
+        start = time.perf_counter()
+        matl_task.delay(
+            MATLExplainTaskParameters(code=args.code, version=args.version)
+        ).get(timeout=600)
+        latencies.append(time.perf_counter() - start)
+
+    pending = sum(not result.ready() for result in backlog)
+
+    print(f"runs still queued or running: {pending} of {args.backlog}")
+    print(f"explain latency median: {statistics.median(latencies) * 1000:8.1f} ms")
+    print(f"explain latency max:    {max(latencies) * 1000:8.1f} ms")
+
+    for result in backlog:
+        result.revoke()
+
+
+if __name__ == "__main__":
+    main()
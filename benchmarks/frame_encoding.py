@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Compare the JSON and msgpack encodings of output frames.
+
+Frames are generated for a few representative kinds of programs and each
+encoding reports the bytes sent to the browser (with and without
+permessage-deflate) and the time spent encoding the frames.
+
+    python -m benchmarks.frame_encoding --frames 2000
+"""
+
+import argparse
+import base64
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, List
+
+from matl_online.encoding import encode_frame
+
+Frame = Dict[str, Any]
+
+IMAGE = "data:image/png;base64," + base64.b64encode(bytes(range(256)) * 8).decode()
+
+
+def _frames(items: Callable[[int], List[Dict[str, str]]], count: int) -> List[Frame]:
+    return [
+        {"data": items(seq), "session": "a" * 32, "seq": seq, "reset": False}
+        for seq in range(count)
+    ]
+
+
+CORPORA: Dict[str, Callable[[int], List[Frame]]] = {
+    # A loop printing a number and pausing
+    "counter": lambda count: _frames(
+        lambda seq: [{"type": "stdout", "value": f"\n{seq}"}], count
+    ),
+    # Large text output (i.e. printing a matrix)
+    "matrix": lambda count: _frames(
+        lambda seq: [
+            {
+                "type": "stdout",
+                "value": "\n".join(
+                    " ".join(f"{(seq * row + col) % 997:4d}" for col in range(40))
+                    for row in range(25)
+                ),
+            }
+        ],
+        count,
+    ),
+    # An animation where each frame is an artifact URL
+    "animation": lambda count: _frames(
+        lambda seq: [
+            {"type": "image", "value": f"/artifacts/{seq:064x}.png"},
+            {"type": "stdout", "value": f"\nframe {seq}"},
+        ],
+        count,
+    ),
+    # Images embedded as data URIs (the inline artifact store)
+    "inline": lambda count: _frames(
+        lambda seq: [{"type": "image", "value": IMAGE}], count
+    ),
+    # Errors mixed with output
+    "errors": lambda count: _frames(
+        lambda seq: [
+            {"type": "stdout", "value": f"\nvalue {seq}"},
+            {"type": "stderr", "value": f"Error using ==> index {seq}"},
+        ],
+        count,
+    ),
+}
+
+
+def deflated(data: bytes) -> int:
+    """Size of a message compressed with permessage-deflate (raw deflate)."""
+    compressor = zlib.compressobj(wbits=-15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def measure(frames: List[Frame], encoding: str) -> Dict[str, float]:
+    start = time.perf_counter()
+
+    if encoding == "json":
+        messages = [b"42" + json.dumps(["status", frame]).encode() for frame in frames]
+    else:
+        # A placeholder packet followed by the binary attachment
+        placeholder = b'451-["status",{"_placeholder":true,"num":0}]'
+        messages = []
+        for frame in frames:
+            encoded = encode_frame(frame, encoding)
+            assert isinstance(encoded, bytes)
+            messages.extend([placeholder, encoded])
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "bytes": sum(len(message) for message in messages),
+        "deflated": sum(deflated(message) for message in messages),
+        "seconds": elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'corpus':>10} {'encoding':>8} {'bytes':>12} {'deflated':>12} {'ms':>8}")
+
+    for name, corpus in CORPORA.items():
+        frames = corpus(args.frames)
+
+        for encoding in ("json", "msgpack"):
+            result = measure(frames, encoding)
+            print(
+                f"{name:>10} {encoding:>8} {result['bytes']:12,.0f} "
+                f"{result['deflated']:12,.0f} {result['seconds'] * 1000:8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
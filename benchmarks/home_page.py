@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Measure the requests per second served by the home page.
+
+Requests are made with the Flask test client against the configured database
+(which should contain the releases) with the page cache disabled and enabled.
+The assets need to have been built since the page is fully rendered.
+
+    python -m benchmarks.home_page --requests 500
+"""
+
+import argparse
+import time
+
+from flask import Flask
+
+from matl_online.app import create_app
+from matl_online.public.cache import invalidate
+
+
+def run(app: Flask, app_requests: int, ttl: float) -> None:
+    app.config["PAGE_CACHE_TTL"] = ttl
+
+    with app.app_context():
+        invalidate()
+
+    client = app.test_client()
+
+    # Warm up the templates (and the cache)
+    client.get("/")
+
+    start = time.perf_counter()
+
+    for index in range(app_requests):
+        response = client.get("/", query_string={"code": str(index)})
+        assert response.status_code == 200
+
+    elapsed = time.perf_counter() - start
+
+    name = "cached" if ttl else "uncached"
+    print(f"{name:>8}: {app_requests / elapsed:8.1f} requests/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    # The metrics of an application can only be registered once
+    app = create_app()
+
+    run(app, args.requests, 0)
+    run(app, args.requests, 300)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""Compare resending all output with sending deltas on every pause.
+
+Simulates a MATL program which prints a line and pauses many times and reports
+the total time spent and the number of bytes sent to the client.
+
+    python -m benchmarks.output_frames --frames 10000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import matl_online.app  # noqa: F401 (resolves the import order of the package)
+from matl_online import tasks
+from matl_online.emitter import CoalescingEmitter
+from matl_online.matl.io import TEXT, parse_matl_results
+from matl_online.tasks import OctaveTask, OutputHandler
+
+
+class RecordingSocket:
+    """Stand-in for the socket which only records the size of each frame."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+
+    def emit(self, event: str, payload: Dict[str, Any], **_: Any) -> None:
+        self.frames += 1
+        self.bytes += len(json.dumps(payload))
+
+
+class LegacyOutputHandler(OutputHandler):
+    """Previous behavior which parses and sends everything at each pause."""
+
+    contents: List[str]
+
+    def clear(self) -> None:
+        super().clear()
+        self.contents = []
+
+    def add(self, message: str, kind: str) -> None:
+        super().add(message, kind)
+        self.contents.append(message if kind == TEXT else f"[{kind}]{message}")
+
+    def send(self, final: bool = False) -> None:
+        output = parse_matl_results("\n".join(self.contents))
+        result = {"data": output, "session": self.task.session_id}
+        tasks.emitter.send("status", result, room=self.task.session_id)
+
+
+def run(handler_class: Callable[[OctaveTask], OutputHandler], frames: int) -> None:
+    recorder = RecordingSocket()
+    # Every frame is sent to isolate the effect of the frame contents
+    tasks.emitter = CoalescingEmitter(recorder.emit)
+
+    task = OctaveTask()
+    task.session_id = "benchmark"
+    handler = handler_class(task)
+
+    pause = handler.decoder.encode("PAUSE")
+
+    lines: List[str] = []
+    for index in range(frames):
+        lines.append(f"iteration {index}: {'#' * (index % 40)}")
+        lines.append(pause)
+
+    start = time.perf_counter()
+
+    # The handler echoes every message which is not of interest here
+    with contextlib.redirect_stdout(io.StringIO()):
+        for line in lines:
+            handler.process_message(line)
+
+        handler.send(final=True)
+
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{handler_class.__name__:>20}: {elapsed:8.3f} s, "
+        f"{recorder.frames} frames, {recorder.bytes / 1e6:10.2f} MB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=10000)
+    args = parser.parse_args()
+
+    for handler_class in (OutputHandler, LegacyOutputHandler):
+        run(handler_class, args.frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Compare the regex-based and single-pass parsers on large outputs.
+
+Besides parsing the complete output once, each parser is used the way a run
+with periodic flushes does: the regex parser re-parses everything produced so
+far while the incremental parser only handles the new lines.
+
+    python -m benchmarks.parse_output --size 5000000 --flushes 100
+"""
+
+import argparse
+import re
+import time
+from typing import Callable, Dict, List
+
+import matl_online.app  # noqa: F401 (resolves the import order of the package)
+from matl_online.matl.io import MATLOutputParser, parse_matl_results, process_part
+
+
+def parse_with_regex(output: str) -> List[Dict[str, str]]:
+    """The original regex-based implementation of parse_matl_results."""
+    result = list()
+
+    for part in re.split(r"(\[.*?][^\n].*\n?)", output):
+        if part == "":
+            continue
+
+        item = process_part(part)
+
+        if item:
+            result.append(item)
+
+    return result
+
+
+def flush_with_regex(lines: List[str], flushes: int) -> None:
+    step = max(len(lines) // flushes, 1)
+
+    for end in range(step, len(lines) + step, step):
+        parse_with_regex("\n".join(lines[:end]))
+
+
+def flush_incrementally(lines: List[str], flushes: int) -> None:
+    step = max(len(lines) // flushes, 1)
+    parser = MATLOutputParser()
+
+    for index, line in enumerate(lines, start=1):
+        parser.feed_line(line)
+
+        if index % step == 0:
+            parser.flush()
+
+    parser.flush(final=True)
+
+
+def generate(size: int, pattern: Callable[[int], str]) -> List[str]:
+    lines = []
+    total = 0
+    index = 0
+
+    while total < size:
+        line = pattern(index)
+        lines.append(line)
+        total += len(line) + 1
+        index += 1
+
+    return lines
+
+
+def timed(function: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+OUTPUTS: Dict[str, Callable[[int], str]] = {
+    "stdout": lambda index: f"{index} " + "x" * 40,
+    "mixed": lambda index: ("[STDERR]" if index % 3 == 0 else "") + f"{index} [a]b",
+    "long lines": lambda index: "[STDOUT]" + "y" * 10000,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=5_000_000)
+    parser.add_argument("--flushes", type=int, default=100)
+    args = parser.parse_args()
+
+    for name, pattern in OUTPUTS.items():
+        lines = generate(args.size, pattern)
+        output = "\n".join(lines)
+
+        results = {
+            "regex": timed(lambda: parse_with_regex(output)),
+            "single pass": timed(lambda: parse_matl_results(output)),
+            "regex (flushes)": timed(lambda: flush_with_regex(lines, args.flushes)),
+            "incremental (flushes)": timed(
+                lambda: flush_incrementally(lines, args.flushes)
+            ),
+        }
+
+        for method, elapsed in results.items():
+            print(f"{name:>12} {method:>22}: {elapsed:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Compare rendering figures on every drawnow with rendering them lazily.
+
+Runs a plotting MATL program with each render mode and reports the time spent
+and the number of images that were rendered. This requires Octave and the
+source of the requested MATL version.
+
+    python -m benchmarks.render_figures --version 22.7.4 --code '50:"@:XG]'
+"""
+
+import argparse
+import pathlib
+import tempfile
+import time
+from typing import List
+
+import matl_online.app  # noqa: F401 (resolves the import order of the package)
+from matl_online.matl.core import matl
+from matl_online.matl.io import FrameDecoder
+from matl_online.octave import OctaveSession
+from matl_online.settings import config
+from matl_online.types import MATLRunTaskParameters
+
+
+def run(
+    octave: OctaveSession, params: MATLRunTaskParameters, mode: str, repeat: int
+) -> None:
+    config.MATL_RENDER_MODE = mode
+
+    decoder = FrameDecoder()
+    images: List[str] = []
+
+    def line_handler(line: str) -> None:
+        _, record = decoder.decode(line)
+        if record is not None and record[0] == "IMAGE":
+            images.append(record[1])
+
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as folder:
+            matl(
+                octave,
+                params,
+                directory=pathlib.Path(folder),
+                line_handler=line_handler,
+                token=decoder.token,
+            )
+
+    elapsed = (time.perf_counter() - start) / repeat
+
+    print(f"{mode:>6}: {elapsed:8.3f} s per run, {len(images) // repeat} images")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--version", required=True)
+    parser.add_argument("--code", default='50:"@:XG]')
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    octave = OctaveSession(
+        octaverc=config.OCTAVERC, default_paths=[config.MATL_WRAP_DIR]
+    )
+    params = MATLRunTaskParameters(code=args.code, version=args.version)
+
+    # Prime the caches of Octave and the MATL source
+    with tempfile.TemporaryDirectory() as folder:
+        matl(octave, params, directory=pathlib.Path(folder))
+
+    for mode in ("eager", "lazy"):
+        run(octave, params, mode, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
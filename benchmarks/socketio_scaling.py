@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""Load test of the web processes behind the load balancer.
+
+Many Socket.IO clients connect at once (from several processes so the clients
+themselves aren't the bottleneck) and each of them optionally runs a program.
+Every client must receive the output of its own program, which the workers
+send through the message queue to whichever web process holds the connection.
+Some clients kill their program instead, which has to work no matter which
+web process receives the event.
+
+Running it against a single web process and then against several shows how
+the number of connections scales with the web tier:
+
+    WEB_REPLICAS=1 docker compose up -d
+    python -m benchmarks.socketio_scaling --url http://localhost:5000 --clients 2000
+    WEB_REPLICAS=4 docker compose up -d
+    python -m benchmarks.socketio_scaling --url http://localhost:5000 --clients 2000
+"""
+
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import socketio  # type: ignore[import]
+
+Result = Dict[str, Any]
+
+
+class LoadClient:
+    """A client which connects and (optionally) runs or kills a program."""
+
+    def __init__(self, url: str, timeout: float) -> None:
+        self.url = url
+        self.timeout = timeout
+        self.uid: Optional[str] = None
+        self.frames = 0
+        self.connected = threading.Event()
+        self.output = threading.Event()
+        self.complete = threading.Event()
+
+        self.client = socketio.Client(reconnection=False)
+        self.client.on("connection", self.on_connection)
+        self.client.on("status", self.on_status)
+        self.client.on("complete", self.on_complete)
+
+    def on_connection(self, data: Dict[str, Any]) -> None:
+        self.uid = data["session_id"]
+        self.connected.set()
+
+    def on_status(self, data: Any) -> None:
+        self.frames += 1
+        self.output.set()
+
+    def on_complete(self, data: Any) -> None:
+        self.complete.set()
+
+    def connect(self) -> float:
+        start = time.perf_counter()
+        self.client.connect(
+            self.url, transports=["websocket"], wait_timeout=self.timeout
+        )
+
+        if not self.connected.wait(self.timeout):
+            raise TimeoutError("No session ID was received")
+
+        return time.perf_counter() - start
+
+    def run(self, code: str, version: str, kill: bool) -> float:
+        start = time.perf_counter()
+        self.client.emit("submit", {"uid": self.uid, "code": code, "version": version})
+
+        if kill:
+            self.output.wait(self.timeout)
+            self.client.emit("kill", {"uid": self.uid})
+
+        if not self.complete.wait(self.timeout):
+            raise TimeoutError("The program never completed")
+
+        return time.perf_counter() - start
+
+    def close(self) -> None:
+        self.client.disconnect()
+
+
+def _load(options: Dict[str, Any], count: int, offset: int) -> Result:
+    """Connect a share of the clients at once, then run their programs."""
+    clients = [LoadClient(options["url"], options["timeout"]) for _ in range(count)]
+    result: Result = {"connect": [], "run": [], "kill": [], "errors": 0, "frames": 0}
+    lock = threading.Lock()
+
+    def failed() -> None:
+        with lock:
+            result["errors"] += 1
+
+    def connect(client: LoadClient) -> None:
+        try:
+            result["connect"].append(client.connect())
+        except Exception:
+            failed()
+
+    def run(index: int, client: LoadClient) -> None:
+        # Every kill_every-th client kills its program
+        kill = bool(options["kill_every"]) and index % options["kill_every"] == 0
+
+        try:
+            elapsed = client.run(options["code"], options["version"], kill)
+            result["kill" if kill else "run"].append(elapsed)
+        except Exception:
+            failed()
+
+    with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+        list(executor.map(connect, clients))
+
+        live = [client for client in clients if client.connected.is_set()]
+
+        if options["code"]:
+            list(executor.map(run, range(offset, offset + len(live)), live))
+
+        list(executor.map(LoadClient.close, live))
+
+    result["frames"] = sum(client.frames for client in live)
+    return result
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--threads", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=60)
+    # A program printing a few numbers with pauses, so kills arrive mid-run
+    parser.add_argument("--code", default='5:"@D.1Y.')
+    parser.add_argument("--version", default="")
+    parser.add_argument("--kill-every", type=int, default=10)
+    args = parser.parse_args()
+
+    options = {
+        "url": args.url,
+        "timeout": args.timeout,
+        "threads": args.threads,
+        "code": args.code,
+        "version": args.version,
+        "kill_every": args.kill_every,
+    }
+
+    shares = [args.clients // args.processes] * args.processes
+    for index in range(args.clients % args.processes):
+        shares[index] += 1
+
+    offsets = [sum(shares[:index]) for index in range(len(shares))]
+
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.starmap(
+            _load, [(options, share, offset) for share, offset in zip(shares, offsets)]
+        )
+
+    elapsed = time.perf_counter() - start
+
+    connects = [value for result in results for value in result["connect"]]
+    runs = [value for result in results for value in result["run"]]
+    kills = [value for result in results for value in result["kill"]]
+    errors = sum(result["errors"] for result in results)
+    frames = sum(result["frames"] for result in results)
+
+    print(f"clients:              {args.clients} ({errors} errors)")
+    print(f"connections/second:   {len(connects) / elapsed:10.1f}")
+    print(f"connect median:       {_percentile(connects, 0.5) * 1000:10.1f} ms")
+    print(f"connect p95:          {_percentile(connects, 0.95) * 1000:10.1f} ms")
+
+    if args.code:
+        print(f"runs completed:       {len(runs)} ({frames} frames received)")
+        print(f"run p95:              {_percentile(runs, 0.95) * 1000:10.1f} ms")
+        print(f"kills acknowledged:   {len(kills)}")
+        print(f"kill p95:             {_percentile(kills, 0.95) * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
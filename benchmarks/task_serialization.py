@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Compare pickle and the msgpack format of task messages and results.
+
+Each corpus is serialized the way Celery does it (task messages are a tuple of
+args, kwargs and options while results are stored with their metadata) and
+each serializer reports the total bytes and the time spent encoding and
+decoding.
+
+    python -m benchmarks.task_serialization --messages 10000
+"""
+
+import argparse
+import datetime
+import pickle
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from matl_online.serialization import dumps, loads
+from matl_online.types import MATLExplainTaskParameters, MATLRunTaskParameters
+
+OPTIONS = {"callbacks": None, "errbacks": None, "chain": None, "chord": None}
+
+
+def _message(params: Any) -> Any:
+    return ((params,), {}, OPTIONS)
+
+
+def _result(result: Any) -> Any:
+    return {
+        "status": "SUCCESS",
+        "result": result,
+        "traceback": None,
+        "children": [],
+        "date_done": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "task_id": "d5f1b5c6-5f0e-4d55-a1b4-5d2cf0f4b0a1",
+    }
+
+
+CORPORA: Dict[str, Callable[[int], Any]] = {
+    # Programs submitted from the site
+    "interactive": lambda index: _message(
+        MATLRunTaskParameters(
+            code=f"{index}:t!*",
+            version="22.7.4",
+            inputs="[1 2 3]\n'abc'",
+            session_id="a" * 32,
+            encoding="msgpack",
+            client="203.0.113.7",
+        )
+    ),
+    # Explanations of code
+    "explain": lambda index: _message(
+        MATLExplainTaskParameters(code=f"{index}:t!*", version="22.7.4")
+    ),
+    # Programs run for several sets of inputs through /api/run
+    "cases": lambda index: _message(
+        MATLRunTaskParameters(
+            code="i:s", version="22.7.4", cases=tuple(str(n) for n in range(50))
+        )
+    ),
+    # Results of a program printing a few lines
+    "result": lambda index: _result(
+        {
+            "data": [
+                {"type": "stdout", "value": "\n".join(str(n) for n in range(20))},
+                {"type": "stderr", "value": f"Error in line {index}"},
+            ],
+            "session": "a" * 32,
+            "time": 0.25,
+        }
+    ),
+}
+
+SERIALIZERS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "pickle": (pickle.dumps, pickle.loads),
+    "matl": (dumps, loads),
+}
+
+
+def measure(values: List[Any], serializer: str) -> Dict[str, float]:
+    encode, decode = SERIALIZERS[serializer]
+
+    start = time.perf_counter()
+    encoded = [encode(value) for value in values]
+    encoding = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data in encoded:
+        decode(data)
+    decoding = time.perf_counter() - start
+
+    return {
+        "bytes": sum(len(data) for data in encoded),
+        "encode": encoding,
+        "decode": decoding,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(
+        f"{'corpus':>12} {'format':>8} {'bytes':>12} {'encode ms':>10} {'decode ms':>10}"
+    )
+
+    for name, corpus in CORPORA.items():
+        values = [corpus(index) for index in range(args.messages)]
+
+        for serializer in SERIALIZERS:
+            result = measure(values, serializer)
+            print(
+                f"{name:>12} {serializer:>8} {result['bytes']:12,.0f} "
+                f"{result['encode'] * 1000:10.1f} {result['decode'] * 1000:10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Compare the previous and counter-based generateUniqueFilename.
+
+Simulates a program which produces many frames by generating (and creating)
+the filename of each frame within Octave. This requires Octave.
+
+    python -m benchmarks.unique_filenames --frames 2000
+"""
+
+import argparse
+import pathlib
+import tempfile
+
+import matl_online.app  # noqa: F401 (resolves the import order of the package)
+from matl_online.octave import OctaveSession
+from matl_online.settings import config
+
+# The previous implementation which probed every name starting at zero
+PROBING = """
+for n = 1:{frames}
+    k = 0;
+    while exist(fullfile(pwd, ['image', num2str(k), '.png']), 'file')
+        k = k + 1;
+    end
+    fclose(fopen(fullfile(pwd, ['image', num2str(k), '.png']), 'w'));
+end
+"""
+
+COUNTER = """
+generateUniqueFilename('RESET');
+for n = 1:{frames}
+    fclose(fopen(generateUniqueFilename(pwd, 'image', '.png'), 'w'));
+end
+"""
+
+
+def run(octave: OctaveSession, name: str, code: str, frames: int) -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        with octave.current_directory(pathlib.Path(folder)):
+            output = octave.eval(f"tic; {code.format(frames=frames)}; disp(toc)")
+
+        count = len(list(pathlib.Path(folder).iterdir()))
+
+    print(f"{name:>8}: {float(output.strip()):8.3f} s, {count} files")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    octave = OctaveSession(default_paths=[config.MATL_WRAP_DIR])
+
+    run(octave, "probing", PROBING, args.frames)
+    run(octave, "counter", COUNTER, args.frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from typing import Optional, Type
 
 from flask import Flask, got_request_exception
 from rollbar.contrib.flask import report_exception  # type: ignore[import]
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from matl_online import public
 from matl_online.assets import assets
@@ -16,9 +17,14 @@ def create_app(config_object: Optional[Type[Config]] = None) -> Flask:
     """Application factory for creating flask apps."""
     app = Flask(__name__)
     app.config.from_object(config_object or get_config())
+
+    if not app.config.get("SECRET_KEY"):
+        raise RuntimeError("SECRET_KEY has to be set")
+
     register_extensions(app)
     register_blueprints(app)
     register_commands(app)
+    register_proxies(app)
     return app
 
 
@@ -34,6 +40,8 @@ def register_extensions(app: Flask) -> None:
         app,
         message_queue=app.config.get("SOCKETIO_MESSAGE_QUEUE"),
         cors_allowed_origins=app.config.get("CORS_ALLOWED_ORIGINS"),
+        http_compression=True,
+        compression_threshold=app.config.get("SOCKETIO_COMPRESSION_THRESHOLD"),
     )
 
     register_rollbar(app)
@@ -45,6 +53,20 @@ def register_extensions(app: Flask) -> None:
     metrics.info("app_info", "Application info", version=app.config.get("APP_VERSION"))
 
 
+def register_proxies(app: Flask) -> None:
+    """Use the client addresses forwarded by the load balancer (if any).
+
+    This wraps the Socket.IO middleware as well, so the events of a connection
+    have the address of the client too.
+    """
+    proxies = app.config.get("TRUSTED_PROXIES", 0)
+
+    if proxies:
+        app.wsgi_app = ProxyFix(  # type: ignore[method-assign]
+            app.wsgi_app, x_for=proxies, x_proto=proxies
+        )
+
+
 def register_rollbar(app: Flask) -> None:
     rollbar.init(
         app.config.get("ROLLBAR_SERVER_SIDE_TOKEN"),
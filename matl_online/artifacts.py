@@ -0,0 +1,179 @@
+"""Storage of the images and audio produced by MATL programs.
+
+Artifacts are content-addressed so that identical outputs (i.e. redrawing the
+same frame) are only stored once and can be cached indefinitely by browsers.
+Output frames then only contain the URL of each artifact.
+"""
+
+import abc
+import base64
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import tempfile
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+
+import redis
+
+from matl_online.settings import config
+
+CONTENT_TYPES: Dict[str, str] = {
+    ".png": "image/png",
+    ".wav": "audio/wav",
+}
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|wav)$")
+
+
+def artifact_key(data: bytes, extension: str) -> str:
+    return hashlib.sha256(data).hexdigest() + extension
+
+
+def is_artifact_key(key: str) -> bool:
+    return KEY_PATTERN.match(key) is not None
+
+
+def content_type(key: str) -> str:
+    return CONTENT_TYPES[pathlib.PurePath(key).suffix]
+
+
+class ArtifactStore(abc.ABC):
+    """Base class for all artifact stores."""
+
+    def put(self, data: bytes, extension: str) -> str:
+        """Store an artifact and return the URL for retrieving it."""
+        key = artifact_key(data, extension)
+        self.store(key, data)
+        return config.ARTIFACT_URL_PREFIX + key
+
+    @abc.abstractmethod
+    def store(self, key: str, data: bytes) -> None:
+        """Store the data of an artifact under its key."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Retrieve an artifact (if it still exists)."""
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        """Determine the key of an artifact from its URL."""
+        if not url.startswith(config.ARTIFACT_URL_PREFIX):
+            return None
+
+        key = url[len(config.ARTIFACT_URL_PREFIX) :]
+        return key if is_artifact_key(key) else None
+
+
+class InlineArtifactStore(ArtifactStore):
+    """Embeds artifacts directly into the output as data URIs."""
+
+    def put(self, data: bytes, extension: str) -> str:
+        encoded = base64.b64encode(data).decode()
+        return f"data:{CONTENT_TYPES[extension]};base64,{encoded}"
+
+    def store(self, key: str, data: bytes) -> None:
+        # The data is part of the URL, so there is nothing to store
+        pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Stores artifacts on a disk shared by the web servers and the workers."""
+
+    def __init__(self, directory: pathlib.Path, ttl: int) -> None:
+        self.directory = directory
+        self.ttl = ttl
+
+    def store(self, key: str, data: bytes) -> None:
+        filename = self.directory.joinpath(key)
+
+        # Identical artifacts only need their expiration to be extended
+        if filename.is_file():
+            filename.touch()
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Write atomically so that partial artifacts are never served
+        handle, temporary_file = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(handle, "wb") as fid:
+            fid.write(data)
+
+        os.replace(temporary_file, filename)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.directory.joinpath(key).read_bytes()
+        except OSError:
+            return None
+
+    def prune(self) -> int:
+        """Remove all expired artifacts and return how many were removed."""
+        if not self.directory.is_dir():
+            return 0
+
+        cutoff = time.time() - self.ttl
+        removed = 0
+
+        for filename in self.directory.iterdir():
+            if filename.stat().st_mtime < cutoff:
+                filename.unlink(missing_ok=True)
+                removed += 1
+
+        return removed
+
+
+class RedisArtifactStore(ArtifactStore):
+    """Stores artifacts in Redis where they expire automatically.
+
+    Artifacts are embedded into the output while Redis is unavailable.
+    """
+
+    def __init__(self, url: str, ttl: int) -> None:
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    @staticmethod
+    def redis_key(key: str) -> str:
+        return f"artifact:{key}"
+
+    def put(self, data: bytes, extension: str) -> str:
+        try:
+            return super().put(data, extension)
+        except redis.RedisError:
+            logging.exception("Unable to store an artifact")
+            return InlineArtifactStore().put(data, extension)
+
+    def store(self, key: str, data: bytes) -> None:
+        self.client.set(self.redis_key(key), data, ex=self.ttl)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            data = self.client.get(self.redis_key(key))
+        except redis.RedisError:
+            logging.exception("Unable to retrieve an artifact")
+            return None
+
+        return data if isinstance(data, bytes) else None
+
+
+@lru_cache(maxsize=1)
+def get_artifact_store() -> ArtifactStore:
+    """Create the artifact store that is configured for this application."""
+    kind = config.ARTIFACT_STORE.lower()
+
+    if kind == "local":
+        return LocalArtifactStore(
+            pathlib.Path(config.ARTIFACT_DIRECTORY), config.ARTIFACT_TTL
+        )
+    elif kind == "redis":
+        return RedisArtifactStore(config.ARTIFACT_REDIS_URL, config.ARTIFACT_TTL)
+    elif kind == "inline":
+        return InlineArtifactStore()
+
+    raise ValueError(f"Unknown artifact store {config.ARTIFACT_STORE!r}")
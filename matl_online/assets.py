@@ -4,7 +4,7 @@ from flask_assets import Bundle, Environment  # type: ignore
 
 css = Bundle("css/style.css", filters="cleancss", output="public/css/common.css")
 
-js = Bundle("js/main.js", filters="jsmin", output="public/js/common.js")
+js = Bundle("js/frames.js", "js/main.js", filters="jsmin", output="public/js/common.js")
 
 vendor_css = Bundle(
     "vendor/css/bootstrap-drawer.min.css",
@@ -19,9 +19,14 @@ vendor_js = Bundle(
     output="public/vendor/common.js",
 )
 
+bundles = {
+    "js_all": js,
+    "css_all": css,
+    "js_vendor": vendor_js,
+    "css_vendor": vendor_css,
+}
+
 assets = Environment()
 
-assets.register("js_all", js)
-assets.register("css_all", css)
-assets.register("js_vendor", vendor_js)
-assets.register("css_vendor", vendor_css)
+for name, bundle in bundles.items():
+    assets.register(name, bundle)
@@ -1,14 +1,28 @@
 """Custom Flask CLI Commands."""
 
+import click
 from flask import Flask
 
+from matl_online.artifacts import LocalArtifactStore, get_artifact_store
 from matl_online.matl import releases
+from matl_online.public.cache import invalidate
 
 
 def register_commands(app: Flask) -> None:
     """Register custom commands with the flask CLI."""
 
     @app.cli.command(name="refresh_releases", help="Update MATL releases from GitHub")  # type: ignore[untyped-decorator]
-    def refresh_releases() -> None:
+    @click.option("--force", is_flag=True, help="Ignore any cached GitHub responses")
+    def refresh_releases(force: bool) -> None:
         """Command for updating all release information."""
-        releases.refresh_releases()
+        if releases.refresh_releases(force=force):
+            invalidate()
+
+    @app.cli.command(name="clean_artifacts", help="Remove expired program artifacts")  # type: ignore[untyped-decorator]
+    def clean_artifacts() -> None:
+        """Command for removing expired artifacts from local storage."""
+        store = get_artifact_store()
+
+        # Other stores expire their artifacts on their own
+        if isinstance(store, LocalArtifactStore):
+            click.echo(f"Removed {store.prune()} expired artifacts")
@@ -0,0 +1,134 @@
+"""Rate-limited emission of socket events from the workers.
+
+Output frames of chatty programs (i.e. a tight loop with pause or clc) are
+coalesced so that each session receives at most a fixed number of messages per
+second, which protects the message queue and the web nodes.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from matl_online.encoding import JSON, encode_frame
+
+
+def merge_frames(pending: Dict[str, Any], frame: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two consecutive output frames into a single frame."""
+    # A reset discards all of the output which preceded it
+    if frame["reset"]:
+        return dict(frame)
+
+    data: List[Dict[str, str]] = list(pending["data"])
+
+    for item in frame["data"]:
+        # Continuations of stdout are simply appended on the client
+        if data and item["type"] == "stdout" and data[-1]["type"] == "stdout":
+            data[-1] = {"type": "stdout", "value": data[-1]["value"] + item["value"]}
+        else:
+            data.append(item)
+
+    return {**frame, "data": data, "reset": pending["reset"]}
+
+
+class CoalescingEmitter:
+    """Batches the output frames sent to each session.
+
+    Frames are held for up to `window` seconds and no more than
+    `max_messages_per_second` frames are sent to a session. Any other event
+    sent to a session (i.e. completion) first flushes its pending frames.
+    """
+
+    def __init__(
+        self,
+        send: Callable[..., None],
+        window: float = 0.0,
+        max_messages_per_second: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.send = send
+        self.window = window
+        self.interval = 1.0 / max_messages_per_second if max_messages_per_second else 0
+        self.clock = clock
+
+        self.lock = threading.RLock()
+        self.pending: Dict[Optional[str], Dict[str, Any]] = {}
+        self.encodings: Dict[Optional[str], str] = {}
+        self.timers: Dict[Optional[str], threading.Timer] = {}
+        self.last_emitted: Dict[Optional[str], float] = {}
+
+    def delay(self, room: Optional[str]) -> float:
+        """Time to wait before the pending frame of a room may be sent."""
+        now = self.clock()
+        last = self.last_emitted.get(room)
+        delay = self.window
+
+        if last is not None:
+            delay = max(delay, last + self.interval - now)
+
+        return max(delay, 0)
+
+    def emit_frame(
+        self,
+        frame: Dict[str, Any],
+        room: Optional[str],
+        force: bool = False,
+        encoding: str = JSON,
+    ) -> None:
+        """Queue an output frame, sending it once the limits allow.
+
+        Frames are only encoded once they are sent (see encode_frame).
+        """
+        with self.lock:
+            if room in self.pending:
+                frame = merge_frames(self.pending[room], frame)
+
+            self.pending[room] = frame
+            self.encodings[room] = encoding
+
+            delay = 0 if force else self.delay(room)
+
+            if delay <= 0:
+                self.flush(room)
+            elif room not in self.timers:
+                timer = threading.Timer(delay, self.flush, args=(room,))
+                timer.daemon = True
+                self.timers[room] = timer
+                timer.start()
+
+    def emit(
+        self,
+        event: str,
+        *args: Any,
+        room: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Send any other event after all pending frames of the room."""
+        with self.lock:
+            if room is not None:
+                self.flush(room)
+
+            self.send(event, *args, room=room, **kwargs)
+
+    def flush(self, room: Optional[str]) -> None:
+        """Send the pending frame of a room (if any) right away."""
+        with self.lock:
+            timer = self.timers.pop(room, None)
+            if timer is not None:
+                timer.cancel()
+
+            frame = self.pending.pop(room, None)
+            encoding = self.encodings.pop(room, JSON)
+            if frame is None:
+                return
+
+            self.send("status", encode_frame(frame, encoding), room=room)
+
+            now = self.clock()
+            self.last_emitted[room] = now
+
+            # Forget about the rooms that are no longer being limited
+            self.last_emitted = {
+                key: value
+                for key, value in self.last_emitted.items()
+                if now - value < self.interval or key == room
+            }
@@ -0,0 +1,59 @@
+"""Encodings of the output frames sent to the clients.
+
+Clients choose an encoding when submitting a program. Besides plain JSON,
+frames can be sent as compact msgpack binary messages where each frame is an
+array of [session, seq, reset, items] and each item is a [type code, value]
+pair. Binary messages are forwarded through the message queue and the web
+servers without being re-encoded.
+"""
+
+from typing import Any, Dict, List, Union
+
+import msgpack  # type: ignore[import]
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+ENCODINGS = (JSON, MSGPACK)
+
+# Item types are sent as small integers by compact encodings
+TYPE_CODES: Dict[str, int] = {
+    "stdout": 0,
+    "stdout2": 1,
+    "stderr": 2,
+    "image": 3,
+    "image_nn": 4,
+    "audio": 5,
+    "truncated": 6,
+}
+
+TYPE_NAMES: Dict[int, str] = {code: name for name, code in TYPE_CODES.items()}
+
+
+def encode_frame(
+    frame: Dict[str, Any], encoding: str = JSON
+) -> Union[Dict[str, Any], bytes]:
+    """Encode an output frame to be sent to a client."""
+    if encoding != MSGPACK:
+        return frame
+
+    items = [
+        [TYPE_CODES.get(item["type"], item["type"]), item["value"]]
+        for item in frame["data"]
+    ]
+
+    packed: bytes = msgpack.packb(
+        [frame["session"], frame["seq"], frame["reset"], items]
+    )
+    return packed
+
+
+def decode_frame(data: bytes) -> Dict[str, Any]:
+    """Decode a msgpack frame (the inverse of encode_frame)."""
+    session, seq, reset, items = msgpack.unpackb(data)
+
+    decoded: List[Dict[str, str]] = [
+        {"type": TYPE_NAMES.get(code, code), "value": value} for code, value in items
+    ]
+
+    return {"data": decoded, "session": session, "seq": seq, "reset": reset}
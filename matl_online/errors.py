@@ -4,3 +4,15 @@ class InvalidVersion(Exception):
 
 class MissingDirectory(Exception):
     pass
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+class Throttled(Exception):
+    pass
+
+
+class TaskCancelled(Exception):
+    pass
@@ -0,0 +1,78 @@
+"""Cache of the programs compiled by MATL on each worker.
+
+MATL parses and compiles every program into an Octave file before running it.
+Running the same code again (i.e. with different inputs) can skip this step by
+running the compiled program of a previous run instead.
+
+The programs are added to the cache by matlCompile, right after compiling them
+and before they run, so nothing else in the directory of a run is ever cached.
+"""
+
+import hashlib
+import os
+import pathlib
+from typing import Optional
+
+from prometheus_client import Counter
+
+from matl_online.settings import config
+from matl_online.types import MATLFlags, MATLTaskParameters
+
+lookups = Counter(
+    "matl_compile_cache_lookups",
+    "Lookups of compiled programs by whether they were cached",
+    ["result"],
+)
+
+
+def compiled_path(params: MATLTaskParameters) -> Optional[pathlib.Path]:
+    """Where the compiled program for these parameters is cached (if enabled).
+
+    Only programs which are run are compiled.
+    """
+    if not config.MATL_COMPILE_CACHE_DIRECTORY:
+        return None
+
+    if MATLFlags.RUN not in params.additional_flags:
+        return None
+
+    digest = hashlib.sha256(f"{params.flags}\n{params.code}".encode()).hexdigest()
+
+    # Octave requires the names of scripts to start with a letter
+    return pathlib.Path(config.MATL_COMPILE_CACHE_DIRECTORY).joinpath(
+        params.version, f"matl_{digest[:32]}.m"
+    )
+
+
+def lookup(path: pathlib.Path) -> bool:
+    """Whether a compiled program is cached, recording the result."""
+    hit = path.is_file()
+    lookups.labels("hit" if hit else "miss").inc()
+
+    # Recently used programs are kept the longest (see prune)
+    if hit:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    return hit
+
+
+def prune() -> None:
+    """Remove the least recently used programs beyond MATL_COMPILE_CACHE_SIZE."""
+    root = pathlib.Path(config.MATL_COMPILE_CACHE_DIRECTORY)
+    programs = list(root.glob("*/*.m"))
+
+    excess = len(programs) - config.MATL_COMPILE_CACHE_SIZE
+    if excess <= 0:
+        return
+
+    def last_used(item: pathlib.Path) -> float:
+        try:
+            return item.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    for program in sorted(programs, key=last_used)[:excess]:
+        program.unlink(missing_ok=True)
@@ -1,22 +1,52 @@
 """Module for interacting with MATL, and it's source code."""
 
+import logging
 import pathlib
-from typing import Optional
+import secrets
+from typing import List, Optional
 
 from matl_online.octave import OctaveSession, OutputCallback
 from matl_online.octave import string as octave_string
+from matl_online.settings import config
 from matl_online.types import MATLTaskParameters
 
+from . import compiled
 from .source import get_matl_folder
 
 
+def octave_cell(values: List[str]) -> str:
+    """Octave literal of a cell array of strings."""
+    return f"{{{','.join([octave_string(x) for x in values])}}}"
+
+
+def cleanup(octave: OctaveSession) -> None:
+    """Remove whatever an interrupted program left behind (see matlCleanup)."""
+    if not octave.alive:
+        return
+
+    try:
+        octave.run("matlCleanup")
+    except Exception:
+        logging.exception("Unable to clean up after an interrupted program")
+
+
 def matl(
     octave: OctaveSession,
     matl_params: MATLTaskParameters,
     directory: pathlib.Path,
     line_handler: Optional[OutputCallback] = None,
+    token: Optional[str] = None,
 ) -> None:
-    """Open a session with Octave and manages input/output as well as errors."""
+    """Open a session with Octave and manages input/output as well as errors.
+
+    All records emitted by the wrappers are framed with the provided token.
+    If the parameters contain cases, the program is compiled once and run for
+    the inputs of each case (see matl_cases).
+
+    Compiled programs are cached so that running the same code again skips
+    parsing and compiling it (see matl_online.matl.compiled).
+    """
+    token = token or secrets.token_hex(8)
 
     # Add the folder for the appropriate MATL version
     matl_folder = get_matl_folder(matl_params.version)
@@ -29,12 +59,41 @@ def matl(
     with octave.current_directory(directory):
         with octave.paths(matl_folder):
             # Convert the code to a cell array element-per-line
-            code = f"{{{','.join([octave_string(x) for x in matl_params.code_lines])}}}"
-
-            octave.run(
-                "matl_runner",
-                octave_string(matl_params.flags),
-                code,
-                *[octave_string(x) for x in matl_params.input_lines],
-                line_handler=line_handler,
-            )
+            code = octave_cell(matl_params.code_lines)
+
+            cached = compiled.compiled_path(matl_params)
+            hit = cached is not None and compiled.lookup(cached)
+
+            try:
+                if matl_params.cases:
+                    octave.run(
+                        "matl_cases",
+                        octave_string(token),
+                        octave_string(config.MATL_RENDER_MODE),
+                        octave_string(matl_params.flags),
+                        code,
+                        octave_string(str(cached or "")),
+                        str(config.MATL_CASE_TIMEOUT),
+                        *[octave_cell(lines) for lines in matl_params.case_input_lines],
+                        line_handler=line_handler,
+                    )
+                else:
+                    octave.run(
+                        "matl_runner",
+                        octave_string(token),
+                        octave_string(config.MATL_RENDER_MODE),
+                        octave_string(matl_params.flags),
+                        code,
+                        octave_string(str(cached or "")),
+                        *[octave_string(x) for x in matl_params.input_lines],
+                        line_handler=line_handler,
+                    )
+            except Exception:
+                # An interrupted program (see OctaveSession.eval) never got to
+                # clean up after itself
+                cleanup(octave)
+                raise
+
+    # The program was added to the cache while compiling it (see matlCompile)
+    if cached is not None and not hit:
+        compiled.prune()
@@ -0,0 +1,178 @@
+"""Conditional (ETag-aware) access to the GitHub releases API."""
+
+import json
+import logging
+import pathlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from matl_online.settings import Config
+
+# GitHub allows at most 100 items per page
+RELEASES_PER_PAGE = 100
+
+
+@dataclass(frozen=True)
+class GitHubRelease:
+    """The subset of the GitHub release payload that we care about."""
+
+    tag_name: str
+    prerelease: bool
+    published_at: datetime
+
+    @classmethod
+    def from_json(cls, payload: Dict[str, Any]) -> "GitHubRelease":
+        return cls(
+            tag_name=payload["tag_name"],
+            prerelease=bool(payload.get("prerelease", False)),
+            published_at=datetime.fromisoformat(
+                payload["published_at"].replace("Z", "+00:00")
+            ),
+        )
+
+
+@dataclass(frozen=True)
+class FetchedReleases:
+    """All releases of a repository along with the pages they were read from."""
+
+    releases: List[GitHubRelease]
+    pages: Dict[str, Dict[str, Any]]
+    fetcher: "ReleaseFetcher"
+
+    def save(self) -> None:
+        """Remember the pages so that the next fetch can skip them.
+
+        This should only happen once the releases are stored, otherwise they
+        would never be fetched again.
+        """
+        self.fetcher.save_cache(self.pages)
+
+
+class ReleaseFetcher:
+    """Fetch all releases of a repository using conditional requests.
+
+    The ETag and Last-Modified headers of every page are persisted to disk along
+    with the (trimmed) page contents. Subsequent fetches send these validators
+    back so that GitHub can respond with a 304, which does not count against the
+    API rate limit. The pages are only persisted when the caller saves the
+    fetched releases.
+    """
+
+    repository: str
+    api_url: str
+    cache_file: pathlib.Path
+    session: requests.Session
+
+    def __init__(
+        self,
+        repository: str = Config.MATL_REPOSITORY,
+        api_url: str = Config.GITHUB_API_URL,
+        cache_file: pathlib.Path = Config.GITHUB_RELEASES_CACHE_FILE,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self.repository = repository
+        self.api_url = api_url.rstrip("/")
+        self.cache_file = cache_file
+        self.session = session or requests.Session()
+
+    @property
+    def first_page_url(self) -> str:
+        return (
+            f"{self.api_url}/repos/{self.repository}/releases"
+            f"?per_page={RELEASES_PER_PAGE}"
+        )
+
+    def load_cache(self) -> Dict[str, Dict[str, Any]]:
+        if not self.cache_file.is_file():
+            return {}
+
+        try:
+            with open(self.cache_file) as fid:
+                cache: Dict[str, Dict[str, Any]] = json.load(fid)
+        except (OSError, ValueError):
+            logging.warning(f"Ignoring unreadable cache {self.cache_file}")
+            return {}
+
+        return cache
+
+    def save_cache(self, cache: Dict[str, Dict[str, Any]]) -> None:
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first so that readers never see partial data
+        temporary_file = self.cache_file.with_suffix(".tmp")
+
+        with open(temporary_file, "w") as fid:
+            json.dump(cache, fid)
+
+        temporary_file.replace(self.cache_file)
+
+    def fetch(self, force: bool = False) -> Optional[FetchedReleases]:
+        """Retrieve all releases, or None if nothing changed since the last call."""
+        cache = {} if force else self.load_cache()
+        pages: Dict[str, Dict[str, Any]] = {}
+
+        changed = False
+        url: Optional[str] = self.first_page_url
+
+        while url is not None:
+            cached = cache.get(url)
+            headers = {"Accept": "application/vnd.github+json"}
+
+            if cached is not None:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+            response = self.session.get(url, headers=headers)
+
+            if response.status_code == 304 and cached is not None:
+                page = cached
+            else:
+                response.raise_for_status()
+
+                changed = True
+                page = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "next": response.links.get("next", {}).get("url"),
+                    "releases": [
+                        {
+                            "tag_name": item["tag_name"],
+                            "prerelease": item.get("prerelease", False),
+                            "published_at": item["published_at"],
+                        }
+                        for item in response.json()
+                        # Drafts do not have a publication date
+                        if item.get("published_at")
+                    ],
+                }
+
+            pages[url] = page
+            url = page.get("next")
+
+        # The set of pages itself may have shrunk
+        if set(pages) != set(cache):
+            changed = True
+
+        if not changed:
+            return None
+
+        releases = [
+            GitHubRelease.from_json(item)
+            for page in pages.values()
+            for item in page["releases"]
+        ]
+
+        return FetchedReleases(releases, pages, self)
+
+
+def fetch_releases(
+    repository: str = Config.MATL_REPOSITORY,
+    force: bool = False,
+) -> Optional[FetchedReleases]:
+    """Fetch all releases of the repository, or None if nothing has changed."""
+    return ReleaseFetcher(repository).fetch(force=force)
@@ -0,0 +1,62 @@
+"""Re-encoding of the images produced by MATL programs."""
+
+import io
+from functools import lru_cache
+
+from PIL import Image
+
+from matl_online.settings import config
+
+# Maximum number of colors in a palette image
+PALETTE_SIZE = 256
+
+
+def optimize_png(data: bytes) -> bytes:
+    """Re-encode a PNG to reduce its size (if enabled).
+
+    Images with at most 256 colors (most plots) are stored as palette images,
+    which is lossless. Other images are only quantized when
+    MATL_IMAGE_QUANTIZE is enabled. The original is returned unless the
+    re-encoded image is smaller.
+    """
+    if not config.MATL_OPTIMIZE_IMAGES:
+        return data
+
+    return _optimize_png(data, config.MATL_IMAGE_QUANTIZE)
+
+
+# Animations often contain the same frame many times
+@lru_cache(maxsize=32)
+def _optimize_png(data: bytes, quantize: bool) -> bytes:
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            optimized = _reduce_colors(image, quantize)
+
+            output = io.BytesIO()
+            optimized.save(output, format="PNG", optimize=True)
+    except (OSError, ValueError):
+        return data
+
+    return min(data, output.getvalue(), key=len)
+
+
+def _reduce_colors(image: Image.Image, quantize: bool) -> Image.Image:
+    if image.mode not in ("RGB", "RGBA"):
+        return image
+
+    if not quantize and image.getcolors(PALETTE_SIZE) is None:
+        return image
+
+    # Fast octree is the only method which supports transparency
+    method = Image.Quantize.FASTOCTREE if image.mode == "RGBA" else None
+    palette = image.quantize(PALETTE_SIZE, method=method)
+
+    if quantize:
+        return palette
+
+    # Keep the palette image only if no colors were lost along the way
+    if palette.convert(image.mode).tobytes() == image.tobytes():
+        return palette
+
+    return image
@@ -1,8 +1,11 @@
+import hashlib
 import pathlib
 import re
-from typing import Dict, List, Optional
+import secrets
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
-from matl_online.utils import base64_encode_file
+from matl_online.artifacts import get_artifact_store
+from matl_online.matl.images import optimize_png
 
 
 def process_image(
@@ -14,9 +17,13 @@ def process_image(
     if not image_path.is_file():
         return None
 
+    return image_item(optimize_png(image_path.read_bytes()), interpolation)
+
+
+def image_item(data: bytes, interpolation: bool = False) -> Dict[str, str]:
     return {
         "type": "image" if interpolation else "image_nn",
-        "value": "data:image/png;" + base64_encode_file(image_path),
+        "value": get_artifact_store().put(data, ".png"),
     }
 
 
@@ -27,40 +34,374 @@ def process_audio(audio_file: pathlib.Path) -> Optional[Dict[str, str]]:
 
     return {
         "type": "audio",
-        "value": "data:audio/wav;" + base64_encode_file(audio_file),
+        "value": get_artifact_store().put(audio_file.read_bytes(), ".wav"),
     }
 
 
+# Prefixes which change how a section of the output is interpreted
+TAG_PREFIXES = ("[IMAGE", "[AUDIO]", "[STDERR]", "[STDOUT]", "[TRUNCATED]")
+
+
+def find_tag(line: str) -> int:
+    """Find where the tagged portion of a line starts (or -1 if untagged).
+
+    A line is tagged from its first "[" onward if that is followed by a "]"
+    which is not the final character of the line.
+    """
+    start = line.find("[")
+
+    if start == -1 or line.find("]", start + 1, len(line) - 1) == -1:
+        return -1
+
+    return start
+
+
+def _image(part: str) -> Optional[Dict[str, str]]:
+    image_filename = pathlib.Path(re.sub(r"\[IMAGE.*?]", "", part))
+    return process_image(image_filename, part.startswith("[IMAGE]"))
+
+
+def _audio(part: str) -> Optional[Dict[str, str]]:
+    return process_audio(pathlib.Path(part.replace("[AUDIO]", "")))
+
+
+def _stderr(part: str) -> Optional[Dict[str, str]]:
+    return {"type": "stderr", "value": part.replace("[STDERR]", "")}
+
+
+def _stdout2(part: str) -> Optional[Dict[str, str]]:
+    return {"type": "stdout2", "value": part.replace("[STDOUT]", "")}
+
+
+def _truncated(part: str) -> Optional[Dict[str, str]]:
+    return {"type": "truncated", "value": part.replace("[TRUNCATED]", "")}
+
+
+# Handlers for each tag ([IMAGE] and [IMAGE_NN] share the same handler)
+TAG_HANDLERS: Tuple[Tuple[str, Callable[[str], Optional[Dict[str, str]]]], ...] = (
+    ("[IMAGE", _image),
+    ("[AUDIO]", _audio),
+    ("[STDERR]", _stderr),
+    ("[STDOUT]", _stdout2),
+    ("[TRUNCATED]", _truncated),
+)
+
+
+def process_part(part: str) -> Optional[Dict[str, str]]:
+    """Convert a single section of the MATL output to a result item."""
+    # Strip a single trailing newline
+    part = part.rstrip("\n")
+
+    if part.startswith("["):
+        for prefix, handler in TAG_HANDLERS:
+            if part.startswith(prefix):
+                return handler(part)
+
+    return {"type": "stdout", "value": part}
+
+
+# Type of the record used for regular (unframed) output
+TEXT = ""
+
+# Handlers for the payload of each type of framed record
+RECORD_HANDLERS: Dict[str, Callable[[str], Optional[Dict[str, str]]]] = {
+    TEXT: lambda text: {"type": "stdout", "value": text.rstrip("\n")},
+    "STDOUT": lambda payload: {"type": "stdout2", "value": payload},
+    "STDERR": lambda payload: {"type": "stderr", "value": payload},
+    "IMAGE": lambda payload: process_image(pathlib.Path(payload), True),
+    "IMAGE_NN": lambda payload: process_image(pathlib.Path(payload), False),
+    "AUDIO": lambda payload: process_audio(pathlib.Path(payload)),
+    "TRUNCATED": lambda payload: {"type": "truncated", "value": payload},
+}
+
+
+def process_record(kind: str, payload: str) -> Optional[Dict[str, str]]:
+    """Convert a framed record to a result item (unknown types are ignored)."""
+    handler = RECORD_HANDLERS.get(kind)
+    return None if handler is None else handler(payload)
+
+
+# Delimiters of the records emitted by matlFrame.m. Lines of output are
+# stripped of trailing whitespace (see OctaveSession), so the end of a record
+# can't be a whitespace character (i.e. the unit separator).
+RECORD_START = "\x1e"
+RECORD_END = "\x03"
+
+ESCAPE_PATTERN = re.compile(r"%(25|0A|0D)")
+ESCAPES = {"25": "%", "0A": "\n", "0D": "\r"}
+
+
+class FrameDecoder:
+    """Decodes the framed records which the MATL wrappers emit.
+
+    Each record occupies a single line of output with the format
+
+        <RS><token> <type> <length> <payload><ETX>
+
+    where any percent signs, newlines and carriage returns in the payload are
+    percent-encoded and the length is that of the decoded payload in bytes.
+    The token is unique to each run so program output can't imitate a record.
+    """
+
+    def __init__(self, token: Optional[str] = None) -> None:
+        self.token = token or secrets.token_hex(8)
+        self.prefix = f"{RECORD_START}{self.token} "
+
+    def encode(self, kind: str, payload: str = "") -> str:
+        """Create a record the same way as matlFrame.m."""
+        escaped = payload.replace("%", "%25").replace("\n", "%0A").replace("\r", "%0D")
+        return f"{self.prefix}{kind} {len(payload.encode())} {escaped}{RECORD_END}"
+
+    def decode(self, line: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+        """Split a line into any regular output and the (type, payload) of a record.
+
+        Output which was printed without a trailing newline may precede a
+        record on the same line.
+        """
+        start = line.find(self.prefix)
+
+        if start == -1 or not line.endswith(RECORD_END):
+            return line, None
+
+        fields = line[start + len(self.prefix) : -1].split(" ", 2)
+
+        if len(fields) != 3:
+            return line, None
+
+        kind, length, escaped = fields
+        payload = ESCAPE_PATTERN.sub(lambda match: ESCAPES[match.group(1)], escaped)
+
+        # Anything that was altered along the way is treated as regular output
+        if not length.isdigit() or int(length) != len(payload.encode()):
+            return line, None
+
+        return line[:start], (kind, payload)
+
+
 def parse_matl_results(output: str) -> List[Dict[str, str]]:
     """Convert MATL output to a custom data structure.
 
     Takes all the output and parses it out into sections to pass back
     to the client which indicates stderr/stdout/images, etc.
     """
-    result = list()
+    parser = MATLOutputParser()
+    parser.feed(output)
+    return parser.results()
+
+
+class MATLOutputParser:
+    """Incrementally parse MATL output as it is produced.
+
+    Lines are fed in as they are received and the parsed items are retrieved in
+    batches with flush(), which only returns what is new since the previous
+    flush. The combination of all items is identical to calling
+    parse_matl_results on all of the lines joined by newlines.
+
+    Untagged lines are merged into a single stdout item until the next tagged
+    line. Any such trailing item is sent provisionally at each flush, and only
+    its continuation is included in the following flush.
+
+    When framed, the lines are never scanned for tags and all other output is
+    added as records instead (see FrameDecoder).
+    """
+
+    framed: bool
+
+    # Closed sections of the output (either text or records of a given type)
+    # and their (lazily) processed items
+    parts: List[Union[str, Tuple[str, str]]]
+    items: List[Optional[Dict[str, str]]]
+
+    # Untagged lines which may still be extended by subsequent lines
+    chunk: List[str]
+
+    # Number of lines of the chunk up to (and including) its last non-empty line
+    chunk_end: int
+
+    # Number of parts which have already been flushed
+    flushed: int
+
+    # Number of lines (and characters) of the current chunk already flushed
+    sent: int
+    sent_length: int
+
+    # Type and hash of the last image since the output was cleared, along with
+    # its item (which is reused while the image is unchanged)
+    last_image: Optional[Tuple[Tuple[str, bytes], Dict[str, str]]]
+
+    # Bytes saved by re-encoding images
+    image_bytes_saved: int
+
+    def __init__(self, framed: bool = False) -> None:
+        self.framed = framed
+        self.image_bytes_saved = 0
+        self.clear()
+
+    def clear(self) -> None:
+        self.parts = []
+        self.items = []
+        self.chunk = []
+        self.chunk_end = 0
+        self.flushed = 0
+        self.sent = 0
+        self.sent_length = 0
+        self.last_image = None
+
+    def feed(self, message: str) -> None:
+        """Add a message (which may span multiple lines) to the output."""
+        lines = message.split("\n")
+
+        # Without any brackets, none of the lines can be tagged
+        if self.framed or "[" not in message:
+            self._extend_chunk(lines)
+            return
+
+        for line in lines:
+            self.feed_line(line)
+
+    def _extend_chunk(self, lines: List[str]) -> None:
+        offset = len(self.chunk)
+        self.chunk.extend(lines)
+
+        for index in range(len(lines) - 1, -1, -1):
+            if lines[index]:
+                self.chunk_end = offset + index + 1
+                break
+
+    def feed_line(self, line: str) -> None:
+        start = find_tag(line)
+
+        if start == -1:
+            self._extend_chunk([line])
+            return
+
+        # Anything prior to the tag still belongs to the untagged chunk
+        if self.chunk or start:
+            self.chunk.append(line[:start])
+
+        self._close_chunk()
+        self.parts.append(line[start:])
+
+    def add_record(self, kind: str, payload: str) -> None:
+        """Add a framed record to the output."""
+        self._close_chunk()
+        self.parts.append((kind, payload))
+
+    def _chunk_text(self) -> str:
+        return "\n".join(self.chunk)
+
+    def _close_chunk(self) -> None:
+        text = self._chunk_text()
+
+        if text != "":
+            self.parts.append((TEXT, text) if self.framed else text)
+
+        self.chunk = []
+        self.chunk_end = 0
+
+    def _provisional(self) -> bool:
+        # Only plain stdout chunks are safe to send before they are complete
+        if self.framed:
+            return bool(self.chunk)
+
+        return bool(self.chunk) and not self.chunk[0].startswith(TAG_PREFIXES)
+
+    def _continuation(self, item: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Remove the portion of a stdout item which was already sent."""
+        sent, self.sent_length = self.sent_length, 0
+        self.sent = 0
+
+        if not sent:
+            return item
+
+        value = item["value"][sent:]
+
+        return {"type": item["type"], "value": value} if value else None
+
+    def _process_record(self, kind: str, payload: str) -> Optional[Dict[str, str]]:
+        if kind not in ("IMAGE", "IMAGE_NN"):
+            return process_record(kind, payload)
+
+        image_path = pathlib.Path(payload)
+        if not image_path.is_file():
+            return None
+
+        data = image_path.read_bytes()
+
+        # An unchanged figure (i.e. a frame of an animation) is only encoded
+        # and stored once
+        key = (kind, hashlib.sha256(data).digest())
+        if self.last_image is not None and self.last_image[0] == key:
+            return dict(self.last_image[1])
+
+        encoded = optimize_png(data)
+        self.image_bytes_saved += len(data) - len(encoded)
+
+        item = image_item(encoded, kind == "IMAGE")
+        self.last_image = (key, item)
+
+        return dict(item)
+
+    def flush(self, final: bool = False) -> List[Dict[str, str]]:
+        """Retrieve all items produced since the last flush.
+
+        A final flush also includes any incomplete trailing output. No more
+        output is expected afterwards.
+        """
+        if final:
+            self._close_chunk()
+
+        delta = []
+
+        for index, part in enumerate(self.parts[self.flushed :]):
+            item = (
+                process_part(part)
+                if isinstance(part, str)
+                else self._process_record(*part)
+            )
+            self.items.append(item)
+
+            # The first new part may be a chunk that was provisionally sent
+            if item and index == 0:
+                item = self._continuation(item)
+
+            if item:
+                delta.append(item)
+
+        self.flushed = len(self.parts)
+
+        if self._provisional() and self.chunk_end > self.sent:
+            value = "\n".join(self.chunk[self.sent : self.chunk_end])
+
+            if self.sent:
+                value = "\n" + value
+
+            delta.append({"type": "stdout", "value": value})
+            self.sent = self.chunk_end
+            self.sent_length += len(value)
+
+        return delta
+
+    def snapshot(self) -> List[Dict[str, str]]:
+        """All items flushed so far (which is what the clients have received)."""
+        result = [item for item in self.items if item]
 
-    parts = re.split(r"(\[.*?][^\n].*\n?)", output)
+        if self.sent:
+            value = "\n".join(self.chunk[: self.sent])
+            result.append({"type": "stdout", "value": value})
 
-    for part in parts:
-        if part == "":
-            continue
+        return result
 
-        # Strip a single trailing newline
-        part = part.rstrip("\n")
+    def results(self) -> List[Dict[str, str]]:
+        """Retrieve all items so far (this flushes any pending output)."""
+        self.flush()
 
-        if part.startswith("[IMAGE"):
-            image_filename = pathlib.Path(re.sub(r"\[IMAGE.*?]", "", part))
-            item = process_image(image_filename, part.startswith("[IMAGE]"))
-        elif part.startswith("[AUDIO]"):
-            item = process_audio(pathlib.Path(part.replace("[AUDIO]", "")))
-        elif part.startswith("[STDERR]"):
-            item = {"type": "stderr", "value": part.replace("[STDERR]", "")}
-        elif part.startswith("[STDOUT]"):
-            item = {"type": "stdout2", "value": part.replace("[STDOUT]", "")}
-        else:
-            item = {"type": "stdout", "value": part}
+        result = [item for item in self.items if item]
 
-        if item:
-            result.append(item)
+        text = self._chunk_text()
+        if text != "":
+            item = process_record(TEXT, text) if self.framed else process_part(text)
+            if item:
+                result.append(item)
 
-    return result
+        return result
@@ -1,32 +1,78 @@
+import logging
 import pathlib
+from dataclasses import dataclass, field
+from typing import Dict, List
+
 import pytz
 
-from matl_online.public.models import Release
+from matl_online.database import db
+from matl_online.public.models import Release, parse_version
 from matl_online.settings import Config
 
-from .source import github_repository, remove_source_directory
+from .github import fetch_releases
+from .source import remove_source_directory
+
+
+@dataclass
+class ReleaseRefreshSummary:
+    """Tags of the releases that were affected by a refresh."""
+
+    created: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> List[str]:
+        return self.created + self.updated
+
+    def __bool__(self) -> bool:
+        return len(self.changed) > 0
 
 
 def refresh_releases(
     repository: str = Config.MATL_REPOSITORY,
     source_root: pathlib.Path = Config.MATL_SOURCE_DIRECTORY,
-) -> None:
+    force: bool = False,
+) -> ReleaseRefreshSummary:
     """Fetch new release information from GitHub and update local database."""
-    repo = github_repository(repository)
+    summary = ReleaseRefreshSummary()
+
+    # An empty database must always be populated, regardless of cached ETags
+    force = force or Release.query.first() is None
+
+    fetched = fetch_releases(repository, force=force)
 
-    for release in repo.get_releases():
+    # GitHub reported that nothing has changed since our last refresh
+    if fetched is None:
+        return summary
+
+    # Load all of the known releases up front so we can diff in memory
+    existing: Dict[str, Release] = {
+        release.tag: release for release in Release.query.all()
+    }
+
+    for release in fetched.releases:
         # Skip any pre-releases
         if release.prerelease:
             continue
 
         version = release.tag_name
 
-        # Check if we already have this release in the database
-        release_record = Release.query.filter_by(tag=version).first()
+        # Ignore any tags which do not look like a version number
+        try:
+            parse_version(version)
+        except ValueError:
+            logging.warning(f"Skipping release with invalid tag {version}")
+            continue
+
+        release_record = existing.get(version)
 
         # If there is no existing record, create it
         if release_record is None:
-            Release.create(tag=version, date=release.published_at)
+            release_record = Release(tag=version, date=release.published_at)
+            existing[version] = release_record
+
+            db.session.add(release_record)
+            summary.created.append(version)
             continue
 
         # Check if our local release is stale
@@ -36,4 +82,14 @@ def refresh_releases(
             remove_source_directory(version, source_root=source_root)
 
             # Now update the database entry
-            release_record.update(date=release.published_at)
+            release_record.update(commit=False, date=release.published_at)
+            summary.updated.append(version)
+
+    # Apply all inserts and updates in a single transaction
+    if summary:
+        db.session.commit()
+
+    # The releases are only skipped by the next refresh once they are stored
+    fetched.save()
+
+    return summary
@@ -76,9 +76,12 @@ class OctaveSession:
     def paths(self, *paths: pathlib.Path) -> Generator[None, None, None]:
         self.add_paths(*paths)
 
-        yield
-
-        self.remove_paths(*paths)
+        try:
+            yield
+        finally:
+            # A session which was terminated has nothing left to undo
+            if self.alive:
+                self.remove_paths(*paths)
 
     @contextmanager
     def current_directory(self, directory: pathlib.Path) -> Generator[None, None, None]:
@@ -88,9 +91,11 @@ class OctaveSession:
 
         self.cd(directory)
 
-        yield
-
-        self.cd(original_directory)
+        try:
+            yield
+        finally:
+            if self.alive:
+                self.cd(original_directory)
 
     def pwd(self) -> pathlib.Path:
         return pathlib.Path(self.run("disp", "pwd").rstrip()).absolute()
@@ -120,9 +125,45 @@ class OctaveSession:
 
         self._engine.line_handler = line_handler
 
-        output: str = self._engine.eval(code, **kwargs)
+        try:
+            output: str = self._engine.eval(code, **kwargs)
+        except Exception:
+            # Whatever is still running (i.e. after a time limit or a
+            # cancellation) is aborted so that the session can be used again
+            self.interrupt()
+            raise
+
         return output
 
+    @property
+    def alive(self) -> bool:
+        """Whether Octave is running (and can evaluate code)."""
+        return self._engine is not None
+
+    def interrupt(self) -> bool:
+        """Abort the current evaluation and wait for Octave's prompt.
+
+        Octave is terminated if it doesn't respond within
+        OCTAVE_INTERRUPT_TIMEOUT seconds, in which case it has to be restarted.
+        Returns whether Octave is ready to evaluate code again.
+        """
+        if self._engine is None:
+            return False
+
+        repl = self._engine.repl
+        prompts = [repl.prompt_regex, repl.continuation_prompt_regex]
+
+        # Any output of the aborted evaluation is discarded while waiting
+        try:
+            repl.child.sendintr()
+            repl.child.expect(prompts, timeout=Config.OCTAVE_INTERRUPT_TIMEOUT)
+        except Exception:
+            self.logger.exception("Unable to interrupt Octave")
+            self.terminate()
+            return False
+
+        return True
+
     def restart(self) -> None:
         """Terminate and re-launch the Octave instance."""
         self.terminate()
@@ -0,0 +1,85 @@
+"""Caching of the parts of pages which rarely change.
+
+Each process caches the values itself. Invalidating them increases a
+generation which is shared by all processes through Redis (see
+PAGE_CACHE_REDIS_URL), so every process recomputes its values once the
+releases changed, no matter which process (or CLI command) refreshed them.
+Without Redis, other processes keep their values for up to PAGE_CACHE_TTL.
+"""
+
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+import redis
+from flask import current_app
+
+T = TypeVar("T")
+
+GENERATION_KEY = "page-cache:generation"
+
+# Cached values of this process, when they expire and their generation
+_entries: Dict[str, Tuple[float, Optional[str], Any]] = {}
+
+
+@lru_cache(maxsize=1)
+def _client(url: str) -> redis.Redis:
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+def _generation() -> Optional[str]:
+    url = current_app.config.get("PAGE_CACHE_REDIS_URL")
+    if not url:
+        return None
+
+    try:
+        generation = _client(url).get(GENERATION_KEY)
+    except redis.RedisError:
+        logging.exception("Unable to get the generation of the page cache")
+        return None
+
+    return generation if isinstance(generation, str) else None
+
+
+def cached(name: str, compute: Callable[[], T]) -> T:
+    """Compute a value at most once every PAGE_CACHE_TTL seconds.
+
+    Values are also recomputed once they were invalidated by any process.
+    """
+    ttl = current_app.config["PAGE_CACHE_TTL"]
+    now = time.monotonic()
+
+    if ttl <= 0:
+        return compute()
+
+    generation = _generation()
+    entry = _entries.get(name)
+
+    if entry is None or entry[0] <= now or entry[1] != generation:
+        entry = (now + ttl, generation, compute())
+        _entries[name] = entry
+
+    value: T = entry[2]
+    return value
+
+
+def invalidate(*names: str) -> None:
+    """Discard the named values (or all values if none are named).
+
+    Other processes discard all of their values.
+    """
+    if not names:
+        _entries.clear()
+
+    for name in names:
+        _entries.pop(name, None)
+
+    url = current_app.config.get("PAGE_CACHE_REDIS_URL")
+    if not url:
+        return
+
+    try:
+        _client(url).incr(GENERATION_KEY)
+    except redis.RedisError:
+        logging.exception("Unable to invalidate the page cache of other processes")
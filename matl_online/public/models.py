@@ -1,40 +1,108 @@
 """SQLAlchemy models."""
 
-import operator
-from typing import List, Optional, Tuple
+import re
+from typing import Any, List, Optional, Tuple
 
-from sqlalchemy.ext.hybrid import hybrid_property
+from flask_sqlalchemy.query import Query
+from sqlalchemy.orm import validates
 
 from matl_online.database import Column, Model, db
 
+# Any components beyond major.minor.patch are accepted but not used for sorting
+VERSION_PATTERN = re.compile(
+    r"^v?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?(?:\.\d+)*"
+    r"(?:-(?P<prerelease>.+))?$"
+)
+
+
+def parse_version(tag: str) -> Tuple[int, int, int, Optional[str]]:
+    """Split a release tag into its (major, minor, patch, prerelease) parts."""
+    match = VERSION_PATTERN.match(tag)
+
+    if match is None:
+        raise ValueError(f"Invalid release tag {tag!r}")
+
+    return (
+        int(match.group("major")),
+        int(match.group("minor") or 0),
+        int(match.group("patch") or 0),
+        match.group("prerelease"),
+    )
+
 
 class Release(Model):
     """Model for storing metadata associated with MATL releases."""
 
     __tablename__ = "releases"
+    __table_args__ = (
+        db.Index(
+            "ix_releases_version",
+            "major",
+            "minor",
+            "patch",
+            "is_final",
+            "prerelease",
+        ),
+    )
 
     id = Column(db.Integer, primary_key=True)
     tag = Column(db.String, unique=True, nullable=False)
     date = Column(db.DateTime, unique=True, nullable=False)
 
+    # Parsed version of the tag so that releases can be sorted in SQL
+    major = Column(db.Integer, nullable=False, default=0)
+    minor = Column(db.Integer, nullable=False, default=0)
+    patch = Column(db.Integer, nullable=False, default=0)
+    prerelease = Column(db.String, nullable=True)
+
+    # Pre-releases sort before the final release of the same version
+    is_final = Column(db.Boolean, nullable=False, default=True)
+
     def __repr__(self) -> str:
         """Create a custom string representation."""
         return "<Release %r>" % self.tag
 
-    @hybrid_property
-    def version(self) -> Tuple[int, ...]:
+    @validates("tag")  # type: ignore[untyped-decorator, no-untyped-call]
+    def _parse_tag(self, key: str, tag: str) -> str:
+        """Keep the version columns in sync with the tag."""
+        self.major, self.minor, self.patch, self.prerelease = parse_version(tag)
+        self.is_final = self.prerelease is None
+        return tag
+
+    @property
+    def version(self) -> Tuple[Any, ...]:
         """Convert release number to tuple for comparisons."""
-        return tuple(int(x) for x in self.tag.split("."))
+        return (
+            self.major,
+            self.minor,
+            self.patch,
+            self.is_final,
+            self.prerelease or "",
+        )
+
+    @classmethod
+    def ordered(cls) -> "Query":
+        """Query for all releases, newest version first."""
+        query: Query = cls.query.order_by(
+            cls.major.desc(),
+            cls.minor.desc(),
+            cls.patch.desc(),
+            cls.is_final.desc(),
+            cls.prerelease.desc(),
+        )
+        return query
+
+    @classmethod
+    def versions(cls) -> List["Release"]:
+        """Get all releases sorted from newest to oldest."""
+        releases: List[Release] = cls.ordered().all()
+        return releases
 
     @classmethod
     def latest(cls) -> Optional["Release"]:
         """Get the latest release from GitHub."""
-        releases: List[Release] = cls.query.all()
-        if len(releases) == 0:
-            return None
-
-        releases = sorted(releases, key=operator.attrgetter("version"))
-        return releases[-1]
+        release: Optional[Release] = cls.ordered().limit(1).first()
+        return release
 
     @classmethod
     def exists(cls, tag: str) -> bool:
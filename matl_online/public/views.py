@@ -1,28 +1,41 @@
 """Public-facing routes of our application."""
 
+import base64
 import hmac
 import json
 import os
+import secrets
 import uuid
+from dataclasses import replace
 from datetime import datetime
 from hashlib import sha1
-from typing import Any, Dict, Optional, Tuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import requests
+from celery import group
+from celery.exceptions import TimeoutError
 from flask import Blueprint, Response, abort, current_app, jsonify
 from flask import render_template as _render_template
 from flask import request, send_file, session
 from flask_socketio import emit, rooms  # type: ignore
 from flask_wtf.csrf import validate_csrf  # type: ignore
+from markupsafe import Markup
 from wtforms import ValidationError  # type: ignore
 
-from matl_online.errors import InvalidVersion
+from matl_online.artifacts import content_type, get_artifact_store, is_artifact_key
+from matl_online.assets import assets, bundles
+from matl_online.encoding import ENCODINGS, JSON
+from matl_online.errors import InvalidVersion, Throttled
 from matl_online.extensions import celery, csrf, socketio, metrics
 from matl_online.matl.documentation import help_file
 from matl_online.matl.releases import refresh_releases
+from matl_online.public.cache import cached, invalidate
 from matl_online.public.models import Release
+from matl_online.registry import get_task_registry
 from matl_online.settings import Config
-from matl_online.tasks import matl_task
+from matl_online.singleflight import SingleFlight, get_single_flight
+from matl_online.tasks import CANCEL_SIGNAL, matl_task
+from matl_online.throttle import get_throttle
 from matl_online.types import MATLExplainTaskParameters, MATLRunTaskParameters
 from matl_online.utils import sanitize_version
 
@@ -33,6 +46,24 @@ last_modified_datetime = datetime.utcfromtimestamp(last_modified_time)
 last_modified_date = last_modified_datetime.strftime("%Y/%m/%d")
 
 
+class Version(NamedTuple):
+    tag: str
+    date: datetime
+
+
+def _asset_urls() -> Dict[str, List[str]]:
+    return {name: assets[name].urls() for name in bundles}
+
+
+def asset_urls() -> Dict[str, List[str]]:
+    """URLs of all asset bundles by name."""
+    # Bundles are rebuilt whenever they change while debugging
+    if current_app.config.get("ASSETS_DEBUG"):
+        return _asset_urls()
+
+    return cached("assets", _asset_urls)
+
+
 def render_template(
     *args: Any,
     modified: str = last_modified_date,
@@ -48,16 +79,32 @@ def render_template(
         modified=modified,
         current_year=current_year,
         google_analytics_id=analytics_id,
+        asset_urls=asset_urls(),
         **kwargs,
     )
 
 
-def _latest_version_tag() -> str:
-    latest = Release.latest()
-    if latest is None:
-        return ""
+def _versions() -> Dict[str, Any]:
+    versions = [Version(release.tag, release.date) for release in Release.versions()]
+
+    return {
+        "versions": versions,
+        "latest": versions[0].tag if versions else "",
+        "menu": Markup(_render_template("versions.html", versions=versions)),
+    }
+
 
-    return str(latest.tag)
+def versions() -> Dict[str, Any]:
+    """All versions (newest first), the latest version and the rendered menu.
+
+    These only change along with the releases, so they are cached.
+    """
+    return cached("versions", _versions)
+
+
+def _latest_version_tag() -> str:
+    latest: str = versions()["latest"]
+    return latest
 
 
 def _parse_version(version: Optional[str]) -> str:
@@ -73,14 +120,19 @@ def home() -> str:
     code = request.values.get("code", "")
     inputs = request.values.get("inputs", "")
 
-    # Get the list of versions to show in the list
-    versions = Release.query.all()
-    versions.sort(key=lambda x: x.version, reverse=True)
+    # The list of versions to show in the menu
+    releases = versions()
 
     version = _parse_version(request.values.get("version"))
 
     return render_template(
-        "index.html", code=code, inputs=inputs, version=version, versions=versions
+        "index.html",
+        code=code,
+        inputs=inputs,
+        version=version,
+        versions=releases["versions"],
+        latest=releases["latest"],
+        versions_menu=releases["menu"],
     )
 
 
@@ -142,7 +194,8 @@ def github_hook() -> Union[Response, Tuple[str, int]]:
     # We don't actually care if this is a modification, a new release, or
     # whatever. We will simply refresh our local catalog of release
     # information regardless.
-    refresh_releases()
+    if refresh_releases():
+        invalidate()
 
     return jsonify({"success": True}), 200
 
@@ -161,6 +214,17 @@ def share() -> Tuple[Response, int]:
     client_id = current_app.config["IMGUR_CLIENT_ID"]
     header = {"Authorization": "Client-ID %s" % client_id}
 
+    # Images may also be referenced by their artifact URL
+    store = get_artifact_store()
+    key = store.key_from_url(img or "")
+
+    if key is not None:
+        data = store.get(key)
+        if data is None:
+            abort(404)
+
+        img = base64.b64encode(data).decode()
+
     # POST parameters for imgur API
     payload = {"image": img.split("base64,")[-1], "type": "base64"}
 
@@ -179,6 +243,26 @@ def share() -> Tuple[Response, int]:
         return jsonify({"success": False}), 400
 
 
+@blueprint.route("/artifacts/<key>", methods=["GET"])
+def artifact(key: str) -> Response:
+    """Serve an image or audio file produced by a MATL program."""
+    if not is_artifact_key(key):
+        abort(404)
+
+    data = get_artifact_store().get(key)
+    if data is None:
+        abort(404)
+
+    response = Response(data, mimetype=content_type(key))
+
+    # Artifacts are content-addressed so they never change
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.set_etag(key)
+    response.make_conditional(request)
+
+    return response
+
+
 @socketio.on("connect")  # type: ignore[untyped-decorator]
 @metrics.counter("socketio_connections", "SocketIO Events")  # type: ignore[untyped-decorator]
 def connected() -> None:
@@ -191,21 +275,62 @@ def connected() -> None:
 @metrics.counter("socketio_kill_events", "SocketIO Kill Events")  # type: ignore[untyped-decorator]
 def kill_task(data: Any) -> None:
     """Triggered when a kill message is sent to kill a task."""
+    uid = data.get("uid") if isinstance(data, dict) else None
+    token = data.get("token") if isinstance(data, dict) else None
+
     taskid = session.get("taskid", None)
+    key = session.get("shared_key", None)
+
+    # The client may have submitted the task through another web process (i.e.
+    # before reconnecting), whose session this process doesn't have. Clients
+    # may only kill the tasks of their own room, or of a previous room when
+    # they send the token they received for its task.
+    registry = get_task_registry()
+
+    room: str = session.get("room", "")
+    if uid and (uid in rooms() or uid == room):
+        room = uid
+    elif uid and registry is not None and registry.owns(uid, token):
+        room = uid
+
+    if registry is not None and room:
+        entry = registry.lookup(room)
+
+        if entry is not None:
+            taskid, key = entry["task"], entry["shared_key"]
+            registry.forget(room)
+
+    # Other clients may still be waiting for the output of a shared run, so
+    # it is only stopped once nobody is left
+    flight = get_single_flight()
+    if key is not None and flight is not None:
+        taskid = flight.leave(key, room, taskid)
+
     if taskid is not None:
-        celery.control.revoke(taskid, terminate=True, signal="SIGTERM")
+        # The program is interrupted while the worker (and Octave) keep running
+        celery.control.revoke(taskid, terminate=True, signal=CANCEL_SIGNAL.name)
+
+        # A killed task doesn't count against the client anymore
+        throttle = get_throttle()
+        if throttle is not None:
+            throttle.release(request.remote_addr, taskid)
 
     # Send a success notification regardless just in case something went
     # wrong and the task was ALREADY killed
     emit("complete", {"success": False, "message": "User terminated the job"})
 
     session["taskid"] = None
+    session["shared_key"] = None
 
 
 @socketio.on("submit")  # type: ignore[untyped-decorator]
 @metrics.counter("socketio_submit_events", "SocketIO Submit Events")  # type: ignore[untyped-decorator]
-def submit_job(data: Dict[str, Any]) -> None:
-    """Submit some code and inputs for interpretation."""
+def submit_job(data: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Submit some code and inputs for interpretation.
+
+    The client is acknowledged with the token which lets it kill the task
+    after reconnecting.
+    """
     # If we already have a task disable submitting
     uid = data.get("uid", str(uuid.uuid4()))
 
@@ -215,21 +340,85 @@ def submit_job(data: Dict[str, Any]) -> None:
 
     version = _parse_version(data.get("version", ""))
 
+    # Clients which don't support the requested encoding receive JSON
+    encoding = data.get("encoding", JSON)
+    if encoding not in ENCODINGS:
+        encoding = JSON
+
     # No op if no inputs are provided
     if code == "":
-        return
-
-    task = matl_task.delay(
-        MATLRunTaskParameters(
-            code=code,
-            inputs=inputs,
-            version=version,
-            session_id=uid,
-        )
+        return None
+
+    throttle = get_throttle()
+    address = request.remote_addr
+
+    # The task is counted against the client before it is queued
+    task_id = str(uuid.uuid4())
+
+    if throttle is not None:
+        try:
+            throttle.acquire(request.sid, address, [task_id])  # type: ignore[attr-defined]
+        except Throttled as e:
+            emit("complete", {"success": False, "message": str(e), "throttled": True})
+            return None
+
+    params = MATLRunTaskParameters(
+        code=code,
+        inputs=inputs,
+        version=version,
+        session_id=uid,
+        encoding=encoding,
+        client=address,
     )
 
-    # Store the currently executing task ID in the session
-    session["taskid"] = task.id
+    # Identical programs which are already running send their output to this
+    # client as well, so there is nothing to run
+    flight = get_single_flight()
+    key = SingleFlight.key(params) if flight is not None else None
+
+    if flight is not None and key is not None:
+        if flight.join(key, uid, encoding):
+            if throttle is not None:
+                throttle.release(address, task_id)
+
+            return _remember_task(uid, None, key)
+
+        params = replace(params, shared_key=key)
+
+    try:
+        task = matl_task.apply_async((params,), task_id=task_id)
+    except Exception:
+        # Identical programs mustn't join a run which never started
+        if flight is not None and key is not None:
+            flight.finish(key)
+
+        if throttle is not None:
+            throttle.release(address, task_id)
+
+        raise
+
+    if flight is not None and key is not None:
+        flight.set_task(key, task.id)
+
+    return _remember_task(uid, task.id, key)
+
+
+def _remember_task(
+    room: str, task_id: Optional[str], shared_key: Optional[str]
+) -> Dict[str, str]:
+    # Store the currently executing task ID in the session (and the registry,
+    # which any web process can read)
+    session["taskid"] = task_id
+    session["shared_key"] = shared_key
+    session["room"] = room
+
+    token = secrets.token_urlsafe(16)
+
+    registry = get_task_registry()
+    if registry is not None:
+        registry.register(room, task_id, shared_key, token)
+
+    return {"token": token}
 
 
 @blueprint.route("/explain", methods=["POST", "GET"])
@@ -249,6 +438,116 @@ def explain() -> Tuple[Response, int]:
     return jsonify(result), 200
 
 
+def _program_inputs(inputs: Any) -> str:
+    # Inputs may be given one per line or as a list of lines
+    if isinstance(inputs, list) and all(isinstance(item, str) for item in inputs):
+        inputs = "\n".join(inputs)
+
+    if not isinstance(inputs, str):
+        abort(400, "Inputs must be a string or a list of strings")
+
+    return inputs
+
+
+def _program_parameters(program: Any, address: Optional[str]) -> MATLRunTaskParameters:
+    """Validate one of the programs submitted to /api/run."""
+    if not isinstance(program, dict) or not isinstance(program.get("code"), str):
+        abort(400, "Each program needs a code string")
+
+    cases = program.get("cases", [])
+    if not isinstance(cases, list):
+        abort(400, "Cases must be a list of inputs")
+
+    version = program.get("version", "")
+    if not isinstance(version, str):
+        abort(400, "The version must be a string")
+
+    return MATLRunTaskParameters(
+        code=program["code"],
+        inputs=_program_inputs(program.get("inputs", "")),
+        version=_parse_version(version),
+        cases=tuple(_program_inputs(inputs) for inputs in cases),
+        client=address,
+    )
+
+
+def _program_result(params: MATLRunTaskParameters, result: Any) -> Dict[str, Any]:
+    # Failed tasks (i.e. timeouts) are reported without their output
+    if isinstance(result, BaseException):
+        return {"success": False, "error": str(result) or type(result).__name__}
+
+    output = {"success": True, "output": result["data"], "time": result["time"]}
+
+    # No cases are run if the program doesn't compile
+    if params.cases:
+        output["cases"] = result.get("cases", [])
+
+    return output
+
+
+@csrf.exempt  # type: ignore[untyped-decorator]
+@blueprint.route("/api/run", methods=["POST"])
+def run_programs() -> Tuple[Response, int]:
+    """Run a batch of programs across all workers and return their output.
+
+    The request contains a list of programs, each with its code, inputs and
+    version. The response contains the output of each program (in the same
+    format as the socket events) along with how long it took to run.
+
+    A program may instead list the inputs of several cases, in which case it
+    is compiled once and run for each case by a single task. The output and
+    time of each case are then reported separately.
+    """
+    payload = request.get_json(silent=True)
+    programs = payload.get("programs") if isinstance(payload, dict) else None
+
+    if not isinstance(programs, list) or not programs:
+        abort(400, "Expected a non-empty list of programs")
+
+    address = request.remote_addr
+    params = [_program_parameters(program, address) for program in programs]
+
+    # Every case counts as a program
+    limit = current_app.config["API_MAX_PROGRAMS"]
+    if sum(max(len(item.cases), 1) for item in params) > limit:
+        abort(413, f"At most {limit} programs may be run at once")
+
+    # The tasks of the batch are counted against the client before they are
+    # queued (and released by the workers as they finish)
+    task_ids = [str(uuid.uuid4()) for _ in params]
+    throttle = get_throttle()
+
+    if throttle is not None:
+        try:
+            throttle.acquire(None, address, task_ids, batch=True)
+        except Throttled as e:
+            abort(429, str(e))
+
+    job = group(
+        matl_task.s(item).set(task_id=task_id)
+        for item, task_id in zip(params, task_ids)
+    ).apply_async()
+
+    try:
+        results = job.join(  # type: ignore[attr-defined]
+            timeout=current_app.config["API_RUN_TIMEOUT"], propagate=False
+        )
+    except TimeoutError:
+        job.revoke()  # type: ignore[attr-defined]
+
+        # Revoked tasks which never started are never released by a worker
+        if throttle is not None:
+            for task_id in task_ids:
+                throttle.release(address, task_id)
+
+        abort(504, "The programs did not finish in time")
+
+    return (
+        jsonify({"results": [_program_result(*item) for item in zip(params, results)]}),
+        200,
+    )
+
+
 @blueprint.route("/help/<version>", methods=["GET"])
 def documentation(version: str) -> Union[Response, Tuple[str, int]]:
     """Return a JSON representation of the help for the requested version."""
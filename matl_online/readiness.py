@@ -0,0 +1,181 @@
+"""Track the Octave status of every worker process for readiness probes.
+
+Each prefork child records the state of its Octave session in its own status
+file. The main worker process combines these into the single readiness file
+that orchestration looks at, which only exists when every child is ready
+(and the worker isn't draining). It is refreshed by a timer of the consumer
+(see ReadinessStep).
+"""
+
+import json
+import os
+import pathlib
+import time
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional
+
+from celery import bootsteps
+from celery.platforms import EX_OK
+from celery.worker import state as worker_state
+
+from matl_online.settings import config
+
+
+class ProcessState(str, Enum):
+    STARTING = "starting"
+    READY = "ready"
+    RESTARTING = "restarting"
+
+
+def status_file(
+    pid: int,
+    directory: Optional[pathlib.Path] = None,
+) -> pathlib.Path:
+    directory = directory or pathlib.Path(config.CELERY_WORKER_STATUS_DIRECTORY)
+    return directory.joinpath(f"{pid}.json")
+
+
+def set_process_state(
+    state: ProcessState,
+    pid: Optional[int] = None,
+    directory: Optional[pathlib.Path] = None,
+) -> None:
+    """Record the state of the Octave session of a worker process."""
+    pid = pid or os.getpid()
+    filename = status_file(pid, directory)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write atomically so the main process never reads a partial file
+    temporary_file = filename.with_suffix(".tmp")
+    with open(temporary_file, "w") as fid:
+        json.dump({"pid": pid, "state": state.value, "updated": time.time()}, fid)
+
+    temporary_file.replace(filename)
+
+
+def clear_process_state(
+    pid: Optional[int] = None,
+    directory: Optional[pathlib.Path] = None,
+) -> None:
+    status_file(pid or os.getpid(), directory).unlink(missing_ok=True)
+
+
+def process_state(
+    pid: int,
+    directory: Optional[pathlib.Path] = None,
+) -> Optional[ProcessState]:
+    try:
+        with open(status_file(pid, directory)) as fid:
+            return ProcessState(json.load(fid)["state"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def process_states(
+    pids: Iterable[int],
+    directory: Optional[pathlib.Path] = None,
+) -> Dict[int, Optional[ProcessState]]:
+    """Get the state of each of the specified worker processes."""
+    return {pid: process_state(pid, directory) for pid in pids}
+
+
+def is_ready(
+    pids: Iterable[int],
+    directory: Optional[pathlib.Path] = None,
+) -> bool:
+    """Whether there are worker processes and all of them are ready."""
+    states = process_states(pids, directory)
+    return len(states) > 0 and all(
+        state == ProcessState.READY for state in states.values()
+    )
+
+
+def update_readiness_file(
+    readiness_file: pathlib.Path,
+    pids: Iterable[int],
+    draining: bool = False,
+    directory: Optional[pathlib.Path] = None,
+) -> bool:
+    """Create or remove the readiness file based on the state of all processes."""
+    ready = not draining and is_ready(pids, directory)
+
+    if ready:
+        readiness_file.touch()
+    else:
+        readiness_file.unlink(missing_ok=True)
+
+    return ready
+
+
+class WorkerReadiness:
+    """Readiness of the main worker process, which can be drained."""
+
+    def __init__(
+        self,
+        readiness_file: pathlib.Path,
+        directory: Optional[pathlib.Path] = None,
+    ) -> None:
+        self.readiness_file = readiness_file
+        self.directory = directory
+
+        # The consumer of the worker, available once the worker is ready
+        self.consumer: Optional[Any] = None
+
+        # When draining, the worker no longer consumes tasks and exits once idle
+        self.draining = False
+
+    def pool_pids(self) -> List[int]:
+        if self.consumer is None or self.consumer.pool is None:
+            return []
+
+        return list(self.consumer.pool.info.get("processes", []))
+
+    def update(self) -> bool:
+        """Only report ready once every pool process has a warmed Octave session."""
+        ready = update_readiness_file(
+            self.readiness_file, self.pool_pids(), self.draining, self.directory
+        )
+
+        # Exit once all in-flight (and already reserved) runs have completed
+        if self.draining and not worker_state.active_requests:
+            if not worker_state.reserved_requests:
+                # The stubs of celery only allow None
+                worker_state.should_stop = EX_OK  # type: ignore[assignment]
+
+        return ready
+
+    def drain(self, consumer: Any) -> None:
+        """Stop consuming, so the worker exits once in-flight runs completed."""
+        self.draining = True
+        self.readiness_file.unlink(missing_ok=True)
+
+        for queue in list(consumer.task_consumer.queues):
+            consumer.call_soon(consumer.cancel_task_queue, queue.name)
+
+        self.update()
+
+
+class ReadinessStep(bootsteps.StartStopStep):
+    """Consumer bootstep which refreshes the readiness of the worker.
+
+    Heartbeats are only sent when events are enabled (-E), so a timer of the
+    consumer refreshes the readiness file (and exits a drained worker) instead.
+    Subclasses set the readiness to refresh.
+    """
+
+    readiness: WorkerReadiness
+
+    def __init__(self, parent: Any, **kwargs: Any) -> None:
+        super().__init__(parent, **kwargs)
+        self.tref: Optional[Any] = None
+
+    def start(self, parent: Any) -> None:
+        self.readiness.consumer = parent
+        self.tref = parent.timer.call_repeatedly(
+            config.CELERY_WORKER_READINESS_INTERVAL, self.readiness.update
+        )
+
+    def stop(self, parent: Any) -> None:
+        if self.tref is not None:
+            self.tref.cancel()
+            self.tref = None
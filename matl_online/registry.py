@@ -0,0 +1,99 @@
+"""Registry of the task each client is running, shared by all web processes.
+
+The Socket.IO session of a client only lives in the web process which handles
+its connection. Recording the task of each room in Redis lets any web process
+(i.e. another node behind the load balancer) stop it when the client asks.
+Each task gets a random token which is handed to the client that submitted it,
+so that it can prove that the task is its own after reconnecting with a new
+session ID.
+"""
+
+import hmac
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import redis
+
+from matl_online.settings import config
+
+
+class TaskRegistry:
+    """Remembers the task (and shared run) started for each room."""
+
+    def __init__(self, client: redis.Redis, ttl: int) -> None:
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def key(room: str) -> str:
+        return f"task:{room}"
+
+    def register(
+        self,
+        room: str,
+        task_id: Optional[str],
+        shared_key: Optional[str],
+        token: Optional[str] = None,
+    ) -> None:
+        """Record the task which was started for a room."""
+        entry = {
+            "task": task_id or "",
+            "shared_key": shared_key or "",
+            "token": token or "",
+        }
+
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.hset(self.key(room), mapping=entry)
+            pipeline.expire(self.key(room), self.ttl)
+            pipeline.execute()
+        except redis.RedisError:
+            logging.exception("Unable to register a task")
+
+    def lookup(self, room: str) -> Optional[Dict[str, Optional[str]]]:
+        """The task and shared run of a room, if they are known."""
+        try:
+            entry = self.client.hgetall(self.key(room))
+        except redis.RedisError:
+            logging.exception("Unable to look up a task")
+            return None
+
+        if not isinstance(entry, dict) or not entry:
+            return None
+
+        return {
+            "task": entry.get("task") or None,
+            "shared_key": entry.get("shared_key") or None,
+            "token": entry.get("token") or None,
+        }
+
+    def owns(self, room: str, token: Any) -> bool:
+        """Whether a token is the one handed out for the task of a room."""
+        if not isinstance(token, str) or not token:
+            return False
+
+        entry = self.lookup(room)
+        if entry is None or entry["token"] is None:
+            return False
+
+        return hmac.compare_digest(entry["token"], token)
+
+    def forget(self, room: str) -> None:
+        """Remove the task of a room (i.e. once it was stopped)."""
+        try:
+            self.client.delete(self.key(room))
+        except redis.RedisError:
+            logging.exception("Unable to forget a task")
+
+
+@lru_cache(maxsize=1)
+def get_task_registry() -> Optional[TaskRegistry]:
+    """The task registry configured for this application (if any)."""
+    if not config.TASK_REGISTRY_REDIS_URL:
+        return None
+
+    return TaskRegistry(
+        redis.Redis.from_url(config.TASK_REGISTRY_REDIS_URL, decode_responses=True),
+        ttl=config.TASK_REGISTRY_TTL,
+    )
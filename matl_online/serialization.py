@@ -0,0 +1,120 @@
+"""Serialization of the messages of tasks and their results.
+
+Messages are packed with msgpack instead of pickle. Task parameters are sent
+as an extension type holding the kind of parameters followed by the values
+of their fields (see PARAMETER_FIELDS), so the field names aren't repeated in
+every message. Every message starts with the version of this format, so
+workers can reject messages they don't understand.
+"""
+
+import datetime
+import operator
+import threading
+from typing import Any, Dict, List, Tuple, Type
+
+import msgpack  # type: ignore[import]
+from kombu.serialization import register
+
+from matl_online.types import (
+    MATLExplainTaskParameters,
+    MATLRunTaskParameters,
+    MATLTaskParameters,
+)
+
+SERIALIZER = "matl"
+CONTENT_TYPE = "application/x-matl"
+
+# Version of the format, which is increased whenever messages of a previous
+# version can't be decoded anymore
+VERSION = 1
+
+# Extension type of the task parameters
+PARAMETERS = 1
+
+# Kinds of parameters (sent as small integers)
+PARAMETER_KINDS: Dict[Type[MATLTaskParameters], int] = {
+    MATLTaskParameters: 0,
+    MATLRunTaskParameters: 1,
+    MATLExplainTaskParameters: 2,
+}
+
+PARAMETER_TYPES: Dict[int, Type[MATLTaskParameters]] = {
+    kind: cls for cls, kind in PARAMETER_KINDS.items()
+}
+
+# Fields of the parameters in the order in which they are sent. New fields are
+# only ever appended (so older messages get their default value).
+PARAMETER_FIELDS: Tuple[str, ...] = (
+    "code",
+    "version",
+    "inputs",
+    "session_id",
+    "encoding",
+    "client",
+    "shared_key",
+    "cases",
+)
+
+
+_parameter_fields = operator.attrgetter(*PARAMETER_FIELDS)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, MATLTaskParameters):
+        fields = (PARAMETER_KINDS[type(value)],) + _parameter_fields(value)
+        return msgpack.ExtType(PARAMETERS, _packers.fields.pack(fields))
+
+    # Dates of results (i.e. date_done) are sent as ISO strings
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+
+    raise TypeError(f"Unable to serialize {type(value).__name__}")
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code != PARAMETERS:
+        return msgpack.ExtType(code, data)
+
+    # Fields are immutable (i.e. the cases are a tuple)
+    kind, *values = msgpack.unpackb(data, use_list=False)
+
+    return PARAMETER_TYPES[kind](**dict(zip(PARAMETER_FIELDS, values)))
+
+
+# Reusing packers halves the time spent packing small messages, but they can't
+# be shared between threads
+class _Packers(threading.local):
+
+    def __init__(self) -> None:
+        self.fields = msgpack.Packer()
+        self.message = msgpack.Packer(default=_default)
+
+
+_packers = _Packers()
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize the body of a message."""
+    packed: bytes = _packers.message.pack([VERSION, value])
+    return packed
+
+
+def loads(data: bytes) -> Any:
+    """Deserialize the body of a message (the inverse of dumps)."""
+    message: List[Any] = msgpack.unpackb(data, ext_hook=_ext_hook)
+    version, value = message
+
+    if version != VERSION:
+        raise ValueError(f"Unsupported message version {version}")
+
+    return value
+
+
+# The stubs of kombu expect text while binary serializers work with bytes
+register(
+    SERIALIZER,
+    dumps,  # type: ignore[arg-type]
+    loads,  # type: ignore[arg-type]
+    content_type=CONTENT_TYPE,
+    content_encoding="binary",
+)
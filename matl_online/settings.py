@@ -6,6 +6,18 @@ import uuid
 from typing import Any, Dict, List, Optional, Type
 
 from flask.config import Config as FlaskConfig
+from kombu import Queue
+
+from matl_online.serialization import CONTENT_TYPE, SERIALIZER
+from matl_online.types import MATLExplainTaskParameters
+
+# Queues of each class of tasks. Each is meant to be served by its own pool of
+# workers so that, for example, explanations never wait behind long runs.
+EXPLAIN_QUEUE = "explain"
+INTERACTIVE_QUEUE = "interactive"
+BATCH_QUEUE = "batch"
+
+TASK_QUEUES = (EXPLAIN_QUEUE, INTERACTIVE_QUEUE, BATCH_QUEUE)
 
 
 def _get_cors_allowed_origins() -> List[str]:
@@ -26,7 +38,9 @@ class Config(object):
 
     IMGUR_CLIENT_ID = os.environ.get("MATL_ONLINE_IMGUR_CLIENT_ID")
 
-    SECRET_KEY = str(uuid.uuid4())
+    # Every web process behind a load balancer needs the same key to accept the
+    # sessions (and CSRF tokens) signed by the others
+    SECRET_KEY: Optional[str] = os.environ.get("SECRET_KEY", str(uuid.uuid4()))
     APP_DIR = pathlib.Path(os.path.dirname(__file__)).absolute()  # This directory
     PROJECT_ROOT = APP_DIR.parent
 
@@ -48,15 +62,148 @@ class Config(object):
     OCTAVE_EXECUTABLE = "octave-cli"
     OCTAVERC = MATL_WRAP_DIR.joinpath(".octaverc")
 
+    # Time (in seconds) Octave has to return to its prompt after a program is
+    # interrupted before it is restarted instead
+    OCTAVE_INTERRUPT_TIMEOUT = float(os.environ.get("OCTAVE_INTERRUPT_TIMEOUT", "5"))
+
+    # MATL program that is run after Octave is (re)started to prime its function
+    # cache. An empty program disables the warm-up.
+    MATL_WARMUP_CODE = os.environ.get("MATL_WARMUP_CODE", "1D")
+
+    # Number of the versions most used by a worker to warm up (besides the latest)
+    MATL_WARMUP_POPULAR_VERSIONS = int(
+        os.environ.get("MATL_WARMUP_POPULAR_VERSIONS", "2")
+    )
+
+    # Time (in seconds) after which no more versions are warmed up. Worker
+    # processes get this much longer to start (see get_celery_configuration).
+    MATL_WARMUP_TIMEOUT = float(os.environ.get("MATL_WARMUP_TIMEOUT", "15"))
+
+    # Limits on the output of a single run (or since the last clc). Beyond these,
+    # only the last MATL_OUTPUT_TAIL_LINES lines are kept.
+    MATL_OUTPUT_MAX_BYTES = int(os.environ.get("MATL_OUTPUT_MAX_BYTES", "1000000"))
+    MATL_OUTPUT_MAX_LINES = int(os.environ.get("MATL_OUTPUT_MAX_LINES", "10000"))
+    MATL_OUTPUT_TAIL_LINES = int(os.environ.get("MATL_OUTPUT_TAIL_LINES", "20"))
+
+    # Programs are stopped after producing this much output in total (0 = never)
+    MATL_OUTPUT_STOP_BYTES = int(os.environ.get("MATL_OUTPUT_STOP_BYTES", "10000000"))
+
+    # Where each worker caches the programs compiled by MATL (empty = disabled)
+    # and the number of programs that are kept. Without the cache, programs are
+    # run by MATL directly (see matl_runner). Production enables the cache.
+    MATL_COMPILE_CACHE_DIRECTORY = os.environ.get("MATL_COMPILE_CACHE_DIRECTORY", "")
+    MATL_COMPILE_CACHE_SIZE = int(os.environ.get("MATL_COMPILE_CACHE_SIZE", "1000"))
+
+    # Seconds each case of a multi-case run may take (0 = only the task limit)
+    MATL_CASE_TIMEOUT = float(os.environ.get("MATL_CASE_TIMEOUT", "10"))
+
+    # How figures are rendered: "eager" (on every drawnow) or "lazy" (only when
+    # output is sent, i.e. at a pause or the end of the program)
+    MATL_RENDER_MODE = os.environ.get("MATL_RENDER_MODE", "lazy")
+
+    # Re-encode the images of programs to reduce their size (see optimize_png),
+    # optionally reducing images with many colors to a 256 color palette
+    MATL_OPTIMIZE_IMAGES = os.environ.get("MATL_OPTIMIZE_IMAGES", "") == "1"
+    MATL_IMAGE_QUANTIZE = os.environ.get("MATL_IMAGE_QUANTIZE", "") == "1"
+
+    # Number of proxies (i.e. the load balancer) in front of the web processes
+    # whose X-Forwarded-For and X-Forwarded-Proto headers are trusted. Without
+    # these, every client would have the address of the load balancer.
+    TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "0"))
+
+    # Submissions of each session and IP address are limited to SUBMIT_RATE per
+    # second (with bursts of up to SUBMIT_BURST) and each IP address may only
+    # have SUBMIT_MAX_IN_FLIGHT programs queued or running. Zero disables a limit.
+    THROTTLE_REDIS_URL = os.environ.get(
+        "THROTTLE_REDIS_URL", "redis://localhost:6379/2"
+    )
+    SUBMIT_RATE = float(os.environ.get("SUBMIT_RATE", "0.5"))
+    SUBMIT_BURST = int(os.environ.get("SUBMIT_BURST", "5"))
+    SUBMIT_MAX_IN_FLIGHT = int(os.environ.get("SUBMIT_MAX_IN_FLIGHT", "4"))
+
+    # Seconds after which a task that was never released stops counting (this
+    # should exceed the time limit of tasks)
+    SUBMIT_IN_FLIGHT_TTL = float(os.environ.get("SUBMIT_IN_FLIGHT_TTL", "120"))
+
+    # Identical programs submitted while one of them is running share that run
+    # (see singleflight). An empty URL disables this. Shared runs are forgotten
+    # after SINGLE_FLIGHT_TTL seconds, which should exceed the task time limit.
+    SINGLE_FLIGHT_REDIS_URL = os.environ.get(
+        "SINGLE_FLIGHT_REDIS_URL", "redis://localhost:6379/2"
+    )
+    SINGLE_FLIGHT_TTL = int(os.environ.get("SINGLE_FLIGHT_TTL", "120"))
+
+    # Tasks started by each client, so that any web process can stop them (see
+    # registry). An empty URL keeps them in the Socket.IO session instead,
+    # which only works with a single web process.
+    TASK_REGISTRY_REDIS_URL = os.environ.get(
+        "TASK_REGISTRY_REDIS_URL", "redis://localhost:6379/2"
+    )
+    TASK_REGISTRY_TTL = int(os.environ.get("TASK_REGISTRY_TTL", "300"))
+
+    # Limits of the batches of programs submitted to /api/run. The timeout (in
+    # seconds) applies to the batch as a whole.
+    API_MAX_PROGRAMS = int(os.environ.get("API_MAX_PROGRAMS", "500"))
+    API_RUN_TIMEOUT = float(os.environ.get("API_RUN_TIMEOUT", "300"))
+
+    # Programs of each IP address which may be queued or running through
+    # /api/run (see throttle), which are released at the latest once the
+    # timeout of their batch has passed. Zero disables the limit.
+    API_MAX_IN_FLIGHT = int(os.environ.get("API_MAX_IN_FLIGHT", "500"))
+
+    # Where the images and audio produced by programs are stored: "inline"
+    # (data URIs), "local" (a directory which has to be shared by the web
+    # servers and the workers) or "redis". Artifacts are only served from a
+    # store which is shared, so they are inline unless one is configured.
+    ARTIFACT_STORE = os.environ.get("ARTIFACT_STORE", "inline")
+    ARTIFACT_DIRECTORY = os.environ.get("ARTIFACT_DIRECTORY", "/tmp/matl_artifacts")
+    ARTIFACT_REDIS_URL = os.environ.get(
+        "ARTIFACT_REDIS_URL", "redis://localhost:6379/1"
+    )
+    ARTIFACT_TTL = int(os.environ.get("ARTIFACT_TTL", "3600"))
+    ARTIFACT_URL_PREFIX = "/artifacts/"
+
     # GitHub / Repo settings
     MATL_REPOSITORY = os.environ.get("MATL_REPO", "lmendo/MATL")
     GITHUB_HOOK_SECRET = os.environ.get("MATL_ONLINE_GITHUB_HOOK_SECRET")
+    GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+
+    # ETags (and contents) of the GitHub release pages from the last refresh
+    GITHUB_RELEASES_CACHE_FILE = pathlib.Path(
+        os.environ.get(
+            "GITHUB_RELEASES_CACHE_FILE",
+            MATL_SOURCE_DIRECTORY.joinpath(".releases.json"),
+        )
+    )
+
+    # Seconds for which each process caches the parts of pages which rarely
+    # change (i.e. the list of versions). Refreshing the releases clears the
+    # caches of all processes through Redis (see public.cache). An empty URL
+    # only clears the cache of the process doing so right away.
+    PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", "300"))
+    PAGE_CACHE_REDIS_URL = os.environ.get(
+        "PAGE_CACHE_REDIS_URL", "redis://localhost:6379/2"
+    )
 
     # Don't use Google Analytics unless we are on production
     GOOGLE_ANALYTICS_UNIVERSAL_ID: Optional[str] = None
 
     SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE")
 
+    # Output frames sent to a session within this window (in seconds) are combined
+    SOCKETIO_COALESCE_WINDOW = float(os.environ.get("SOCKETIO_COALESCE_WINDOW", "0.05"))
+
+    # Messages larger than this (in bytes) are compressed when long-polling. Over
+    # websockets, permessage-deflate is negotiated with the browser instead.
+    SOCKETIO_COMPRESSION_THRESHOLD = int(
+        os.environ.get("SOCKETIO_COMPRESSION_THRESHOLD", "1024")
+    )
+
+    # Maximum number of output frames sent to a session per second (0 = unlimited)
+    SOCKETIO_MAX_MESSAGES_PER_SECOND = float(
+        os.environ.get("SOCKETIO_MAX_MESSAGES_PER_SECOND", "20")
+    )
+
     # Rollbar
     ROLLBAR_SERVER_SIDE_TOKEN = os.environ.get("MATL_ONLINE_ROLLBAR_SERVER_SIDE_TOKEN")
     ROLLBAR_CLIENT_SIDE_TOKEN = os.environ.get("MATL_ONLINE_ROLLBAR_CLIENT_SIDE_TOKEN")
@@ -70,6 +217,17 @@ class Config(object):
     CELERY_WORKER_READINESS_FILE = os.environ.get(
         "CELERY_WORKER_READINESS_FILE", "/tmp/worker_ready"
     )
+    # Interval (in seconds) at which a worker refreshes its readiness file
+    CELERY_WORKER_READINESS_INTERVAL = float(
+        os.environ.get("CELERY_WORKER_READINESS_INTERVAL", "2")
+    )
+    # Port on which a worker exposes the metrics of all of its processes (0 = off).
+    # This requires PROMETHEUS_MULTIPROC_DIR to be set to an existing directory.
+    CELERY_WORKER_METRICS_PORT = int(os.environ.get("CELERY_WORKER_METRICS_PORT", "0"))
+    # Directory where each worker process records the state of its Octave session
+    CELERY_WORKER_STATUS_DIRECTORY = os.environ.get(
+        "CELERY_WORKER_STATUS_DIRECTORY", "/tmp/worker_status"
+    )
 
 
 class ProdConfig(Config):
@@ -79,8 +237,15 @@ class ProdConfig(Config):
     DEBUG = False
     ASSETS_DEBUG = False
 
+    # There is no fallback since every process has to share the key
+    SECRET_KEY = os.environ.get("SECRET_KEY")
+
     GOOGLE_ANALYTICS_UNIVERSAL_ID = os.environ.get("GOOGLE_ANALYTICS_UNIVERSAL_ID")
 
+    MATL_COMPILE_CACHE_DIRECTORY = os.environ.get(
+        "MATL_COMPILE_CACHE_DIRECTORY", "/tmp/matl_compiled"
+    )
+
     ROLLBAR_ENV = "production"
 
 
@@ -104,6 +269,33 @@ class TestConfig(Config):
 
     IMGUR_CLIENT_ID = "imgur_test"
 
+    # Never launch MATL programs implicitly while testing
+    MATL_WARMUP_CODE = ""
+
+    ARTIFACT_STORE = "inline"
+
+    # Every submission is run separately unless a test shares them
+    SINGLE_FLIGHT_REDIS_URL = ""
+
+    # Tasks are only looked up in the Socket.IO session
+    TASK_REGISTRY_REDIS_URL = ""
+
+    # Submissions are only limited by the tests of the throttle
+    SUBMIT_RATE = 0.0
+    SUBMIT_MAX_IN_FLIGHT = 0
+    API_MAX_IN_FLIGHT = 0
+
+    # Every program is compiled unless a test enables the cache
+    MATL_COMPILE_CACHE_DIRECTORY = ""
+
+    # Every test creates its own releases
+    PAGE_CACHE_TTL = 0.0
+    PAGE_CACHE_REDIS_URL = ""
+
+    # Send every output frame immediately while testing
+    SOCKETIO_COALESCE_WINDOW = 0.0
+    SOCKETIO_MAX_MESSAGES_PER_SECOND = 0.0
+
     WTF_CSRF_ENABLED = False
 
     PRESERVE_CONTEXT_ON_EXCEPTION = False
@@ -124,21 +316,65 @@ def get_config() -> Type[Config]:
 config = get_config()
 
 
+def route_task(
+    name: str, args: Any, kwargs: Any, options: Any, task: Any = None, **_: Any
+) -> Optional[Dict[str, str]]:
+    """Route runs of MATL programs to the queue of their class.
+
+    Explanations, runs from the site (which have a session) and runs from the
+    batch API (which don't) each have their own queue.
+    """
+    if not name.endswith(".matl_task") or not args:
+        return None
+
+    params = args[0]
+
+    if isinstance(params, MATLExplainTaskParameters):
+        return {"queue": EXPLAIN_QUEUE}
+
+    if getattr(params, "session_id", None) is None:
+        return {"queue": BATCH_QUEUE}
+
+    return {"queue": INTERACTIVE_QUEUE}
+
+
 def get_celery_configuration(configuration: FlaskConfig) -> Dict[str, Any]:
+    """Configuration of Celery.
+
+    The time limits and prefetching are those of the workers. Each class of
+    tasks is served by its own workers (started with -Q <queue>), which set
+    these through the environment. Workers without -Q serve every queue.
+    """
+    # Worker processes warm up MATL before they report that they are alive
+    proc_alive_timeout = 30 + float(configuration.get("MATL_WARMUP_TIMEOUT", 0))
+
+    # Task parameters and results are sent with a compact msgpack format (see
+    # serialization). Pickled messages queued by older versions are only
+    # accepted when CELERY_ACCEPT_PICKLE=1 is set while deploying.
+    accept_content = [CONTENT_TYPE, "application/json"]
+    if os.environ.get("CELERY_ACCEPT_PICKLE", "") == "1":
+        accept_content.append("application/x-python-serialize")
+
     return {
         "broker_url": os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0"),
         "result_backend": os.environ.get(
             "CELERY_RESULT_BACKEND", "redis://localhost:6379/0"
         ),
-        "task_soft_time_limit": 30,
-        "task_time_limit": 60,
+        "task_soft_time_limit": int(
+            os.environ.get("CELERY_TASK_SOFT_TIME_LIMIT", "30")
+        ),
+        "task_time_limit": int(os.environ.get("CELERY_TASK_TIME_LIMIT", "60")),
+        "worker_prefetch_multiplier": int(
+            os.environ.get("CELERY_WORKER_PREFETCH_MULTIPLIER", "4")
+        ),
+        "task_queues": [Queue(name) for name in TASK_QUEUES],
+        "task_default_queue": INTERACTIVE_QUEUE,
+        "task_routes": (route_task,),
         # Custom timeout for celery process initialization
-        "worker_proc_alive_timeout": 30,
+        "worker_proc_alive_timeout": proc_alive_timeout,
         # Ensure that celery tasks are executed locally when in a test environment
         "task_always_eager": configuration.get("ENV") == "test",
-        # Use pickling for serialization to allow first-class objects rather than dicts.
-        # The source is also trusted therefore it should be secure enough
-        "accept_content": ["application/json", "application/x-python-serialize"],
-        "task_serializer": "pickle",
-        "result_serializer": "pickle",
+        "accept_content": accept_content,
+        "task_serializer": SERIALIZER,
+        "result_serializer": SERIALIZER,
     }
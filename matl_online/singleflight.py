@@ -0,0 +1,175 @@
+"""Sharing a single run between everyone who submits the same program.
+
+When a link to a program is shared, many people run the exact same code with
+the same inputs within seconds of each other. The first submission runs the
+program as usual while later identical submissions only subscribe their room
+to that run. The worker then sends its output to every subscribed room.
+
+Each shared run has a key in Redis (holding the ID of its task) and a hash of
+the subscribed rooms and the encoding each of them uses.
+"""
+
+import hashlib
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import redis
+
+from matl_online.settings import config
+from matl_online.types import MATLRunTaskParameters, MATLTaskParameters
+
+# Programs using MATL's random number (r, Xr, Yr, Zr) or clock (Z') functions
+# produce different output each time, so these are never shared
+NONDETERMINISTIC = frozenset(["r", "Xr", "Yr", "Zr", "Z'"])
+
+# Tokens of MATL code: functions with two characters (which start with X, Y or
+# Z), string literals (where '' is a quote), comments and any other character
+TOKENS = re.compile(r"[XYZ].|'(?:[^']|'')*'?|%[^\n]*|.", re.DOTALL)
+
+
+def is_deterministic(code: str) -> bool:
+    """Whether a program calls none of the NONDETERMINISTIC functions.
+
+    String literals and comments (i.e. 'hello world') aren't calls.
+    """
+    return NONDETERMINISTIC.isdisjoint(TOKENS.findall(code))
+
+
+# Subscribes a room, returning whether the program was already running
+JOIN = """
+local running = redis.call('EXISTS', KEYS[1])
+
+if running == 0 then
+    redis.call('SET', KEYS[1], '', 'EX', ARGV[3])
+end
+
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+
+return running
+"""
+
+# Ends a run, returning the rooms which were subscribed. Programs submitted
+# afterwards are run again.
+FINISH = """
+local rooms = redis.call('HGETALL', KEYS[2])
+redis.call('DEL', KEYS[1], KEYS[2])
+return rooms
+"""
+
+# Unsubscribes a room, returning the task ID (and ending the run) if no other
+# rooms remain
+LEAVE = """
+redis.call('HDEL', KEYS[2], ARGV[1])
+
+if redis.call('HLEN', KEYS[2]) > 0 then
+    return false
+end
+
+local task = redis.call('GET', KEYS[1])
+redis.call('DEL', KEYS[1], KEYS[2])
+return task
+"""
+
+
+def _rooms(values: Any) -> Dict[str, str]:
+    return dict(zip(values[::2], values[1::2]))
+
+
+class SingleFlight:
+    """Shares the runs of identical programs between rooms."""
+
+    def __init__(self, client: redis.Redis, ttl: int) -> None:
+        self.client = client
+        self.ttl = ttl
+        self._join = client.register_script(JOIN)
+        self._finish = client.register_script(FINISH)
+        self._leave = client.register_script(LEAVE)
+
+    @staticmethod
+    def key(params: MATLTaskParameters) -> Optional[str]:
+        """Identifies the run of a program (if it may be shared)."""
+        if not isinstance(params, MATLRunTaskParameters) or params.cases:
+            return None
+
+        if not is_deterministic(params.code):
+            return None
+
+        digest = hashlib.sha256(
+            "\0".join([params.version, params.code, params.inputs]).encode()
+        ).hexdigest()
+
+        return f"flight:{digest}"
+
+    @staticmethod
+    def rooms_key(key: str) -> str:
+        return f"{key}:rooms"
+
+    def join(self, key: str, room: str, encoding: str) -> bool:
+        """Subscribe a room to the run of a program.
+
+        Returns whether the program is already running. Otherwise the caller
+        has to run it (with its shared_key set).
+        """
+        try:
+            running = self._join(
+                keys=[key, self.rooms_key(key)], args=[room, encoding, self.ttl]
+            )
+        except redis.RedisError:
+            logging.exception("Unable to join a shared run")
+            return False
+
+        return bool(running)
+
+    def set_task(self, key: str, task_id: str) -> None:
+        """Record the task which runs the program."""
+        try:
+            self.client.set(key, task_id, xx=True, keepttl=True)
+        except redis.RedisError:
+            logging.exception("Unable to record the task of a shared run")
+
+    def subscribers(self, key: str) -> Optional[Dict[str, str]]:
+        """Rooms (and their encodings) subscribed to a run."""
+        try:
+            rooms = self.client.hgetall(self.rooms_key(key))
+        except redis.RedisError:
+            logging.exception("Unable to retrieve the rooms of a shared run")
+            return None
+
+        return dict(rooms) if isinstance(rooms, dict) else None
+
+    def finish(self, key: str) -> Optional[Dict[str, str]]:
+        """End a run, returning the rooms which should receive its results."""
+        try:
+            return _rooms(self._finish(keys=[key, self.rooms_key(key)]))
+        except redis.RedisError:
+            logging.exception("Unable to finish a shared run")
+            return None
+
+    def leave(self, key: str, room: str, task_id: Optional[str]) -> Optional[str]:
+        """Unsubscribe a room, returning the task to stop (if any).
+
+        The run is only stopped once no rooms are left. If Redis can't be
+        reached, the provided task is stopped.
+        """
+        try:
+            remaining = self._leave(keys=[key, self.rooms_key(key)], args=[room])
+        except redis.RedisError:
+            logging.exception("Unable to leave a shared run")
+            return task_id
+
+        return str(remaining) if remaining else None
+
+
+@lru_cache(maxsize=1)
+def get_single_flight() -> Optional[SingleFlight]:
+    """The single-flight configured for this application (if any)."""
+    if not config.SINGLE_FLIGHT_REDIS_URL:
+        return None
+
+    return SingleFlight(
+        redis.Redis.from_url(config.SINGLE_FLIGHT_REDIS_URL, decode_responses=True),
+        ttl=config.SINGLE_FLIGHT_TTL,
+    )
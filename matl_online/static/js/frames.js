@@ -0,0 +1,118 @@
+// Decoding of the compact (msgpack) output frames sent by the server.
+//
+// Each frame is an array of [session, seq, reset, items] where each item is
+// a [type code, value] pair (see matl_online/encoding.py). Only the subset of
+// msgpack which is needed for these frames is supported.
+var MATLFrames = (function() {
+
+    var TYPE_NAMES = ['stdout', 'stdout2', 'stderr', 'image', 'image_nn', 'audio', 'truncated'];
+
+    var utf8 = window.TextDecoder ? new TextDecoder('utf-8') : null;
+
+    function Reader(buffer) {
+        this.bytes = new Uint8Array(buffer);
+        this.view = new DataView(this.bytes.buffer, this.bytes.byteOffset, this.bytes.byteLength);
+        this.offset = 0;
+    }
+
+    Reader.prototype.uint = function(size) {
+        var offset = this.offset;
+        this.offset += size;
+
+        switch ( size ) {
+            case 1: return this.view.getUint8(offset);
+            case 2: return this.view.getUint16(offset);
+            case 4: return this.view.getUint32(offset);
+            default: return this.view.getUint32(offset) * 4294967296 + this.view.getUint32(offset + 4);
+        }
+    };
+
+    Reader.prototype.int = function(size) {
+        var offset = this.offset;
+        this.offset += size;
+
+        switch ( size ) {
+            case 1: return this.view.getInt8(offset);
+            case 2: return this.view.getInt16(offset);
+            case 4: return this.view.getInt32(offset);
+            default: return this.view.getInt32(offset) * 4294967296 + this.view.getUint32(offset + 4);
+        }
+    };
+
+    Reader.prototype.str = function(length) {
+        var bytes = this.bytes.subarray(this.offset, this.offset + length);
+        this.offset += length;
+        return utf8.decode(bytes);
+    };
+
+    Reader.prototype.array = function(length) {
+        var result = [];
+        for ( var i = 0; i < length; i++ ) {
+            result.push(this.value());
+        }
+        return result;
+    };
+
+    Reader.prototype.map = function(length) {
+        var result = {};
+        for ( var i = 0; i < length; i++ ) {
+            var key = this.value();
+            result[key] = this.value();
+        }
+        return result;
+    };
+
+    Reader.prototype.value = function() {
+        var type = this.uint(1);
+
+        if ( type < 0x80 ) { return type; }
+        if ( type < 0x90 ) { return this.map(type & 0x0f); }
+        if ( type < 0xa0 ) { return this.array(type & 0x0f); }
+        if ( type < 0xc0 ) { return this.str(type & 0x1f); }
+        if ( type >= 0xe0 ) { return type - 0x100; }
+
+        switch ( type ) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xca: var f = this.view.getFloat32(this.offset); this.offset += 4; return f;
+            case 0xcb: var d = this.view.getFloat64(this.offset); this.offset += 8; return d;
+            case 0xcc: return this.uint(1);
+            case 0xcd: return this.uint(2);
+            case 0xce: return this.uint(4);
+            case 0xcf: return this.uint(8);
+            case 0xd0: return this.int(1);
+            case 0xd1: return this.int(2);
+            case 0xd2: return this.int(4);
+            case 0xd3: return this.int(8);
+            case 0xd9: return this.str(this.uint(1));
+            case 0xda: return this.str(this.uint(2));
+            case 0xdb: return this.str(this.uint(4));
+            case 0xdc: return this.array(this.uint(2));
+            case 0xdd: return this.array(this.uint(4));
+            case 0xde: return this.map(this.uint(2));
+            case 0xdf: return this.map(this.uint(4));
+        }
+
+        throw new Error('Unsupported msgpack type 0x' + type.toString(16));
+    };
+
+    return {
+        // Whether this browser is able to decode compact frames
+        supported: utf8 !== null && typeof DataView !== 'undefined',
+
+        decode: function(buffer) {
+            var frame = new Reader(buffer).value();
+
+            return {
+                session: frame[0],
+                seq: frame[1],
+                reset: frame[2],
+                data: frame[3].map(function(item) {
+                    var name = TYPE_NAMES[item[0]];
+                    return { type: name === undefined ? item[0] : name, value: item[1] };
+                })
+            };
+        }
+    };
+})();
@@ -5,8 +5,13 @@ $(document).ready(function() {
                             '//' + document.domain +
                             (location.port ? ":" + location.port : ""));
     var uuid;
+    var taskUuid;
+    var taskToken;
     var running = false;
 
+    // Sequence number of the last output frame received for this run
+    var lastSeq = -1;
+
     var runtext = 'Run (ctrl + enter)';
     var killtext = 'Kill (esc)';
 
@@ -73,19 +78,29 @@ $(document).ready(function() {
         $('#errorconsoletab').css('font-weight', 'normal');
         $('#errors').html('');
         $('#output').html('');
+        lastSeq = -1;
 
         var timeoutId = setTimeout(timeoutFcn, 2000);
 
+        // Kill requests refer to the room the task was submitted from, which
+        // changes when reconnecting
+        taskUuid = uuid;
+        taskToken = undefined;
+
         socket.emit('submit', {
             code: $('#code').val(),
             inputs: $('#inputs').val(),
             debug: $('#debug').val(),
             version: $('#version').data('version'),
+            encoding: MATLFrames.supported ? 'msgpack' : 'json',
             uid: uuid
         }, function(resp){
             // Make sure that we don't fire the timeout callback
             clearTimeout(timeoutId);
 
+            // The token proves that the task is ours after reconnecting
+            taskToken = resp && resp.token;
+
             // Change the status and update the button functionality
             running = true;
             $('#run').text(killtext);
@@ -162,11 +177,17 @@ $(document).ready(function() {
     socket.on('complete', function(msg) {
         $('#run').text(runtext);
         running = false;
+
+        // The submission was rejected because of too many recent submissions
+        if ( msg && msg.throttled ) {
+            $('#errors').append(document.createTextNode(msg.message + '\n'));
+            $('#errorconsoletab').css('font-weight', 'bold');
+        }
         console.log('Task complete.');
     });
 
     function killjob(){
-        socket.emit('kill', {uid: uuid});
+        socket.emit('kill', {uid: taskUuid || uuid, token: taskToken});
     }
 
     $('#run').on('click', function() {
@@ -178,15 +199,25 @@ $(document).ready(function() {
     });
 
     socket.on('status', function(data) {
+        // Compact frames are sent as binary messages
+        if ( data instanceof ArrayBuffer || ArrayBuffer.isView(data) ) {
+            data = MATLFrames.decode(data);
+        }
+
         var output = $('#output');
         var errors = $('#errors');
 
         console.log('Output received.');
 
-        // Clear the output
-        output.text('');
+        // Each frame only contains the output produced since the last one
+        if ( data['session'] === uuid && data['seq'] > lastSeq ) {
+            lastSeq = data['seq'];
+
+            // Clear the output (i.e. after a clc)
+            if ( data['reset'] ) {
+                output.text('');
+            }
 
-        if ( data['session'] === uuid ) {
             data['data'].forEach(function(item) {
                 switch ( item.type ) {
                     case 'image':
@@ -235,6 +266,9 @@ $(document).ready(function() {
                         span.append(audio_tag);
                         output.append(span)
                         break
+                    case 'truncated':
+                        output.append($('<div/>', { 'class': 'truncated', text: item.value }));
+                        break;
                     case 'stderr':
                         errors.append(document.createTextNode(item.value + '\n'));
                         $('#errorconsoletab').css('font-weight', 'bold');
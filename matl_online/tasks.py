@@ -4,36 +4,124 @@ from __future__ import annotations
 
 import logging
 import pathlib
+import signal
 import tempfile
+import time
+from collections import Counter, deque
 from functools import cached_property
 from logging import LogRecord, StreamHandler
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 
 from celery import Task
 from celery.exceptions import SoftTimeLimitExceeded
-from celery.signals import task_failure, worker_process_init
+from celery.signals import task_failure, worker_process_init, worker_process_shutdown
 from flask_socketio import SocketIO  # type: ignore
+from prometheus_client import Counter as MetricCounter
+from prometheus_client import Histogram
+from sqlalchemy.exc import SQLAlchemyError
 
+from matl_online.emitter import CoalescingEmitter
+from matl_online.encoding import JSON
+from matl_online.errors import MissingDirectory, OutputLimitExceeded, TaskCancelled
 from matl_online.extensions import celery, rollbar
 from matl_online.matl.core import matl
-from matl_online.matl.io import parse_matl_results
+from matl_online.matl.io import TEXT, FrameDecoder, MATLOutputParser
+from matl_online.matl.source import get_matl_folder
 from matl_online.octave import OctaveSession
+from matl_online.public.models import Release
+from matl_online.readiness import ProcessState, clear_process_state, set_process_state
 from matl_online.settings import config
-from matl_online.types import MATLTaskParameters
+from matl_online.singleflight import get_single_flight
+from matl_online.throttle import get_throttle
+from matl_online.types import MATLRunTaskParameters, MATLTaskParameters
 
 octave = None
 
+# Number of runs of each MATL version handled by this worker process
+version_usage: Counter[str] = Counter()
+
+# Images which were not sent (or sent smaller) to the clients
+duplicate_images = MetricCounter(
+    "matl_duplicate_images", "Number of unchanged images which were not sent again"
+)
+image_bytes_saved = Histogram(
+    "matl_image_bytes_saved",
+    "Bytes of images saved per run by skipping duplicates and re-encoding",
+    buckets=(0, 1e3, 1e4, 1e5, 1e6, 1e7),
+)
+
+# Types of the items of the output which are displayed as the figure
+IMAGE_TYPES = ("image", "image_nn")
+
+# Signal sent to a worker process to cancel the task which it is running. The
+# worker already uses SIGUSR1 for soft time limits and ignores SIGINT.
+CANCEL_SIGNAL = signal.SIGUSR2
+
+# Whether Octave could be interrupted after a program was stopped early (i.e.
+# cancelled or timed out) or had to be restarted
+octave_recoveries = MetricCounter(
+    "matl_octave_recoveries",
+    "Programs stopped early by whether Octave was interrupted or restarted",
+    ["outcome"],
+)
+
 socket = SocketIO(message_queue=config.SOCKETIO_MESSAGE_QUEUE)
 
+
+def _send(*args: Any, **kwargs: Any) -> None:
+    socket.emit(*args, **kwargs)
+
+
+emitter = CoalescingEmitter(
+    _send,
+    window=config.SOCKETIO_COALESCE_WINDOW,
+    max_messages_per_second=config.SOCKETIO_MAX_MESSAGES_PER_SECOND,
+)
+
 Task.__class_getitem__ = classmethod(lambda cls, *args, **kwargs: cls)  # type: ignore[attr-defined]
 
 
 class OutputHandler(StreamHandler):  # type: ignore
     """Custom handler for converting logged data to socket events."""
 
-    contents: List[str]
+    decoder: FrameDecoder
+    parser: MATLOutputParser
     task: "OctaveTask"
 
+    # Sequence number of the next frame sent for the current run
+    sequence: int
+
+    # Whether the client should discard its output before the next frame
+    pending_reset: bool
+
+    # Size of the output that is kept since the last clear
+    size: int
+    lines: int
+
+    # Most recent output (type and contents) once the limits have been reached
+    tail: Deque[Tuple[str, str]]
+    truncated: bool
+    omitted_lines: int
+
+    # Size of all output of the current run, including anything discarded
+    total_size: int
+    stopped: bool
+
+    # Output before the first case and the output of each case of a multi-case
+    # run, along with when the current case started
+    preamble: List[Dict[str, str]]
+    cases: List[Dict[str, Any]]
+    case_start: Optional[float]
+
+    # Rooms which received the previous frame
+    rooms: Set[str]
+
+    # Last image sent since the output was cleared, and the number (and size)
+    # of unchanged images which were not sent again
+    last_image: Optional[Dict[str, str]]
+    skipped_images: int
+    skipped_image_bytes: int
+
     def __init__(
         self,
         task: "OctaveTask",
@@ -43,61 +131,255 @@ class OutputHandler(StreamHandler):  # type: ignore
         """Initialize the handler with the task we are handling."""
         StreamHandler.__init__(self, *args, **kwargs)
         self.task = task
-        self.contents = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Prepare for a new run, discarding any previous output."""
+        self.parser = MATLOutputParser(framed=True)
+        self.clear()
+        self.decoder = FrameDecoder()
+        self.sequence = 0
+        self.pending_reset = False
+        self.rooms = set()
+        self.total_size = 0
+        self.stopped = False
+        self.preamble = []
+        self.cases = []
+        self.case_start = None
+        self.skipped_images = 0
+        self.skipped_image_bytes = 0
 
     def clear(self) -> None:
         """Clear all messages that have been logged so far."""
-        self.contents = []
+        self.parser.clear()
+        self.last_image = None
+        self.pending_reset = True
+        self.size = 0
+        self.lines = 0
+        self.tail = deque()
+        self.truncated = False
+        self.omitted_lines = 0
+
+    def send(self, final: bool = False) -> None:
+        """Send any new output to the specified rooms.
+
+        Each frame only contains the output since the previous frame. Rooms
+        which subscribed to a shared run since the previous frame receive all
+        output so far instead. Runs without a session (i.e. batches) only
+        return their results.
+        """
+        if final:
+            self.flush_tail()
 
-    def messages(self) -> str:
-        """Concatenate all messages into a long stream."""
-        return "\n".join([x for x in self.contents])
+        data = self.skip_unchanged_images(self.parser.flush(final))
+        subscribers = self.task.update_subscribers(final)
 
-    def send(self) -> Dict[str, Any]:
-        """Send a message out to the specified rooms."""
-        output = parse_matl_results(self.messages())
-        result = {"data": output, "session": self.task.session_id}
-        socket.emit("status", result, room=self.task.session_id)
-        return result
+        for room, encoding in subscribers.items():
+            frame = {
+                "data": data if room in self.rooms else self.parser.snapshot(),
+                "session": room,
+                "seq": self.sequence,
+                "reset": self.pending_reset,
+            }
+
+            # The final frame is never held back
+            emitter.emit_frame(frame, room=room, force=final, encoding=encoding)
+
+        self.rooms = set(subscribers)
+
+        if subscribers:
+            self.sequence += 1
+            self.pending_reset = False
+
+        if final:
+            if self.case_start is not None:
+                self.close_case()
+
+            self.record_metrics()
+
+    def skip_unchanged_images(self, data: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Leave out images which are identical to the one displayed already.
+
+        The client only displays the latest image, so an unchanged figure
+        (i.e. a frame of an animation) doesn't need to be sent again. The
+        results still contain every image.
+        """
+        frame = []
+
+        for item in data:
+            if item["type"] in IMAGE_TYPES:
+                if item == self.last_image:
+                    self.skipped_images += 1
+                    self.skipped_image_bytes += len(item["value"])
+                    continue
+
+                self.last_image = item
+
+            frame.append(item)
+
+        return frame
+
+    def record_metrics(self) -> None:
+        duplicate_images.inc(self.skipped_images)
+        image_bytes_saved.observe(
+            self.parser.image_bytes_saved + self.skipped_image_bytes
+        )
+
+        self.parser.image_bytes_saved = 0
+        self.skipped_images = 0
+        self.skipped_image_bytes = 0
+
+    def results(self) -> Dict[str, Any]:
+        """The complete output so far."""
+        if not self.cases:
+            return {"data": self.parser.results(), "session": self.task.session_id}
+
+        return {
+            "data": self.preamble,
+            "cases": self.cases,
+            "session": self.task.session_id,
+        }
+
+    def next_case(self) -> None:
+        """Separate the output of the next case of a multi-case run."""
+        self.flush_tail()
+        self.send()
+        self.close_case()
+        self.clear()
+
+        self.case_start = time.perf_counter()
+
+    def close_case(self) -> None:
+        """Keep the output of the current case as its own result set."""
+        if self.case_start is None:
+            # Any output before the first case
+            self.preamble = self.parser.results()
+            return
+
+        self.cases.append(
+            {
+                "output": self.parser.results(),
+                "time": time.perf_counter() - self.case_start,
+            }
+        )
+        self.case_start = None
 
     def emit(self, record: LogRecord) -> None:
         """Overloaded emit method to receive LogRecord instances."""
-        # Look to see if there are any special commands in here. These
-        # commands will clear the output:
-        #
-        #   1. [PAUSE]  Send everything that we have so far
-        #   2. [CLC]    Send an empty message and clear contents
-        #   3. [IMAGE]  FUTURE ENCODING TO BASE64
-
         if record.levelno == logging.INFO:
             self.process_message(record.msg)
 
     def process_message(self, message: str) -> None:
-        """Append a message to be sent back to the user."""
+        """Handle a line of output from Octave."""
         print(message)
 
-        if message == "[PAUSE]":
-            # For now, we send the entire message again. Consider a better
-            # approach (i.e. adding a field to the result that says to
-            # flush prior to display)
-            self.send()
-            return
+        text, record = self.decoder.decode(message)
 
-        if message == "[CLC]":
-            self.send()
-            self.clear()
-            return
+        if record is None:
+            self.process_text(message)
+        else:
+            if text:
+                self.process_text(text)
+
+            self.process_record(*record)
 
+        self.check_limit()
+
+    def process_text(self, message: str) -> None:
+        """Append regular output to be sent back to the user."""
         if message.startswith("warning:"):
             return
 
         if message.startswith("MATL run-time error:"):
             for item in message.split("\n"):
-                self.contents.append("[STDERR]" + item)
+                self.append(item, "STDERR")
+
+            return
 
+        self.append(message)
+
+    def process_record(self, kind: str, payload: str) -> None:
+        """Handle a record emitted by the MATL wrappers.
+
+        These records control the output:
+
+          1. PAUSE  Send everything that we have so far
+          2. CLC    Send an empty message and clear contents
+          3. CASE   Start the output of the next case
+        """
+        if kind == "PAUSE":
+            self.send()
+        elif kind == "CASE":
+            self.next_case()
+        elif kind == "CLC":
+            self.send()
+            self.clear()
+        else:
+            self.append(payload, kind)
+
+    def error(self, message: str) -> None:
+        """Report an error to the user."""
+        self.append(message, "STDERR")
+
+    def check_limit(self) -> None:
+        limit = config.MATL_OUTPUT_STOP_BYTES
+
+        if limit and self.total_size > limit and not self.stopped:
+            self.stopped = True
+            raise OutputLimitExceeded(f"Output exceeded {limit} bytes")
+
+    def append(self, message: str, kind: str = TEXT) -> None:
+        size = len(message.encode()) + 1
+        lines = message.count("\n") + 1
+
+        self.total_size += size
+
+        fits = self.size + size <= config.MATL_OUTPUT_MAX_BYTES
+        fits &= self.lines + lines <= config.MATL_OUTPUT_MAX_LINES
+
+        if fits and not self.truncated:
+            self.size += size
+            self.lines += lines
+            self.add(message, kind)
+        else:
+            self.append_tail(message, kind)
+
+    def add(self, message: str, kind: str) -> None:
+        if kind == TEXT:
+            self.parser.feed(message)
+        else:
+            self.parser.add_record(kind, message)
+
+    def append_tail(self, message: str, kind: str) -> None:
+        """Keep only the most recent output once the limits are reached."""
+        self.truncated = True
+
+        # Keep the end of any excessively long lines
+        tail_size = config.MATL_OUTPUT_MAX_BYTES // 10
+        if len(message) > tail_size:
+            message = message[-tail_size:]
+
+        if kind == TEXT:
+            self.tail.extend((kind, line) for line in message.split("\n"))
+        else:
+            self.tail.append((kind, message))
+
+        while len(self.tail) > config.MATL_OUTPUT_TAIL_LINES:
+            self.tail.popleft()
+            self.omitted_lines += 1
+
+    def flush_tail(self) -> None:
+        """Add the truncation marker and the most recent output."""
+        if not self.truncated:
             return
 
-        self.contents.append(message)
+        self.add(f"{self.omitted_lines} lines of output omitted", "TRUNCATED")
+
+        for kind, message in self.tail:
+            self.add(message, kind)
+
+        self.tail.clear()
+        self.truncated = False
 
 
 class OctaveTask(Task[[MATLTaskParameters], None]):
@@ -105,8 +387,16 @@ class OctaveTask(Task[[MATLTaskParameters], None]):
 
     abstract: bool = True
     session_id: Optional[str] = None
+    encoding: str = JSON
+    shared_key: Optional[str] = None
+
+    # Rooms (and their encodings) subscribed to a shared run
+    subscribers: Optional[Dict[str, str]] = None
 
-    throws = (SoftTimeLimitExceeded,)
+    # Whether a program is running, which may be cancelled (see _cancel)
+    running: bool = False
+
+    throws = (SoftTimeLimitExceeded, TaskCancelled)
 
     @property
     def octave(self) -> Optional[OctaveSession]:
@@ -120,13 +410,64 @@ class OctaveTask(Task[[MATLTaskParameters], None]):
 
     def emit(self, *args: Any, **kwargs: Any) -> None:
         """Send an event to any listening clients."""
-        socket.emit(*args, room=self.session_id, **kwargs)
+        # Runs without a session have no subscribers, so their events are
+        # never broadcast
+        for room in self.rooms():
+            emitter.emit(*args, room=room, **kwargs)
+
+    def rooms(self) -> Dict[str, str]:
+        """Rooms (and their encodings) which receive the output of the run."""
+        if self.subscribers is not None:
+            return self.subscribers
+
+        if self.session_id is None:
+            return {}
+
+        return {self.session_id: self.encoding}
+
+    def update_subscribers(self, final: bool = False) -> Dict[str, str]:
+        """Refresh the rooms which receive the output of a shared run.
+
+        The final update ends the run, so identical programs submitted
+        afterwards are run again. The rooms are kept as they are if Redis
+        can't be reached.
+        """
+        flight = get_single_flight()
+
+        if self.shared_key is None or flight is None:
+            return self.rooms()
+
+        if final:
+            # Any later events (i.e. on failure) go to the same rooms
+            subscribers = flight.finish(self.shared_key)
+            self.shared_key = None
+        else:
+            subscribers = flight.subscribers(self.shared_key)
+
+        if subscribers is not None:
+            self.subscribers = subscribers
+
+        return self.rooms()
 
     def on_term(self) -> None:
-        """Clean up after termination event."""
-        # Restart octave, so we're ready to go with future calls
-        if self.octave:
+        """Clean up after termination event.
+
+        The program which was running has normally been interrupted already
+        (see OctaveSession.eval). Octave is only restarted if that failed.
+        """
+        if not self.octave:
+            return
+
+        if self.octave.alive:
+            octave_recoveries.labels("interrupted").inc()
+        else:
+            octave_recoveries.labels("restarted").inc()
+
+            # Restart octave, so we're ready to go with future calls
+            set_process_state(ProcessState.RESTARTING)
             self.octave.restart()
+            warm_up(self.octave)
+            set_process_state(ProcessState.READY)
 
     def on_success(self, *args: Any, **kwargs: Any) -> None:
         """Send a completion messages upon successful completion."""
@@ -145,13 +486,30 @@ class OctaveTask(Task[[MATLTaskParameters], None]):
 
     def send_results(self) -> Dict[str, Any]:
         """Local forwarder for all send events."""
-        return self.handler.send()
+        self.handler.send(final=True)
+        return self.handler.results()
 
     def on_failure(self, *args: Any, **kwargs: Any) -> None:
         """Send a message if the task failed for any reason."""
         self.send_results()
         self.emit("complete", {"success": False})
 
+    def after_return(
+        self,
+        status: str,
+        retval: Any,
+        task_id: str,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        einfo: Any,
+    ) -> None:
+        """Stop counting the task against the client which submitted it."""
+        params = args[0] if args else None
+        throttle = get_throttle()
+
+        if throttle is not None and isinstance(params, MATLTaskParameters):
+            throttle.release(params.client, task_id)
+
 
 @celery.task(base=OctaveTask, bind=True)
 def matl_task(
@@ -160,40 +518,138 @@ def matl_task(
 ) -> Dict[str, Any]:
     """Celery task for processing a MATL command and returning the result."""
     task.session_id = params.session_id
-    task.handler.clear()
+    task.encoding = params.encoding
+    task.shared_key = params.shared_key
+    task.subscribers = None
+    task.handler.reset()
+
+    version_usage[params.version] += 1
 
     assert task.octave, "Octave is not configured properly"
 
+    start = time.perf_counter()
+
     with tempfile.TemporaryDirectory() as folder:
         try:
-            matl(
-                task.octave,
-                params,
-                directory=pathlib.Path(folder),
-                line_handler=task.handler.process_message,
-            )
+            task.running = True
+
+            try:
+                matl(
+                    task.octave,
+                    params,
+                    directory=pathlib.Path(folder),
+                    line_handler=task.handler.process_message,
+                    token=task.handler.decoder.token,
+                )
+            finally:
+                task.running = False
+
+            result = task.send_results()
 
+        except OutputLimitExceeded:
+            # Whatever output was kept is still returned to the user
+            task.handler.error("Output limit exceeded")
             result = task.send_results()
 
+            # Octave was interrupted while it was still producing output
+            task.on_term()
+
+        except TaskCancelled:
+            # The user stopped the program (see kill_task)
+            task.handler.error("Job cancelled")
+            task.on_term()
+            raise
+
         # In the case of an interrupt (either through a time limit or a
         # revoke() event, we will still clean things up
         except (KeyboardInterrupt, SystemExit):
-            task.handler.process_message("[STDERR]Job cancelled")
+            task.handler.error("Job cancelled")
             task.on_kill()
             raise
         except SoftTimeLimitExceeded:
             # Propagate the term event up the chain to actually kill the worker
-            task.handler.process_message("[STDERR]Operation timed out")
+            task.handler.error("Operation timed out")
             task.on_term()
             raise
         except Exception:
-            task.handler.process_message("[STDERR]Unknown error")
+            task.handler.error("Unknown error")
             task.on_term()
             raise
 
+    result["time"] = time.perf_counter() - start
+
     return result
 
 
+def _latest_version() -> Optional[str]:
+    try:
+        latest = Release.latest()
+    except (RuntimeError, SQLAlchemyError):
+        logging.exception("Unable to determine the latest MATL version")
+        return None
+
+    return None if latest is None else str(latest.tag)
+
+
+def warm_up_versions() -> List[str]:
+    """Versions to warm up: the latest plus the most used by this process."""
+    versions = [
+        version
+        for version, _ in version_usage.most_common(config.MATL_WARMUP_POPULAR_VERSIONS)
+    ]
+
+    latest = _latest_version()
+
+    if latest is not None and latest not in versions:
+        versions.insert(0, latest)
+
+    return versions
+
+
+def warm_up(session: OctaveSession) -> None:
+    """Run a quick MATL program for each version to prime Octave's caches.
+
+    The first run of a version otherwise pays for Octave parsing all of the
+    MATL source files that it needs. Worker processes are killed if they take
+    too long to start (see worker_proc_alive_timeout), so versions which
+    aren't installed yet or don't fit within MATL_WARMUP_TIMEOUT are left to
+    their first program.
+    """
+    if not config.MATL_WARMUP_CODE:
+        return
+
+    deadline = time.monotonic() + config.MATL_WARMUP_TIMEOUT
+
+    for version in warm_up_versions():
+        if time.monotonic() >= deadline:
+            logging.info(f"Not warming up MATL version {version} in time")
+            break
+
+        # Downloading a version may take arbitrarily long
+        try:
+            get_matl_folder(version, install=False)
+        except MissingDirectory:
+            continue
+
+        params = MATLRunTaskParameters(code=config.MATL_WARMUP_CODE, version=version)
+
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                matl(session, params, directory=pathlib.Path(folder))
+        except Exception:
+            logging.exception(f"Unable to warm up MATL version {version}")
+
+
+def _cancel(signum: int, frame: Any) -> None:
+    """Stop the program which is running when its task is revoked.
+
+    Unlike terminating the task, this keeps the worker process (and Octave)
+    around for the next task.
+    """
+    if matl_task.running:
+        raise TaskCancelled()
+
+
 def _initialize_process(**kwargs: Any) -> None:
     """Initialize the octave instance.
 
@@ -204,6 +660,8 @@ def _initialize_process(**kwargs: Any) -> None:
     # Create a global reference to octave that is unique to this worker process
     global octave
 
+    set_process_state(ProcessState.STARTING)
+
     octave = OctaveSession(
         octaverc=config.OCTAVERC,
         default_paths=[
@@ -212,6 +670,19 @@ def _initialize_process(**kwargs: Any) -> None:
         logger=logging.Logger(__name__),
     )
 
+    warm_up(octave)
+
+    # Tasks revoked by the user are cancelled by this signal (see kill_task)
+    signal.signal(CANCEL_SIGNAL, _cancel)
+
+    # Only now is this process actually able to handle tasks
+    set_process_state(ProcessState.READY)
+
+
+def _shutdown_process(**kwargs: Any) -> None:
+    """Remove the status of a worker process that is exiting."""
+    clear_process_state()
+
 
 @task_failure.connect
 def handle_task_failure(**kwargs: Any) -> None:
@@ -220,3 +691,4 @@ def handle_task_failure(**kwargs: Any) -> None:
 
 # When a worker process is spawned, initialize octave
 worker_process_init.connect(_initialize_process)
+worker_process_shutdown.connect(_shutdown_process)
@@ -0,0 +1,189 @@
+"""Rate limiting of the programs submitted by each client.
+
+Every session and IP address has a token bucket in Redis which allows short
+bursts of submissions while limiting their sustained rate. In addition, each IP
+address may only have a few programs queued or running at once (or a single
+batch of programs submitted through /api/run). Workers take tasks in the order
+they were queued, so this bounds the share of the queue of any single client
+and keeps everyone else from being starved.
+"""
+
+import logging
+import math
+from functools import lru_cache
+from typing import List, Optional, Sequence, Union
+
+import redis
+
+from matl_online.errors import Throttled
+from matl_online.settings import config
+
+# Atomically admits the tasks (ARGV[5:]) of a client. Either all of them are
+# admitted, in which case a token is taken from every bucket (KEYS[2:]) and the
+# tasks are added to the tasks in flight (KEYS[1]) until they expire, or none
+# is. The result is the reason for rejecting the tasks along with the number of
+# seconds until the buckets have a token again.
+ADMIT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_in_flight = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local in_flight = KEYS[1]
+local count = #ARGV - 4
+
+-- Tasks which were never released (i.e. a worker died) have expired
+if max_in_flight > 0 then
+    redis.call('ZREMRANGEBYSCORE', in_flight, '-inf', now)
+
+    if redis.call('ZCARD', in_flight) + count > max_in_flight then
+        return {'in_flight', '0'}
+    end
+end
+
+local tokens = {}
+local wait = 0
+
+for index = 2, #KEYS do
+    local state = redis.call('HMGET', KEYS[index], 'tokens', 'time')
+    local available = tonumber(state[1]) or burst
+    local last = tonumber(state[2]) or now
+
+    available = math.min(burst, available + math.max(0, now - last) * rate)
+    tokens[index] = available
+
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+end
+
+for index = 2, #KEYS do
+    if wait == 0 then
+        tokens[index] = tokens[index] - 1
+    end
+
+    redis.call('HSET', KEYS[index], 'tokens', tostring(tokens[index]), 'time', tostring(now))
+    redis.call('EXPIRE', KEYS[index], math.ceil(burst / rate) + 1)
+end
+
+if wait > 0 then
+    return {'rate', tostring(wait)}
+end
+
+if max_in_flight > 0 then
+    for index = 5, #ARGV do
+        redis.call('ZADD', in_flight, now + ttl, ARGV[index])
+    end
+
+    if redis.call('TTL', in_flight) < ttl then
+        redis.call('EXPIRE', in_flight, math.ceil(ttl))
+    end
+end
+
+return {'ok', '0'}
+"""
+
+
+class SubmissionThrottle:
+    """Decides whether a client may submit more programs."""
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        rate: float,
+        burst: int,
+        max_in_flight: int,
+        in_flight_ttl: float,
+        batch_max_in_flight: int = 0,
+        batch_ttl: float = 0,
+    ) -> None:
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.in_flight_ttl = in_flight_ttl
+        self.batch_max_in_flight = batch_max_in_flight
+        self.batch_ttl = batch_ttl
+        self.admit = client.register_script(ADMIT)
+
+    @staticmethod
+    def in_flight_key(address: str) -> str:
+        return f"throttle:in_flight:{address}"
+
+    def acquire(
+        self,
+        session_id: Optional[str],
+        address: Optional[str],
+        task_ids: Sequence[str],
+        batch: bool = False,
+    ) -> None:
+        """Raise Throttled if the client may not submit these tasks right now.
+
+        Otherwise the tasks count against the client until they are released.
+        Programs submitted in a batch (i.e. through /api/run) count against
+        the larger batch_max_in_flight. Clients are never throttled while
+        Redis is unavailable.
+        """
+        max_in_flight = self.batch_max_in_flight if batch else self.max_in_flight
+        ttl = self.batch_ttl if batch else self.in_flight_ttl
+
+        if address is None:
+            max_in_flight = 0
+
+        keys: List[str] = [self.in_flight_key(address or "")]
+
+        if self.rate:
+            if session_id is not None:
+                keys.append(f"throttle:session:{session_id}")
+            if address is not None:
+                keys.append(f"throttle:address:{address}")
+
+        args: List[Union[str, float]] = [self.rate, self.burst, max_in_flight, ttl]
+        args.extend(task_ids)
+
+        try:
+            reason, wait = self.admit(keys=keys, args=args)
+        except redis.RedisError:
+            logging.exception("Unable to check the submission rate")
+            return
+
+        if reason == b"in_flight":
+            raise Throttled(
+                f"Only {max_in_flight} programs may run at once. "
+                "Wait for your other programs to finish"
+            )
+
+        if reason == b"rate":
+            raise Throttled(
+                f"Too many submissions, try again in {math.ceil(float(wait))} seconds"
+            )
+
+    def release(self, address: Optional[str], task_id: str) -> None:
+        """Forget about a task which finished (or was killed)."""
+        if not (self.max_in_flight or self.batch_max_in_flight) or address is None:
+            return
+
+        try:
+            self.client.zrem(self.in_flight_key(address), task_id)
+        except redis.RedisError:
+            logging.exception("Unable to release a finished task")
+
+
+@lru_cache(maxsize=1)
+def get_throttle() -> Optional[SubmissionThrottle]:
+    """The throttle which is configured for this application (if any)."""
+    limits = (config.SUBMIT_RATE, config.SUBMIT_MAX_IN_FLIGHT, config.API_MAX_IN_FLIGHT)
+    if not any(limits):
+        return None
+
+    return SubmissionThrottle(
+        redis.Redis.from_url(config.THROTTLE_REDIS_URL),
+        rate=config.SUBMIT_RATE,
+        burst=config.SUBMIT_BURST,
+        max_in_flight=config.SUBMIT_MAX_IN_FLIGHT,
+        in_flight_ttl=config.SUBMIT_IN_FLIGHT_TTL,
+        batch_max_in_flight=config.API_MAX_IN_FLIGHT,
+        batch_ttl=config.API_RUN_TIMEOUT,
+    )
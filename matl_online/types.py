@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 
 class MATLFlags(Enum):
@@ -21,6 +21,19 @@ class MATLTaskParameters:
     inputs: str = ""
     session_id: Optional[str] = None
 
+    # Encoding of the output frames sent to the client (see encode_frame)
+    encoding: str = "json"
+
+    # IP address of the client which submitted the program (see throttle)
+    client: Optional[str] = None
+
+    # Key of the run when it is shared with identical submissions (see
+    # singleflight)
+    shared_key: Optional[str] = None
+
+    # Inputs of each case when running the program for several sets of inputs
+    cases: Tuple[str, ...] = ()
+
     @property
     def code_lines(self) -> List[str]:
         return self.code.split("\n")
@@ -32,6 +45,10 @@ class MATLTaskParameters:
 
         return self.inputs.split("\n")
 
+    @property
+    def case_input_lines(self) -> List[List[str]]:
+        return [case.split("\n") if case else [] for case in self.cases]
+
     @property
     def additional_flags(self) -> List[MATLFlags]:
         return []
@@ -0,0 +1,78 @@
+"""Add sortable version columns to releases
+
+Revision ID: 3b8f2c1d9a4e
+Revises: 5688ce609630
+Create Date: 2026-10-19 09:12:41.204117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3b8f2c1d9a4e'
+down_revision = '5688ce609630'
+
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+VERSION_PATTERN = re.compile(
+    r"^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:\.\d+)*(?:-(.+))?$"
+)
+
+
+def upgrade():
+    with op.batch_alter_table('releases') as batch_op:
+        batch_op.add_column(sa.Column('major', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('minor', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('patch', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('prerelease', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('is_final', sa.Boolean(), nullable=False, server_default=sa.true()))
+
+    # Populate the new columns from the existing tags
+    connection = op.get_bind()
+    releases = sa.table(
+        'releases',
+        sa.column('id', sa.Integer),
+        sa.column('tag', sa.String),
+        sa.column('major', sa.Integer),
+        sa.column('minor', sa.Integer),
+        sa.column('patch', sa.Integer),
+        sa.column('prerelease', sa.String),
+        sa.column('is_final', sa.Boolean),
+    )
+
+    for release_id, tag in connection.execute(sa.select(releases.c.id, releases.c.tag)):
+        match = VERSION_PATTERN.match(tag or '')
+        if match is None:
+            continue
+
+        major, minor, patch, prerelease = match.groups()
+
+        connection.execute(
+            releases.update()
+            .where(releases.c.id == release_id)
+            .values(
+                major=int(major),
+                minor=int(minor or 0),
+                patch=int(patch or 0),
+                prerelease=prerelease,
+                is_final=prerelease is None,
+            )
+        )
+
+    op.create_index(
+        'ix_releases_version',
+        'releases',
+        ['major', 'minor', 'patch', 'is_final', 'prerelease'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_releases_version', table_name='releases')
+
+    with op.batch_alter_table('releases') as batch_op:
+        batch_op.drop_column('is_final')
+        batch_op.drop_column('prerelease')
+        batch_op.drop_column('patch')
+        batch_op.drop_column('minor')
+        batch_op.drop_column('major')
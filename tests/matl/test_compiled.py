@@ -0,0 +1,147 @@
+"""Unit tests for the cache of compiled programs."""
+
+import os
+import pathlib
+from unittest.mock import Mock
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.matl import compiled
+from matl_online.matl.core import matl
+from matl_online.settings import config
+from matl_online.types import MATLExplainTaskParameters, MATLRunTaskParameters
+
+
+@pytest.fixture
+def cache(mocker: MockerFixture, tmp_path: pathlib.Path) -> pathlib.Path:
+    directory = tmp_path.joinpath("compiled")
+    mocker.patch.object(config, "MATL_COMPILE_CACHE_DIRECTORY", str(directory))
+    mocker.patch.object(config, "MATL_COMPILE_CACHE_SIZE", 2)
+    return directory
+
+
+def lookups(result: str) -> float:
+    value = REGISTRY.get_sample_value(
+        "matl_compile_cache_lookups_total", {"result": result}
+    )
+    return value or 0.0
+
+
+class TestCompiledPath:
+    def test_disabled(self) -> None:
+        params = MATLRunTaskParameters(code="1D", version="1.0.0")
+        assert compiled.compiled_path(params) is None
+
+    def test_path(self, cache: pathlib.Path) -> None:
+        params = MATLRunTaskParameters(code="1D", version="1.0.0")
+        path = compiled.compiled_path(params)
+
+        assert path is not None
+        assert path.parent == cache.joinpath("1.0.0")
+        assert path.name.startswith("matl_") and path.suffix == ".m"
+
+        # The inputs don't matter, the code and version do
+        assert path == compiled.compiled_path(
+            MATLRunTaskParameters(code="1D", version="1.0.0", inputs="2")
+        )
+        assert path != compiled.compiled_path(
+            MATLRunTaskParameters(code="2D", version="1.0.0")
+        )
+        assert path != compiled.compiled_path(
+            MATLRunTaskParameters(code="1D", version="2.0.0")
+        )
+
+    def test_explain(self, cache: pathlib.Path) -> None:
+        """Explanations are never compiled."""
+        params = MATLExplainTaskParameters(code="1D", version="1.0.0")
+        assert compiled.compiled_path(params) is None
+
+
+class TestPrune:
+    def test_prune(self, cache: pathlib.Path) -> None:
+        """The least recently used programs are removed."""
+        paths = [cache.joinpath("1.0.0", f"matl_{name}.m") for name in "abc"]
+        paths[0].parent.mkdir(parents=True)
+
+        for index, path in enumerate(paths):
+            path.write_text("")
+            os.utime(path, (index, index))
+
+        # Using the oldest program keeps it around
+        assert compiled.lookup(paths[0])
+        compiled.prune()
+
+        assert [path.exists() for path in paths] == [True, False, True]
+
+    def test_within_size(self, cache: pathlib.Path) -> None:
+        path = cache.joinpath("1.0.0", "matl_a.m")
+        path.parent.mkdir(parents=True)
+        path.write_text("")
+
+        compiled.prune()
+
+        assert path.exists()
+
+
+class TestMATL:
+    def test_miss_and_hit(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        cache: pathlib.Path,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """The first run compiles the program and the second uses it."""
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+
+        def compile_program(*args: str, **kwargs: str) -> None:
+            # matlCompile adds the program to the cache
+            path = pathlib.Path(args[5].strip('"'))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("disp(1)")
+
+        octave_mock.run.side_effect = compile_program
+
+        params = MATLRunTaskParameters(code="1D", version="1.0.0")
+        path = compiled.compiled_path(params)
+        assert path is not None
+
+        hits, misses = lookups("hit"), lookups("miss")
+
+        matl(octave_mock, params, directory=tmp_path)
+
+        assert octave_mock.run.call_args.args[5] == f'"{path}"'
+        assert path.read_text() == "disp(1)"
+
+        matl(octave_mock, params, directory=tmp_path)
+
+        assert lookups("hit") == hits + 1
+        assert lookups("miss") == misses + 1
+
+    def test_program_files(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        cache: pathlib.Path,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """Files which a program writes into the directory of a run are never cached."""
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+
+        def run_program(*args: str, **kwargs: str) -> None:
+            tmp_path.joinpath("program.m").write_text("disp(2)")
+
+        octave_mock.run.side_effect = run_program
+
+        params = MATLRunTaskParameters(code="1D", version="1.0.0")
+        path = compiled.compiled_path(params)
+        assert path is not None
+
+        matl(octave_mock, params, directory=tmp_path)
+
+        assert not path.exists()
@@ -7,6 +7,7 @@ from flask import Flask
 from pytest_mock.plugin import MockerFixture
 
 from matl_online.matl.core import matl
+from matl_online.settings import config
 from matl_online.types import MATLRunTaskParameters
 
 
@@ -52,10 +53,18 @@ class TestMATLInterface:
             octave_mock,
             MATLRunTaskParameters(code="D", inputs="12", version=""),
             directory=tmp_path,
+            token="abc",
         )
 
         octave_mock.run.assert_called_once_with(
-            "matl_runner", '"-or"', '{"D"}', '"12"', line_handler=None
+            "matl_runner",
+            '"abc"',
+            '"lazy"',
+            '"-or"',
+            '{"D"}',
+            '""',
+            '"12"',
+            line_handler=None,
         )
 
     def test_multiple_inputs(
@@ -73,10 +82,19 @@ class TestMATLInterface:
             octave_mock,
             MATLRunTaskParameters(code="D", inputs="12\n13", version=""),
             directory=tmp_path,
+            token="abc",
         )
 
         octave_mock.run.assert_called_once_with(
-            "matl_runner", '"-or"', '{"D"}', '"12"', '"13"', line_handler=None
+            "matl_runner",
+            '"abc"',
+            '"lazy"',
+            '"-or"',
+            '{"D"}',
+            '""',
+            '"12"',
+            '"13"',
+            line_handler=None,
         )
 
     def test_string_escape(
@@ -94,8 +112,113 @@ class TestMATLInterface:
             octave_mock,
             MATLRunTaskParameters(code="'abc'", version=""),
             directory=tmp_path,
+            token="abc",
         )
 
         octave_mock.run.assert_called_once_with(
-            "matl_runner", '"-or"', "{\"'abc'\"}", line_handler=None
+            "matl_runner",
+            '"abc"',
+            '"lazy"',
+            '"-or"',
+            "{\"'abc'\"}",
+            '""',
+            line_handler=None,
+        )
+
+    def test_random_token(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """Every run uses a different token unless one is provided."""
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+
+        for _ in range(2):
+            params = MATLRunTaskParameters(code="D", version="")
+            matl(octave_mock, params, directory=tmp_path)
+
+        tokens = {c.args[1] for c in octave_mock.run.call_args_list}
+        assert len(tokens) == 2
+
+    def test_render_mode(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+        mocker.patch.object(config, "MATL_RENDER_MODE", "eager")
+
+        params = MATLRunTaskParameters(code="D", version="")
+        matl(octave_mock, params, directory=tmp_path)
+
+        assert octave_mock.run.call_args.args[2] == '"eager"'
+
+    def test_cache_disabled(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """Without the cache, MATL runs programs directly (see matl_runner)."""
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+        mocker.patch.object(config, "MATL_COMPILE_CACHE_DIRECTORY", "")
+        lookup = mocker.patch("matl_online.matl.core.compiled.lookup")
+        prune = mocker.patch("matl_online.matl.core.compiled.prune")
+
+        params = MATLRunTaskParameters(code="D", version="")
+        matl(octave_mock, params, directory=tmp_path)
+
+        assert octave_mock.run.call_args.args[5] == '""'
+        lookup.assert_not_called()
+        prune.assert_not_called()
+
+    def test_cache_enabled(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """Programs which aren't cached yet are compiled into the cache."""
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+        mocker.patch.object(config, "MATL_COMPILE_CACHE_DIRECTORY", str(tmp_path))
+        prune = mocker.patch("matl_online.matl.core.compiled.prune")
+
+        params = MATLRunTaskParameters(code="D", version="1.0.0")
+        matl(octave_mock, params, directory=tmp_path)
+
+        cached = octave_mock.run.call_args.args[5]
+        assert cached.startswith(f'"{tmp_path.joinpath("1.0.0").as_posix()}')
+        prune.assert_called_once_with()
+
+    def test_cases(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        octave_mock: Mock,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """The inputs of each case are passed to matl_cases."""
+        mocker.patch("matl_online.matl.core.get_matl_folder")
+        mocker.patch.object(config, "MATL_CASE_TIMEOUT", 5.0)
+
+        params = MATLRunTaskParameters(code="D", version="", cases=("1\n2", ""))
+        matl(octave_mock, params, directory=tmp_path, token="abc")
+
+        octave_mock.run.assert_called_once_with(
+            "matl_cases",
+            '"abc"',
+            '"lazy"',
+            '"-or"',
+            '{"D"}',
+            '""',
+            "5.0",
+            '{"1","2"}',
+            "{}",
+            line_handler=None,
         )
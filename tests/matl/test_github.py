@@ -0,0 +1,218 @@
+"""Tests for fetching releases using conditional GitHub requests."""
+
+import json
+import pathlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Generator, List, Optional
+
+import pytest
+
+from matl_online.matl.github import ReleaseFetcher
+
+
+class FakeGitHubAPI:
+    """Minimal stand-in for the paginated GitHub releases endpoint."""
+
+    pages: List[List[Dict[str, Any]]]
+    etags: List[str]
+    requests: List[Dict[str, Optional[str]]]
+    server: HTTPServer
+
+    def __init__(self) -> None:
+        self.pages = []
+        self.etags = []
+        self.requests = []
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                page = int(self.path.split("page=")[-1]) if "&page=" in self.path else 1
+                api.requests.append(
+                    {"path": self.path, "etag": self.headers.get("If-None-Match")}
+                )
+
+                etag = api.etags[page - 1]
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                body = json.dumps(api.pages[page - 1]).encode()
+
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+
+                if page < len(api.pages):
+                    link = f"<{api.url}/repos/org/repo/releases?per_page=100&page={page + 1}>"
+                    self.send_header("Link", f'{link}; rel="next"')
+
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def set_pages(self, *pages: List[Dict[str, Any]]) -> None:
+        self.pages = list(pages)
+        self.etags = [f'"{hash(json.dumps(page))}"' for page in pages]
+
+
+def _release(tag: str, prerelease: bool = False) -> Dict[str, Any]:
+    return {
+        "tag_name": tag,
+        "prerelease": prerelease,
+        "published_at": "2020-01-01T00:00:00Z",
+    }
+
+
+@pytest.fixture
+def github_api() -> Generator[FakeGitHubAPI, None, None]:
+    api = FakeGitHubAPI()
+    thread = threading.Thread(
+        target=api.server.serve_forever, args=(0.01,), daemon=True
+    )
+    thread.start()
+
+    yield api
+
+    api.server.shutdown()
+    api.server.server_close()
+
+
+def _fetch_and_save(fetcher: ReleaseFetcher) -> None:
+    fetched = fetcher.fetch()
+    assert fetched is not None
+    fetched.save()
+
+
+class TestReleaseFetcher:
+    def test_initial_fetch(
+        self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path
+    ) -> None:
+        """All pages are retrieved and persisted on the first fetch."""
+        github_api.set_pages(
+            [_release("2.0.0"), _release("1.1.0")],
+            [_release("1.0.0", prerelease=True)],
+        )
+
+        cache_file = tmp_path.joinpath("cache.json")
+        fetcher = ReleaseFetcher("org/repo", github_api.url, cache_file)
+
+        fetched = fetcher.fetch()
+
+        assert fetched is not None
+        releases = fetched.releases
+        assert [r.tag_name for r in releases] == ["2.0.0", "1.1.0", "1.0.0"]
+        assert releases[2].prerelease is True
+        assert releases[0].published_at.year == 2020
+
+        assert len(github_api.requests) == 2
+
+        # The pages are only persisted once they are saved
+        assert not cache_file.is_file()
+        fetched.save()
+        assert cache_file.is_file()
+
+    def test_not_modified(
+        self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path
+    ) -> None:
+        """Conditional requests short-circuit when nothing has changed."""
+        github_api.set_pages([_release("2.0.0"), _release("1.1.0")])
+
+        cache_file = tmp_path.joinpath("cache.json")
+        _fetch_and_save(ReleaseFetcher("org/repo", github_api.url, cache_file))
+
+        # A brand new fetcher only has the persisted cache to go off of
+        releases = ReleaseFetcher("org/repo", github_api.url, cache_file).fetch()
+
+        assert releases is None
+
+        # The second request sent the ETag from the first response
+        assert len(github_api.requests) == 2
+        assert github_api.requests[1]["etag"] == github_api.etags[0]
+
+    def test_modified(self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path) -> None:
+        """A new release results in the full list being returned."""
+        github_api.set_pages([_release("1.1.0")])
+
+        cache_file = tmp_path.joinpath("cache.json")
+        fetcher = ReleaseFetcher("org/repo", github_api.url, cache_file)
+        _fetch_and_save(fetcher)
+
+        github_api.set_pages([_release("2.0.0"), _release("1.1.0")])
+
+        fetched = fetcher.fetch()
+
+        assert fetched is not None
+        assert [r.tag_name for r in fetched.releases] == ["2.0.0", "1.1.0"]
+
+    def test_not_saved(self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path) -> None:
+        """Releases which were never saved are fetched again."""
+        github_api.set_pages([_release("1.1.0")])
+
+        cache_file = tmp_path.joinpath("cache.json")
+        fetcher = ReleaseFetcher("org/repo", github_api.url, cache_file)
+        fetcher.fetch()
+
+        fetched = fetcher.fetch()
+
+        assert fetched is not None
+        assert [r.tag_name for r in fetched.releases] == ["1.1.0"]
+        assert github_api.requests[-1]["etag"] is None
+
+    def test_partially_modified(
+        self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path
+    ) -> None:
+        """Unchanged pages are served from the cache alongside changed pages."""
+        github_api.set_pages([_release("2.0.0")], [_release("1.0.0")])
+
+        cache_file = tmp_path.joinpath("cache.json")
+        fetcher = ReleaseFetcher("org/repo", github_api.url, cache_file)
+        _fetch_and_save(fetcher)
+
+        github_api.set_pages([_release("2.0.0")], [_release("1.0.1")])
+
+        fetched = fetcher.fetch()
+
+        assert fetched is not None
+        assert [r.tag_name for r in fetched.releases] == ["2.0.0", "1.0.1"]
+
+        # The unchanged page was served from the cache
+        assert github_api.requests[-2]["etag"] == github_api.etags[0]
+
+    def test_force(self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path) -> None:
+        """Forcing a fetch ignores all cached validators."""
+        github_api.set_pages([_release("1.1.0")])
+
+        cache_file = tmp_path.joinpath("cache.json")
+        fetcher = ReleaseFetcher("org/repo", github_api.url, cache_file)
+        _fetch_and_save(fetcher)
+
+        releases = fetcher.fetch(force=True)
+
+        assert releases is not None
+        assert github_api.requests[-1]["etag"] is None
+
+    def test_corrupt_cache(
+        self, github_api: FakeGitHubAPI, tmp_path: pathlib.Path
+    ) -> None:
+        """An unreadable cache is treated as empty."""
+        github_api.set_pages([_release("1.1.0")])
+
+        cache_file = tmp_path.joinpath("cache.json")
+        cache_file.write_text("not json")
+
+        fetched = ReleaseFetcher("org/repo", github_api.url, cache_file).fetch()
+
+        assert fetched is not None
+        assert [r.tag_name for r in fetched.releases] == ["1.1.0"]
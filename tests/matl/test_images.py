@@ -0,0 +1,88 @@
+"""Unit tests for re-encoding the images of programs."""
+
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.matl.images import optimize_png
+from matl_online.settings import config
+
+
+def plot(size: int = 200) -> bytes:
+    """A PNG with only a few colors (similar to most plots)."""
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    draw.line((0, 0, size, size), fill="blue", width=3)
+    draw.rectangle((10, 10, 50, 50), outline="black")
+
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def photo(size: int = 64) -> bytes:
+    """A PNG with more colors than fit in a palette."""
+    generator = random.Random(0)
+    image = Image.new("RGB", (size, size))
+    image.putdata(
+        [
+            (x * 4, y * 4, generator.randrange(256))
+            for y in range(size)
+            for x in range(size)
+        ]
+    )
+
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def decode(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+@pytest.fixture
+def enabled(mocker: MockerFixture) -> None:
+    mocker.patch.object(config, "MATL_OPTIMIZE_IMAGES", True)
+
+
+class TestOptimizePNG:
+    def test_disabled(self) -> None:
+        data = plot()
+        assert optimize_png(data) is data
+
+    @pytest.mark.usefixtures("enabled")
+    def test_palette(self) -> None:
+        data = plot()
+        optimized = optimize_png(data)
+
+        assert len(optimized) < len(data)
+        assert decode(optimized).mode == "P"
+
+        # The conversion is lossless
+        assert decode(optimized).convert("RGB").tobytes() == decode(data).tobytes()
+
+    @pytest.mark.usefixtures("enabled")
+    def test_many_colors(self) -> None:
+        data = photo()
+        optimized = optimize_png(data)
+
+        assert len(optimized) <= len(data)
+        assert decode(optimized).tobytes() == decode(data).tobytes()
+
+    @pytest.mark.usefixtures("enabled")
+    def test_quantize(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "MATL_IMAGE_QUANTIZE", True)
+
+        data = photo()
+        optimized = optimize_png(data)
+
+        assert len(optimized) < len(data)
+        assert decode(optimized).mode == "P"
+
+    @pytest.mark.usefixtures("enabled")
+    def test_invalid(self) -> None:
+        assert optimize_png(b"hello") == b"hello"
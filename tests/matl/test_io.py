@@ -1,7 +1,57 @@
 import base64
 import pathlib
-
-from matl_online.matl.io import parse_matl_results
+import re
+from typing import Dict, List, Tuple
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.matl.io import (
+    FrameDecoder,
+    MATLOutputParser,
+    find_tag,
+    parse_matl_results,
+    process_part,
+)
+
+
+def parse_with_regex(output: str) -> List[Dict[str, str]]:
+    """The original regex-based implementation of parse_matl_results."""
+    result = list()
+
+    for part in re.split(r"(\[.*?][^\n].*\n?)", output):
+        if part == "":
+            continue
+
+        item = process_part(part)
+
+        if item:
+            result.append(item)
+
+    return result
+
+
+# Output built from fragments which are likely to trip up the parser
+fragments = st.one_of(
+    st.sampled_from(
+        [
+            "[IMAGE]",
+            "[IMAGE_NN]",
+            "[AUDIO]",
+            "[STDERR]",
+            "[STDOUT]",
+            "[TRUNCATED]",
+            "[",
+            "]",
+            "\n",
+            "/missing/file.png",
+        ]
+    ),
+    st.text(alphabet="ab []\n\r", max_size=5),
+)
+outputs = st.lists(fragments, max_size=30).map("".join)
 
 
 class TestResults:
@@ -127,3 +177,267 @@ class TestResults:
         assert len(result) == 1
         assert result[0]["type"] == "stdout"
         assert result[0]["value"] == expected
+
+
+class TestOutputParser:
+    """Incremental parsing must match parsing the complete output."""
+
+    @pytest.mark.parametrize(
+        "lines",
+        [
+            [],
+            ["single"],
+            ["a", "b", "", "c"],
+            ["a", "[STDERR]error", "b"],
+            ["[STDOUT]x", "[STDERR]y", "[STDERR]"],
+            ["a", "", "", "[STDERR]error", "", "b", ""],
+            ["prefix [STDERR]error", "[IMAGE]", "tail"],
+            ["[IMAGE]/missing/file.png", "", "[AUDIO]/missing.wav"],
+            ["[weird", "text]", "[x]y"],
+        ],
+    )
+    def test_matches_full_parse(self, lines: List[str]) -> None:
+        parser = MATLOutputParser()
+
+        for line in lines:
+            parser.feed(line)
+            parser.flush()
+
+        assert parser.results() == parse_matl_results("\n".join(lines))
+
+    def test_multiline_feed(self) -> None:
+        parser = MATLOutputParser()
+        parser.feed("a\n[STDERR]b\nc")
+
+        assert parser.results() == parse_matl_results("a\n[STDERR]b\nc")
+
+    def test_continuation(self) -> None:
+        """Only new text of a growing stdout item is flushed."""
+        parser = MATLOutputParser()
+
+        parser.feed("a")
+        assert parser.flush() == [{"type": "stdout", "value": "a"}]
+
+        parser.feed("b")
+        assert parser.flush() == [{"type": "stdout", "value": "\nb"}]
+
+        # Nothing new was added
+        assert parser.flush() == []
+
+        parser.feed("[STDERR]oops")
+        assert parser.flush() == [{"type": "stderr", "value": "oops"}]
+
+    def test_trailing_newlines(self) -> None:
+        """Blank lines are only sent once they are followed by more text."""
+        parser = MATLOutputParser()
+
+        parser.feed("a")
+        parser.feed("")
+        assert parser.flush() == [{"type": "stdout", "value": "a"}]
+
+        parser.feed("[STDERR]oops")
+        assert parser.flush() == [{"type": "stderr", "value": "oops"}]
+
+        parser.feed("")
+        parser.feed("b")
+        assert parser.flush() == [{"type": "stdout", "value": "\nb"}]
+
+    def test_final_flush(self) -> None:
+        """Incomplete tagged output is only sent by the final flush."""
+        parser = MATLOutputParser()
+        parser.feed("[STDERR]")
+        parser.feed("details")
+
+        assert parser.flush() == []
+        assert parser.flush(final=True) == [{"type": "stderr", "value": "\ndetails"}]
+
+    def test_image_processed_once(self, tmp_path: pathlib.Path) -> None:
+        """Media is encoded when flushed and not sent again."""
+        image = tmp_path.joinpath("image.png")
+        image.write_bytes(b"hello")
+
+        parser = MATLOutputParser()
+        parser.feed(f"[IMAGE]{image}")
+
+        assert [item["type"] for item in parser.flush()] == ["image"]
+
+        # The image can be removed once it has been sent
+        image.unlink()
+
+        assert parser.flush() == []
+        assert [item["type"] for item in parser.results()] == ["image"]
+
+    def test_clear(self) -> None:
+        parser = MATLOutputParser()
+        parser.feed("a")
+        parser.flush()
+        parser.clear()
+        parser.feed("b")
+
+        assert parser.flush() == [{"type": "stdout", "value": "b"}]
+        assert parser.results() == [{"type": "stdout", "value": "b"}]
+
+
+class TestFramedParser:
+    """Records are only recognized from the framing, never from tags."""
+
+    def test_tags_are_text(self) -> None:
+        parser = MATLOutputParser(framed=True)
+        parser.feed("a")
+        parser.feed("[STDERR]b")
+
+        assert parser.results() == [{"type": "stdout", "value": "a\n[STDERR]b"}]
+
+    def test_records(self) -> None:
+        parser = MATLOutputParser(framed=True)
+        parser.feed("a")
+        parser.add_record("STDERR", "multi\nline")
+        parser.feed("b")
+        parser.add_record("UNKNOWN", "ignored")
+
+        assert parser.flush() == [
+            {"type": "stdout", "value": "a"},
+            {"type": "stderr", "value": "multi\nline"},
+            {"type": "stdout", "value": "b"},
+        ]
+
+        parser.feed("c")
+        assert parser.flush() == [{"type": "stdout", "value": "c"}]
+
+        parser.feed("d")
+        assert parser.flush() == [{"type": "stdout", "value": "\nd"}]
+
+
+class TestImageFrames:
+    """Unchanged images are only encoded and stored once."""
+
+    def test_duplicates(self, tmp_path: pathlib.Path, mocker: MockerFixture) -> None:
+        optimize = mocker.patch(
+            "matl_online.matl.io.optimize_png", side_effect=lambda data: data
+        )
+
+        first = tmp_path.joinpath("first.png")
+        second = tmp_path.joinpath("second.png")
+        first.write_bytes(b"frame")
+        second.write_bytes(b"frame")
+
+        parser = MATLOutputParser(framed=True)
+        parser.add_record("IMAGE", first.as_posix())
+        parser.add_record("IMAGE", second.as_posix())
+
+        # A different interpolation is a different image
+        parser.add_record("IMAGE_NN", second.as_posix())
+        parser.add_record("IMAGE_NN", first.as_posix())
+
+        # Every image is still part of the output
+        items = parser.flush()
+        assert [item["type"] for item in items] == ["image"] * 2 + ["image_nn"] * 2
+        assert items[0] == items[1] and items[2] == items[3]
+        assert parser.results() == items
+
+        assert optimize.call_count == 2
+
+    def test_changed(self, tmp_path: pathlib.Path) -> None:
+        parser = MATLOutputParser(framed=True)
+
+        for index, contents in enumerate((b"a", b"b", b"a")):
+            image = tmp_path.joinpath(f"{index}.png")
+            image.write_bytes(contents)
+            parser.add_record("IMAGE", image.as_posix())
+
+        assert len(parser.flush()) == 3
+
+
+class TestFrameDecoder:
+    @pytest.mark.parametrize(
+        "payload",
+        ["", "plain", "100% [IMAGE]", "a\nb\r\n", "%0A", "ünïcødé", "trailing \t"],
+    )
+    def test_round_trip(self, payload: str) -> None:
+        decoder = FrameDecoder()
+        line = decoder.encode("STDOUT", payload)
+
+        assert "\n" not in line
+
+        # OctaveSession strips the trailing whitespace of every line
+        assert decoder.decode(line.rstrip()) == ("", ("STDOUT", payload))
+
+    def test_leading_text(self) -> None:
+        decoder = FrameDecoder("abc")
+        line = "partial" + decoder.encode("PAUSE")
+
+        assert decoder.decode(line) == ("partial", ("PAUSE", ""))
+
+    def test_wrong_token(self) -> None:
+        line = FrameDecoder("abc").encode("CLC")
+
+        assert FrameDecoder("xyz").decode(line) == (line, None)
+
+    @pytest.mark.parametrize(
+        "line",
+        [
+            "\x1eabc STDERR 3 ab\x03",
+            "\x1eabc STDERR x ab\x03",
+            "\x1eabc STDERR\x03",
+            "\x1eabc STDERR 2 ab",
+            "[STDERR]ab",
+        ],
+    )
+    def test_malformed(self, line: str) -> None:
+        assert FrameDecoder("abc").decode(line) == (line, None)
+
+    def test_random_token(self) -> None:
+        assert FrameDecoder().token != FrameDecoder().token
+
+
+class TestFindTag:
+    @pytest.mark.parametrize(
+        "line, start",
+        [
+            ("", -1),
+            ("plain", -1),
+            ("[STDERR]", -1),
+            ("[STDERR]x", 0),
+            ("a [b] c", 2),
+            ("a [b]", -1),
+            ("[a [b]", -1),
+            ("[a [b] c", 0),
+            ("]a[b]c", 2),
+        ],
+    )
+    def test_find_tag(self, line: str, start: int) -> None:
+        assert find_tag(line) == start
+
+    @given(st.text(alphabet="ab[]", max_size=12))
+    def test_matches_regex(self, line: str) -> None:
+        match = re.search(r"\[.*?][^\n].*", line)
+        assert find_tag(line) == (-1 if match is None else match.start())
+
+
+class TestParserProperties:
+    """The tokenizer must produce the same output as the regex implementation."""
+
+    @given(outputs)
+    def test_parse(self, output: str) -> None:
+        assert parse_matl_results(output) == parse_with_regex(output)
+
+    @given(st.lists(st.tuples(outputs, st.booleans()), max_size=10))
+    def test_incremental(self, messages: List[Tuple[str, bool]]) -> None:
+        parser = MATLOutputParser()
+        delta = []
+
+        for message, flush in messages:
+            parser.feed(message)
+            if flush:
+                delta.extend(parser.flush())
+
+        delta.extend(parser.flush(final=True))
+
+        expected = parse_with_regex("\n".join(message for message, _ in messages))
+
+        assert parser.results() == expected
+
+        # The frames contain all of the output exactly once
+        assert "".join(item["value"] for item in delta) == "".join(
+            item["value"] for item in expected
+        )
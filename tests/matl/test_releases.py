@@ -2,13 +2,15 @@ import pathlib
 import pytz
 
 from datetime import datetime
-from typing import Optional
-from unittest.mock import MagicMock
+from typing import List, Optional
+from unittest.mock import Mock
 
+import pytest
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from pytest_mock.plugin import MockerFixture
 
+from matl_online.matl.github import GitHubRelease
 from matl_online.matl.releases import refresh_releases
 from matl_online.public.models import Release
 
@@ -19,13 +21,16 @@ def _mock_release(
     version: str,
     prerelease: bool = False,
     published_at: Optional[datetime] = None,
-) -> MagicMock:
-    mock = MagicMock()
-    mock.prerelease = prerelease
-    mock.tag_name = version
-    mock.published_at = published_at or datetime.now()
+) -> GitHubRelease:
+    return GitHubRelease(
+        tag_name=version,
+        prerelease=prerelease,
+        published_at=published_at or datetime.now(),
+    )
 
-    return mock
+
+def _fetched(releases: List[GitHubRelease]) -> Mock:
+    return Mock(releases=releases)
 
 
 class TestReleaseRefresh:
@@ -33,11 +38,7 @@ class TestReleaseRefresh:
 
     def test_all_new(self, mocker: MockerFixture, app: Flask, db: SQLAlchemy) -> None:
         """Completely populate the database (no previous entries)."""
-        repository_mock = MagicMock()
-        mocker.patch(
-            "matl_online.matl.releases.github_repository",
-            return_value=repository_mock,
-        )
+        fetch_releases = mocker.patch("matl_online.matl.releases.fetch_releases")
 
         releases = [
             _mock_release("1.2.3"),
@@ -45,10 +46,10 @@ class TestReleaseRefresh:
             _mock_release("7.8.9"),
         ]
 
-        repository_mock.get_releases.return_value = releases
+        fetch_releases.return_value = _fetched(releases)
 
         # When refreshing the releases
-        refresh_releases()
+        summary = refresh_releases()
 
         # Then when querying the database for all releases
         release_records = Release.query.all()
@@ -56,6 +57,10 @@ class TestReleaseRefresh:
         # The expected releases exist
         assert len(release_records) == len(releases)
 
+        # And all of them are reported as new
+        assert summary.created == ["1.2.3", "4.5.6", "7.8.9"]
+        assert summary.updated == []
+
         for k, release in enumerate(release_records):
             assert release.tag == releases[k].tag_name
 
@@ -66,11 +71,7 @@ class TestReleaseRefresh:
         db: SQLAlchemy,
     ) -> None:
         """Ensure that pre-releases are ignored."""
-        repository_mock = MagicMock()
-        mocker.patch(
-            "matl_online.matl.releases.github_repository",
-            return_value=repository_mock,
-        )
+        fetch_releases = mocker.patch("matl_online.matl.releases.fetch_releases")
 
         releases = [
             _mock_release("1.2.3"),
@@ -78,7 +79,7 @@ class TestReleaseRefresh:
             _mock_release("7.8.9"),
         ]
 
-        repository_mock.get_releases.return_value = releases
+        fetch_releases.return_value = _fetched(releases)
 
         # When refreshing the releases
         refresh_releases()
@@ -101,11 +102,7 @@ class TestReleaseRefresh:
         tmp_path: pathlib.Path,
     ) -> None:
         """Updated releases should be updated in our database."""
-        repository_mock = MagicMock()
-        mocker.patch(
-            "matl_online.matl.releases.github_repository",
-            return_value=repository_mock,
-        )
+        fetch_releases = mocker.patch("matl_online.matl.releases.fetch_releases")
 
         remove_directory_mock = mocker.patch(
             "matl_online.matl.releases.remove_source_directory"
@@ -121,10 +118,14 @@ class TestReleaseRefresh:
             _mock_release("7.8.9"),
         ]
 
-        repository_mock.get_releases.return_value = releases
+        fetch_releases.return_value = _fetched(releases)
 
         # When refreshing the releases
-        refresh_releases(source_root=tmp_path)
+        summary = refresh_releases(source_root=tmp_path)
+
+        # Then the summary reflects the new and updated releases
+        assert summary.created == ["4.5.6", "7.8.9"]
+        assert summary.updated == ["1.2.3"]
 
         # Assert the invalid source code was removed
         remove_directory_mock.assert_called_once_with("1.2.3", source_root=tmp_path)
@@ -136,3 +137,125 @@ class TestReleaseRefresh:
         new_date = releases[0].published_at.replace(tzinfo=pytz.UTC)
 
         assert original_date == new_date
+
+    def test_unchanged_releases(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        db: SQLAlchemy,
+    ) -> None:
+        """Refreshing without any changes reports nothing and commits nothing."""
+        fetch_releases = mocker.patch("matl_online.matl.releases.fetch_releases")
+
+        published_at = datetime(2000, 1, 1)
+        Release.create(date=published_at, tag="1.2.3")
+
+        fetch_releases.return_value = _fetched(
+            [_mock_release("1.2.3", published_at=published_at)]
+        )
+
+        commit = mocker.spy(db.session, "commit")
+
+        # When refreshing the releases
+        summary = refresh_releases()
+
+        # Then nothing changed
+        assert not summary
+        assert summary.changed == []
+        commit.assert_not_called()
+
+    def test_single_transaction(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        db: SQLAlchemy,
+    ) -> None:
+        """All inserts and updates are committed together."""
+        fetch_releases = mocker.patch("matl_online.matl.releases.fetch_releases")
+        mocker.patch("matl_online.matl.releases.remove_source_directory")
+
+        Release.create(date=datetime(2000, 1, 1), tag="1.2.3")
+
+        fetch_releases.return_value = _fetched(
+            [
+                _mock_release("1.2.3"),
+                _mock_release("4.5.6"),
+                _mock_release("7.8.9"),
+            ]
+        )
+
+        commit = mocker.spy(db.session, "commit")
+
+        summary = refresh_releases()
+
+        commit.assert_called_once()
+        assert summary.changed == ["4.5.6", "7.8.9", "1.2.3"]
+
+    def test_not_modified(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        db: SQLAlchemy,
+    ) -> None:
+        """When GitHub reports no changes, the database is not touched."""
+        fetch_releases = mocker.patch(
+            "matl_online.matl.releases.fetch_releases",
+            return_value=None,
+        )
+
+        Release.create(date=datetime(2000, 1, 1), tag="1.2.3")
+
+        summary = refresh_releases()
+
+        assert not summary
+        fetch_releases.assert_called_once_with(mocker.ANY, force=False)
+
+    def test_empty_database_forces_refresh(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        db: SQLAlchemy,
+    ) -> None:
+        """Cached ETags are ignored when there are no local releases."""
+        fetch_releases = mocker.patch(
+            "matl_online.matl.releases.fetch_releases",
+            return_value=_fetched([]),
+        )
+
+        refresh_releases()
+
+        fetch_releases.assert_called_once_with(mocker.ANY, force=True)
+
+    def test_cache_saved_after_commit(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        db: SQLAlchemy,
+    ) -> None:
+        """The fetched pages are only cached once the releases are stored."""
+        fetched = _fetched([_mock_release("1.2.3")])
+        mocker.patch("matl_online.matl.releases.fetch_releases", return_value=fetched)
+
+        manager = Mock()
+        manager.attach_mock(mocker.patch.object(db.session, "commit"), "commit")
+        manager.attach_mock(fetched.save, "save")
+
+        refresh_releases()
+
+        assert [c[0] for c in manager.mock_calls] == ["commit", "save"]
+
+    def test_cache_not_saved_on_failure(
+        self,
+        mocker: MockerFixture,
+        app: Flask,
+        db: SQLAlchemy,
+    ) -> None:
+        """Releases which couldn't be stored are fetched again next time."""
+        fetched = _fetched([_mock_release("1.2.3")])
+        mocker.patch("matl_online.matl.releases.fetch_releases", return_value=fetched)
+        mocker.patch.object(db.session, "commit", side_effect=RuntimeError())
+
+        with pytest.raises(RuntimeError):
+            refresh_releases()
+
+        fetched.save.assert_not_called()
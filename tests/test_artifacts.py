@@ -0,0 +1,166 @@
+"""Unit tests for storing the images and audio produced by programs."""
+
+import base64
+import hashlib
+import os
+import pathlib
+import time
+
+import pytest
+import redis
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.artifacts import (
+    ArtifactStore,
+    InlineArtifactStore,
+    LocalArtifactStore,
+    RedisArtifactStore,
+    content_type,
+    get_artifact_store,
+    is_artifact_key,
+)
+from matl_online.settings import Config, config
+
+DIGEST = hashlib.sha256(b"image").hexdigest()
+
+
+class TestArtifactKeys:
+    def test_valid(self) -> None:
+        assert is_artifact_key(DIGEST + ".png")
+        assert is_artifact_key(DIGEST + ".wav")
+
+    @pytest.mark.parametrize(
+        "key",
+        [DIGEST, DIGEST + ".exe", "../" + DIGEST + ".png", DIGEST[:10] + ".png"],
+    )
+    def test_invalid(self, key: str) -> None:
+        assert not is_artifact_key(key)
+
+    def test_content_type(self) -> None:
+        assert content_type(DIGEST + ".png") == "image/png"
+        assert content_type(DIGEST + ".wav") == "audio/wav"
+
+
+class TestInlineArtifactStore:
+    def test_put(self) -> None:
+        url = InlineArtifactStore().put(b"image", ".png")
+
+        assert url == "data:image/png;base64," + base64.b64encode(b"image").decode()
+
+
+class TestLocalArtifactStore:
+    def test_put(self, tmp_path: pathlib.Path) -> None:
+        store = LocalArtifactStore(tmp_path, ttl=60)
+
+        url = store.put(b"image", ".png")
+
+        assert url == config.ARTIFACT_URL_PREFIX + DIGEST + ".png"
+        assert store.key_from_url(url) == DIGEST + ".png"
+        assert store.get(DIGEST + ".png") == b"image"
+
+    def test_missing(self, tmp_path: pathlib.Path) -> None:
+        assert LocalArtifactStore(tmp_path, ttl=60).get(DIGEST + ".png") is None
+
+    def test_key_from_url(self, tmp_path: pathlib.Path) -> None:
+        store = LocalArtifactStore(tmp_path, ttl=60)
+
+        assert store.key_from_url("data:image/png;base64,abc") is None
+        assert store.key_from_url(config.ARTIFACT_URL_PREFIX + "../x.png") is None
+
+    def test_deduplication(self, tmp_path: pathlib.Path) -> None:
+        """Identical artifacts are stored once and their expiration extended."""
+        store = LocalArtifactStore(tmp_path, ttl=60)
+
+        store.put(b"image", ".png")
+
+        filename = tmp_path.joinpath(DIGEST + ".png")
+        os.utime(filename, (0, 0))
+
+        store.put(b"image", ".png")
+
+        assert list(tmp_path.iterdir()) == [filename]
+        assert filename.stat().st_mtime > time.time() - 60
+
+    def test_prune(self, tmp_path: pathlib.Path) -> None:
+        store = LocalArtifactStore(tmp_path, ttl=60)
+
+        store.put(b"old", ".png")
+        store.put(b"new", ".png")
+
+        old = tmp_path.joinpath(hashlib.sha256(b"old").hexdigest() + ".png")
+        os.utime(old, (0, 0))
+
+        assert store.prune() == 1
+        assert not old.exists()
+        assert len(list(tmp_path.iterdir())) == 1
+
+    def test_prune_missing_directory(self, tmp_path: pathlib.Path) -> None:
+        store = LocalArtifactStore(tmp_path.joinpath("missing"), ttl=60)
+
+        assert store.prune() == 0
+
+
+class TestRedisArtifactStore:
+    def test_put(self, mocker: MockerFixture) -> None:
+        client = mocker.patch("redis.Redis.from_url").return_value
+        client.get.return_value = b"image"
+
+        store = RedisArtifactStore("redis://localhost", ttl=60)
+        store.put(b"image", ".png")
+
+        client.set.assert_called_once_with(f"artifact:{DIGEST}.png", b"image", ex=60)
+
+        assert store.get(DIGEST + ".png") == b"image"
+        client.get.assert_called_once_with(f"artifact:{DIGEST}.png")
+
+    def test_redis_unavailable(self, mocker: MockerFixture) -> None:
+        """Artifacts are embedded into the output instead."""
+        client = mocker.patch("redis.Redis.from_url").return_value
+        client.set.side_effect = redis.ConnectionError()
+        client.get.side_effect = redis.ConnectionError()
+
+        store = RedisArtifactStore("redis://localhost", ttl=60)
+
+        assert store.put(b"image", ".png") == InlineArtifactStore().put(
+            b"image", ".png"
+        )
+        assert store.get(DIGEST + ".png") is None
+
+
+class TestArtifactStoreConfiguration:
+    @pytest.mark.parametrize(
+        "kind, store_class",
+        [
+            ("inline", InlineArtifactStore),
+            ("local", LocalArtifactStore),
+            ("redis", RedisArtifactStore),
+        ],
+    )
+    def test_store(self, kind: str, store_class: type, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "ARTIFACT_STORE", kind)
+        get_artifact_store.cache_clear()
+
+        try:
+            assert isinstance(get_artifact_store(), store_class)
+        finally:
+            get_artifact_store.cache_clear()
+
+    def test_unknown_store(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "ARTIFACT_STORE", "s3")
+        get_artifact_store.cache_clear()
+
+        try:
+            with pytest.raises(ValueError):
+                get_artifact_store()
+        finally:
+            get_artifact_store.cache_clear()
+
+
+class TestArtifactStore:
+    def test_abstract(self) -> None:
+        with pytest.raises(TypeError):
+            ArtifactStore()  # type: ignore[abstract]
+
+    def test_default(self) -> None:
+        """Artifacts are inline unless a shared store is configured."""
+        assert Config.ARTIFACT_STORE == "inline"
@@ -0,0 +1,108 @@
+"""Unit tests for caching the parts of pages which rarely change."""
+
+from typing import Generator
+from unittest.mock import Mock
+
+import pytest
+import redis
+from flask import Flask
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.public.cache import GENERATION_KEY, cached, invalidate
+
+
+@pytest.fixture
+def ttl(app: Flask, mocker: MockerFixture) -> Generator[None, None, None]:
+    mocker.patch.dict(app.config, {"PAGE_CACHE_TTL": 60})
+    yield
+    invalidate()
+
+
+class TestCache:
+    @pytest.mark.usefixtures("ttl")
+    def test_cached(self) -> None:
+        compute = Mock(return_value="value")
+
+        assert cached("name", compute) == "value"
+        assert cached("name", compute) == "value"
+        assert compute.call_count == 1
+
+    @pytest.mark.usefixtures("ttl")
+    def test_expiration(self, mocker: MockerFixture) -> None:
+        clock = mocker.patch("matl_online.public.cache.time.monotonic")
+        compute = Mock(return_value="value")
+
+        clock.return_value = 100
+        cached("name", compute)
+
+        clock.return_value = 159
+        cached("name", compute)
+        assert compute.call_count == 1
+
+        clock.return_value = 160
+        cached("name", compute)
+        assert compute.call_count == 2
+
+    @pytest.mark.usefixtures("ttl")
+    def test_invalidate(self) -> None:
+        first = Mock(return_value=1)
+        second = Mock(return_value=2)
+
+        cached("first", first)
+        cached("second", second)
+
+        invalidate("first")
+        cached("first", first)
+        cached("second", second)
+
+        assert (first.call_count, second.call_count) == (2, 1)
+
+        invalidate()
+        cached("first", first)
+        cached("second", second)
+
+        assert (first.call_count, second.call_count) == (3, 2)
+
+    @pytest.mark.usefixtures("ttl")
+    def test_shared_generation(self, app: Flask, mocker: MockerFixture) -> None:
+        """Values invalidated by another process are recomputed."""
+        mocker.patch.dict(app.config, {"PAGE_CACHE_REDIS_URL": "redis://redis"})
+        client = mocker.patch("matl_online.public.cache._client").return_value
+        client.get.return_value = None
+        compute = Mock(return_value="value")
+
+        cached("name", compute)
+        cached("name", compute)
+        assert compute.call_count == 1
+
+        # Another process refreshed the releases
+        client.get.return_value = "1"
+        cached("name", compute)
+        cached("name", compute)
+        assert compute.call_count == 2
+
+        invalidate()
+        client.incr.assert_called_once_with(GENERATION_KEY)
+
+    @pytest.mark.usefixtures("ttl")
+    def test_redis_unavailable(self, app: Flask, mocker: MockerFixture) -> None:
+        """Values are still cached for PAGE_CACHE_TTL without Redis."""
+        mocker.patch.dict(app.config, {"PAGE_CACHE_REDIS_URL": "redis://redis"})
+        client = mocker.patch("matl_online.public.cache._client").return_value
+        client.get.side_effect = redis.ConnectionError()
+        client.incr.side_effect = redis.ConnectionError()
+        compute = Mock(return_value="value")
+
+        cached("name", compute)
+        cached("name", compute)
+        invalidate()
+
+        assert compute.call_count == 1
+
+    def test_disabled(self, app: Flask) -> None:
+        compute = Mock(return_value="value")
+
+        cached("name", compute)
+        cached("name", compute)
+
+        assert compute.call_count == 2
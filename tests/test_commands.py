@@ -12,3 +12,17 @@ def test_refresh_releases_command(mocker: MockerFixture, app: Flask) -> None:
 
     # And ensure it had the intended behavior
     refresh_releases.assert_called_once()
+
+
+def test_refresh_releases_invalidate(mocker: MockerFixture, app: Flask) -> None:
+    """The pages of every web process are refreshed when releases changed."""
+    refresh_releases = mocker.patch("matl_online.commands.releases.refresh_releases")
+    invalidate = mocker.patch("matl_online.commands.invalidate")
+
+    refresh_releases.return_value = False
+    app.test_cli_runner().invoke(args=["refresh_releases"])
+    invalidate.assert_not_called()
+
+    refresh_releases.return_value = True
+    app.test_cli_runner().invoke(args=["refresh_releases"])
+    invalidate.assert_called_once_with()
@@ -2,23 +2,50 @@
 
 import os
 
+import pytest
+from flask import Flask, request
+from celery.app.routes import Router
+from pytest_mock.plugin import MockerFixture
+from werkzeug.middleware.proxy_fix import ProxyFix
+
 from matl_online import app
+from matl_online.extensions import celery
 from matl_online.settings import (
     DevConfig,
     ProdConfig,
     _get_cors_allowed_origins,
+    get_celery_configuration,
     get_config,
+    route_task,
+)
+from matl_online.types import (
+    MATLExplainTaskParameters,
+    MATLRunTaskParameters,
+    MATLTaskParameters,
 )
 from prometheus_flask_exporter import PrometheusMetrics  # type: ignore[import]
 
 
-def test_production_config(metrics: PrometheusMetrics) -> None:
+def test_production_config(
+    metrics: PrometheusMetrics, monkeypatch: pytest.MonkeyPatch
+) -> None:
     """Production config."""
+    monkeypatch.setattr(ProdConfig, "SECRET_KEY", "secret")
     app.metrics = metrics
     flask_app = app.create_app(ProdConfig)
     assert flask_app.config["ENV"] == "prod"
     assert flask_app.config["DEBUG"] is False
     assert flask_app.config["ASSETS_DEBUG"] is False
+    assert flask_app.config["SECRET_KEY"] == "secret"
+    assert flask_app.config["MATL_COMPILE_CACHE_DIRECTORY"]
+
+
+def test_production_secret_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Production apps don't start without a secret key."""
+    monkeypatch.setattr(ProdConfig, "SECRET_KEY", None)
+
+    with pytest.raises(RuntimeError):
+        app.create_app(ProdConfig)
 
 
 def test_dev_config(metrics: PrometheusMetrics) -> None:
@@ -68,3 +95,77 @@ class TestGetCORSAllowedOrigins:
         os.environ["CORS_ALLOWED_ORIGINS"] = "matl.io;localhost:5000"
 
         assert _get_cors_allowed_origins() == ["matl.io", "localhost:5000"]
+
+
+class TestTaskRouting:
+    @pytest.mark.parametrize(
+        "params, queue",
+        [
+            (MATLExplainTaskParameters(code="1D", version="1"), "explain"),
+            (
+                MATLRunTaskParameters(code="1D", version="1", session_id="1"),
+                "interactive",
+            ),
+            (MATLRunTaskParameters(code="1D", version="1"), "batch"),
+        ],
+    )
+    def test_route(self, params: MATLTaskParameters, queue: str) -> None:
+        name = "matl_online.tasks.matl_task"
+        assert route_task(name, (params,), {}, {}) == {"queue": queue}
+
+    def test_other_tasks(self) -> None:
+        assert route_task("celery.backend_cleanup", (), {}, {}) is None
+
+    def test_celery_router(self, app: Flask) -> None:
+        """Celery uses the configured router to pick the queue."""
+        configuration = get_celery_configuration(app.config)
+        queues = celery.amqp.queues  # type: ignore[attr-defined]
+        router = Router(  # type: ignore[call-arg]
+            configuration["task_routes"], queues, app=celery
+        )
+
+        params = MATLExplainTaskParameters(code="1D", version="1")
+        options = router.route(  # type: ignore[attr-defined]
+            {}, "matl_online.tasks.matl_task", (params,), {}
+        )
+
+        assert options["queue"].name == "explain"
+
+    def test_worker_limits(self, app: Flask, mocker: MockerFixture) -> None:
+        """Each pool of workers sets its own limits."""
+        mocker.patch.dict(
+            os.environ,
+            {
+                "CELERY_TASK_SOFT_TIME_LIMIT": "5",
+                "CELERY_TASK_TIME_LIMIT": "10",
+                "CELERY_WORKER_PREFETCH_MULTIPLIER": "1",
+            },
+        )
+
+        configuration = get_celery_configuration(app.config)
+
+        assert configuration["task_soft_time_limit"] == 5
+        assert configuration["task_time_limit"] == 10
+        assert configuration["worker_prefetch_multiplier"] == 1
+
+    def test_proc_alive_timeout(self, app: Flask, mocker: MockerFixture) -> None:
+        """Worker processes have enough time to warm up MATL."""
+        mocker.patch.dict(app.config, {"MATL_WARMUP_TIMEOUT": 15})
+        configuration = get_celery_configuration(app.config)
+
+        assert configuration["worker_proc_alive_timeout"] == 45
+
+
+def test_trusted_proxies() -> None:
+    """Client addresses are taken from the load balancer when it is trusted."""
+    flask_app = Flask(__name__)
+    flask_app.config["TRUSTED_PROXIES"] = 1
+    flask_app.add_url_rule("/", "address", lambda: request.remote_addr or "")
+    app.register_proxies(flask_app)
+
+    assert isinstance(flask_app.wsgi_app, ProxyFix)
+
+    response = flask_app.test_client().get(
+        "/", headers={"X-Forwarded-For": "203.0.113.7"}
+    )
+    assert response.get_data(as_text=True) == "203.0.113.7"
@@ -0,0 +1,160 @@
+"""Unit tests for coalescing the socket events sent by the workers."""
+
+import threading
+from typing import Any, Dict, List
+from unittest.mock import Mock
+
+import pytest
+
+from matl_online.emitter import CoalescingEmitter, merge_frames
+from matl_online.encoding import decode_frame
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _frame(seq: int, *values: str, reset: bool = False) -> Dict[str, Any]:
+    data = [{"type": "stdout", "value": value} for value in values]
+    return {"data": data, "session": "123", "seq": seq, "reset": reset}
+
+
+def _frames(socket: Mock) -> List[Dict[str, Any]]:
+    return [c.args[1] for c in socket.emit.call_args_list if c.args[0] == "status"]
+
+
+class TestMergeFrames:
+    def test_merge(self) -> None:
+        pending = _frame(0, "a")
+        pending["data"].append({"type": "stderr", "value": "oops"})
+
+        merged = merge_frames(pending, _frame(1, "b"))
+
+        assert merged["seq"] == 1
+        assert not merged["reset"]
+        assert merged["data"] == [
+            {"type": "stdout", "value": "a"},
+            {"type": "stderr", "value": "oops"},
+            {"type": "stdout", "value": "b"},
+        ]
+
+    def test_merge_stdout(self) -> None:
+        """Consecutive stdout is combined into a single item."""
+        merged = merge_frames(_frame(0, "a"), _frame(1, "\nb"))
+
+        assert merged["data"] == [{"type": "stdout", "value": "a\nb"}]
+
+    def test_reset(self) -> None:
+        """Output prior to a reset is never sent."""
+        merged = merge_frames(_frame(0, "a"), _frame(1, "b", reset=True))
+
+        assert merged == _frame(1, "b", reset=True)
+
+    def test_pending_reset(self) -> None:
+        merged = merge_frames(_frame(0, "a", reset=True), _frame(1, "b"))
+
+        assert merged["reset"]
+
+
+class TestCoalescingEmitter:
+    def test_unlimited(self) -> None:
+        """Without any limits, frames are sent right away."""
+        socket = Mock()
+        emitter = CoalescingEmitter(socket.emit)
+
+        emitter.emit_frame(_frame(0, "a"), room="123")
+        emitter.emit_frame(_frame(1, "b"), room="123")
+
+        assert _frames(socket) == [_frame(0, "a"), _frame(1, "b")]
+        assert socket.emit.call_args.kwargs["room"] == "123"
+
+    def test_rate_limit(self) -> None:
+        clock = FakeClock()
+        socket = Mock()
+        emitter = CoalescingEmitter(
+            socket.emit, max_messages_per_second=10, clock=clock
+        )
+
+        emitter.emit_frame(_frame(0, "a"), room="123")
+        emitter.emit_frame(_frame(1, "b"), room="123")
+        emitter.emit_frame(_frame(2, "c"), room="123")
+
+        # Only the first frame was sent, the others are waiting
+        assert _frames(socket) == [_frame(0, "a")]
+        assert emitter.delay("123") == pytest.approx(0.1)
+
+        clock.now += 0.1
+        emitter.flush("123")
+
+        assert _frames(socket) == [_frame(0, "a"), _frame(2, "bc")]
+
+    def test_sessions_are_independent(self) -> None:
+        clock = FakeClock()
+        socket = Mock()
+        emitter = CoalescingEmitter(socket.emit, max_messages_per_second=1, clock=clock)
+
+        emitter.emit_frame(_frame(0, "a"), room="1")
+        emitter.emit_frame(_frame(0, "b"), room="2")
+
+        assert len(_frames(socket)) == 2
+        emitter.flush("1")
+        emitter.flush("2")
+
+    def test_force(self) -> None:
+        """Final frames are always sent immediately."""
+        socket = Mock()
+        emitter = CoalescingEmitter(socket.emit, window=60)
+
+        emitter.emit_frame(_frame(0, "a"), room="123")
+        assert _frames(socket) == []
+
+        emitter.emit_frame(_frame(1, "b"), room="123", force=True)
+        assert _frames(socket) == [_frame(1, "ab")]
+
+    def test_window(self) -> None:
+        """Pending frames are sent once the window has passed."""
+        sent = threading.Event()
+        socket = Mock()
+        socket.emit.side_effect = lambda *args, **kwargs: sent.set()
+
+        emitter = CoalescingEmitter(socket.emit, window=0.01)
+        emitter.emit_frame(_frame(0, "a"), room="123")
+        emitter.emit_frame(_frame(1, "b"), room="123")
+
+        assert sent.wait(5)
+        assert _frames(socket) == [_frame(1, "ab")]
+
+    def test_encoding(self) -> None:
+        """Frames are encoded as requested once they are merged."""
+        socket = Mock()
+        emitter = CoalescingEmitter(socket.emit, window=60)
+
+        emitter.emit_frame(_frame(0, "a"), room="123", encoding="msgpack")
+        emitter.emit_frame(_frame(1, "b"), room="123", encoding="msgpack")
+        emitter.flush("123")
+
+        (payload,) = _frames(socket)
+
+        assert isinstance(payload, bytes)
+        assert decode_frame(payload) == _frame(1, "ab")
+
+    def test_events_flush(self) -> None:
+        """Pending output is sent before any other event (i.e. completion)."""
+        socket = Mock()
+        emitter = CoalescingEmitter(socket.emit, window=60)
+
+        emitter.emit_frame(_frame(0, "a"), room="123")
+        emitter.emit("complete", {"success": True}, room="123")
+
+        assert [c.args[0] for c in socket.emit.call_args_list] == [
+            "status",
+            "complete",
+        ]
+
+        # Nothing remains to be sent
+        emitter.flush("123")
+        assert socket.emit.call_count == 2
@@ -0,0 +1,58 @@
+"""Unit tests for encoding the output frames sent to the clients."""
+
+from typing import Any, Dict
+
+import msgpack  # type: ignore[import]
+
+from matl_online.encoding import TYPE_CODES, decode_frame, encode_frame
+
+FRAME: Dict[str, Any] = {
+    "data": [
+        {"type": "stdout", "value": "héllo\n"},
+        {"type": "stderr", "value": "error"},
+        {"type": "image", "value": "/artifacts/image.png"},
+    ],
+    "session": "123",
+    "seq": 4,
+    "reset": True,
+}
+
+
+class TestEncoding:
+    def test_json(self) -> None:
+        """JSON frames are left to the socket to encode."""
+        assert encode_frame(FRAME) is FRAME
+        assert encode_frame(FRAME, "json") is FRAME
+
+    def test_msgpack(self) -> None:
+        encoded = encode_frame(FRAME, "msgpack")
+
+        assert isinstance(encoded, bytes)
+        assert msgpack.unpackb(encoded) == [
+            "123",
+            4,
+            True,
+            [[0, "héllo\n"], [2, "error"], [3, "/artifacts/image.png"]],
+        ]
+
+        assert decode_frame(encoded) == FRAME
+
+    def test_unknown_type(self) -> None:
+        frame = {**FRAME, "data": [{"type": "other", "value": "x"}]}
+        encoded = encode_frame(frame, "msgpack")
+
+        assert isinstance(encoded, bytes)
+        assert decode_frame(encoded) == frame
+
+    def test_type_codes(self) -> None:
+        """The codes are shared with the client and must never change."""
+        assert list(TYPE_CODES) == [
+            "stdout",
+            "stdout2",
+            "stderr",
+            "image",
+            "image_nn",
+            "audio",
+            "truncated",
+        ]
+        assert list(TYPE_CODES.values()) == list(range(len(TYPE_CODES)))
@@ -9,6 +9,8 @@ from flask import Flask, url_for
 from pytest_mock.plugin import MockerFixture
 from webtest import TestApp  # type: ignore
 
+from matl_online.matl.releases import ReleaseRefreshSummary
+
 
 def get_signature(app: Flask, data: str) -> Dict[str, str]:
     """Create a signature header from the secret and payload."""
@@ -114,3 +116,26 @@ class TestReleaseHook:
 
         # Make sure that we never refresh the releases for these events
         refresh.assert_not_called()
+
+    def test_clears_page_cache(
+        self, app: Flask, testapp: TestApp, mocker: MockerFixture
+    ) -> None:
+        """Cached pages are only cleared when the releases have changed."""
+        url = url_for("public.github_hook")
+        data = {"release": "1.2.3"}
+
+        headers = get_signature(app, json.dumps(data))
+        headers.update({"X-GitHub-Event": "release"})
+
+        refresh = mocker.patch("matl_online.public.views.refresh_releases")
+        invalidate = mocker.patch("matl_online.public.views.invalidate")
+
+        refresh.return_value = ReleaseRefreshSummary()
+        testapp.post_json(url, data, headers=headers)
+
+        invalidate.assert_not_called()
+
+        refresh.return_value = ReleaseRefreshSummary(created=["1.2.3"])
+        testapp.post_json(url, data, headers=headers)
+
+        invalidate.assert_called_once_with()
@@ -1,9 +1,17 @@
 """Unit tests for checking our realtime log handler."""
 
+import pathlib
+import sys
 from logging import Logger
 
+import pytest
+from metakernel import replwrap  # type: ignore[import]
 from pytest_mock.plugin import MockerFixture
 
+from matl_online.emitter import CoalescingEmitter
+from matl_online.errors import OutputLimitExceeded
+from matl_online.matl.io import FrameDecoder
+from matl_online.settings import config
 from matl_online.tasks import OctaveTask, OutputHandler
 
 
@@ -19,9 +27,8 @@ class TestLogHandler:
 
         assert handler.task == task
 
-        # There should be no messages initially
-        assert len(handler.contents) == 0
-        assert handler.messages() == ""
+        # There should be no output initially
+        assert handler.results()["data"] == []
 
     def test_stdout_log(self, logger: Logger) -> None:
         """STDOUT events should create appropriate messages."""
@@ -34,8 +41,7 @@ class TestLogHandler:
         msg = "I am a message"
         logger.info(msg)
 
-        assert len(handler.contents) == 1
-        assert handler.messages() == msg
+        assert handler.results()["data"] == [{"type": "stdout", "value": msg}]
 
     def test_clc_log(self, logger: Logger, mocker: MockerFixture) -> None:
         """CLC should flush the contents."""
@@ -50,16 +56,15 @@ class TestLogHandler:
         logger.info("I am an empty message")
 
         send_func.assert_not_called()
-        assert len(handler.contents) == 1
 
         # Now send a CLC event
-        logger.info("[CLC]")
+        logger.info(handler.decoder.encode("CLC"))
 
         # Make sure that the send function was called
         assert send_func.call_count == 1
 
         # Make sure all messages were flushed
-        assert len(handler.contents) == 0
+        assert handler.results()["data"] == []
 
     def test_pause(self, logger: Logger, mocker: MockerFixture) -> None:
         """For a pause event, we should have data sent but NOT cleared."""
@@ -76,17 +81,60 @@ class TestLogHandler:
         logger.info(msg)
 
         send_func.assert_not_called()
-        assert len(handler.contents) == 1
 
-        # Now send a CLC event
-        logger.info("[PAUSE]")
+        # Now send a PAUSE event
+        logger.info(handler.decoder.encode("PAUSE"))
 
         # Make sure that the send function was called
         assert send_func.call_count == 1
 
-        # Make sure all messages were flushed
-        assert len(handler.contents) == 1
-        assert handler.messages() == msg
+        # Make sure nothing was cleared
+        assert handler.results()["data"] == [{"type": "stdout", "value": msg}]
+
+    def test_cases(self, logger: Logger, mocker: MockerFixture) -> None:
+        """CASE records separate the output of each case."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        emit = mocker.patch("matl_online.tasks.emitter.emit_frame")
+
+        logger.info(handler.decoder.encode("CASE", "0"))
+        logger.info("first")
+        logger.info(handler.decoder.encode("CASE", "1"))
+        logger.info(handler.decoder.encode("STDERR", "error"))
+        handler.send(final=True)
+
+        results = handler.results()
+
+        assert results["data"] == []
+        assert [case["output"] for case in results["cases"]] == [
+            [{"type": "stdout", "value": "first"}],
+            [{"type": "stderr", "value": "error"}],
+        ]
+        assert all(case["time"] >= 0 for case in results["cases"])
+
+        # The output of each case is also sent as it is produced
+        sent = [item for call in emit.call_args_list for item in call[0][0]["data"]]
+        assert sent == [
+            {"type": "stdout", "value": "first"},
+            {"type": "stderr", "value": "error"},
+        ]
+
+    def test_no_cases(self, logger: Logger, mocker: MockerFixture) -> None:
+        """Output before any case (i.e. a compilation error) is kept."""
+        task = OctaveTask()
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        logger.info(handler.decoder.encode("STDERR", "error"))
+        handler.send(final=True)
+
+        assert handler.results() == {
+            "data": [{"type": "stderr", "value": "error"}],
+            "session": None,
+        }
 
     def test_ignore_octave_warning(self, logger: Logger, mocker: MockerFixture) -> None:
         """Occasionally octave will print warning: messages to be ignored."""
@@ -101,7 +149,7 @@ class TestLogHandler:
         logger.info("warning: I am octave and I still like warnings")
 
         send_func.assert_not_called()
-        assert len(handler.contents) == 0
+        assert handler.results()["data"] == []
 
     def test_matl_error_handling(self, logger: Logger, mocker: MockerFixture) -> None:
         """Error messages are prefaced with [STDERR]."""
@@ -117,10 +165,74 @@ class TestLogHandler:
 
         # Check the contents
         send_func.assert_not_called()
-        assert len(handler.contents) == 3
-        assert handler.contents[0] == "[STDERR]MATL run-time error:"
-        assert handler.contents[1] == "[STDERR]line 1"
-        assert handler.contents[2] == "[STDERR]line 2"
+        assert handler.results()["data"] == [
+            {"type": "stderr", "value": "MATL run-time error:"},
+            {"type": "stderr", "value": "line 1"},
+            {"type": "stderr", "value": "line 2"},
+        ]
+
+    def test_forged_records(self, logger: Logger, mocker: MockerFixture) -> None:
+        """Program output that looks like a record is displayed as is."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        send_func = mocker.patch("matl_online.tasks.OutputHandler.send")
+
+        logger.info("[PAUSE]")
+        logger.info(FrameDecoder("guess").encode("CLC"))
+
+        send_func.assert_not_called()
+        assert handler.results()["data"] == [
+            {
+                "type": "stdout",
+                "value": "[PAUSE]\n" + FrameDecoder("guess").encode("CLC"),
+            }
+        ]
+
+    def test_record_after_text(self, logger: Logger) -> None:
+        """Records may follow output that was not terminated by a newline."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        logger.info("partial" + handler.decoder.encode("STDERR", "error"))
+
+        assert handler.results()["data"] == [
+            {"type": "stdout", "value": "partial"},
+            {"type": "stderr", "value": "error"},
+        ]
+
+    def test_repl_records(self, mocker: MockerFixture) -> None:
+        """Records are decoded from the lines of output delivered by the REPL.
+
+        The REPL strips the trailing whitespace of every line.
+        """
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+
+        send_func = mocker.patch("matl_online.tasks.OutputHandler.send")
+
+        records = [
+            handler.decoder.encode("STDERR", "error "),
+            handler.decoder.encode("PAUSE"),
+        ]
+
+        repl = replwrap.python(sys.executable)
+
+        try:
+            for record in records:
+                repl.run_command(
+                    f"print({record!r})", line_handler=handler.process_message
+                )
+        finally:
+            repl.terminate()
+
+        assert send_func.call_count == 1
+        assert handler.results()["data"] == [{"type": "stderr", "value": "error "}]
 
     def test_filter(self, logger: Logger, mocker: MockerFixture) -> None:
         """Ensure that we ONLY get info events."""
@@ -135,7 +247,7 @@ class TestLogHandler:
         logger.error("error")
         logger.debug("debug")
 
-        assert len(handler.contents) == 0
+        assert handler.results()["data"] == []
         send_func.assert_not_called()
 
     def test_send(self, logger: Logger, mocker: MockerFixture) -> None:
@@ -149,7 +261,7 @@ class TestLogHandler:
         emit = mocker.patch("matl_online.tasks.socket.emit")
 
         logger.info("test1")
-        logger.info("[STDERR]error")
+        logger.info(handler.decoder.encode("STDERR", "error"))
         handler.send()
 
         assert emit.called == 1
@@ -159,6 +271,8 @@ class TestLogHandler:
 
         expected_data = {
             "session": identifier,
+            "seq": 0,
+            "reset": False,
             "data": [
                 {"type": "stdout", "value": "test1"},
                 {"type": "stderr", "value": "error"},
@@ -168,3 +282,266 @@ class TestLogHandler:
         assert payload == expected_data
         assert event == "status"
         assert emit.call_args[1].get("room") == identifier
+
+    def test_delta_frames(self, logger: Logger, mocker: MockerFixture) -> None:
+        """Each frame only contains the output since the previous frame."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        emit = mocker.patch("matl_online.tasks.socket.emit")
+
+        logger.info("line 1")
+        logger.info(handler.decoder.encode("PAUSE"))
+        logger.info("line 2")
+        logger.info(handler.decoder.encode("STDERR", "error"))
+        logger.info(handler.decoder.encode("PAUSE"))
+        logger.info(handler.decoder.encode("PAUSE"))
+
+        frames = [c.args[1] for c in emit.call_args_list]
+
+        assert [frame["seq"] for frame in frames] == [0, 1, 2]
+        assert [frame["data"] for frame in frames] == [
+            [{"type": "stdout", "value": "line 1"}],
+            [
+                {"type": "stdout", "value": "\nline 2"},
+                {"type": "stderr", "value": "error"},
+            ],
+            [],
+        ]
+
+        # The complete output is still available at the end
+        result = handler.results()
+
+        assert result["data"] == [
+            {"type": "stdout", "value": "line 1\nline 2"},
+            {"type": "stderr", "value": "error"},
+        ]
+
+    def test_clc_resets_output(self, logger: Logger, mocker: MockerFixture) -> None:
+        """The frame following a CLC instructs the client to clear its output."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        emit = mocker.patch("matl_online.tasks.socket.emit")
+
+        logger.info("before")
+        logger.info(handler.decoder.encode("CLC"))
+        logger.info("after")
+        handler.send()
+        result = handler.results()
+
+        frames = [c.args[1] for c in emit.call_args_list]
+
+        assert [frame["reset"] for frame in frames] == [False, True]
+        assert frames[1]["data"] == [{"type": "stdout", "value": "after"}]
+        assert result["data"] == [{"type": "stdout", "value": "after"}]
+
+    def test_reset(self, logger: Logger, mocker: MockerFixture) -> None:
+        """A new run restarts the sequence numbers."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        emit = mocker.patch("matl_online.tasks.socket.emit")
+
+        logger.info("first")
+        handler.send()
+        handler.reset()
+        logger.info("second")
+        handler.send()
+
+        frame = emit.call_args.args[1]
+
+        assert frame["seq"] == 0
+        assert not frame["reset"]
+        assert frame["data"] == [{"type": "stdout", "value": "second"}]
+
+    def test_shared_run(self, logger: Logger, mocker: MockerFixture) -> None:
+        """Rooms joining a shared run receive all output sent so far."""
+        task = OctaveTask()
+        task.session_id = "a"
+        task.shared_key = "flight:key"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        flight = mocker.patch("matl_online.tasks.get_single_flight").return_value
+        flight.subscribers.return_value = {"a": "json"}
+        flight.finish.return_value = {"a": "json", "b": "json"}
+        emit = mocker.patch("matl_online.tasks.socket.emit")
+
+        logger.info("line 1")
+        handler.send()
+        logger.info("line 2")
+        handler.send(final=True)
+
+        frames = {
+            (c.kwargs["room"], c.args[1]["seq"]): c.args[1] for c in emit.call_args_list
+        }
+
+        assert list(frames) == [("a", 0), ("a", 1), ("b", 1)]
+        assert frames[("a", 1)]["data"] == [{"type": "stdout", "value": "\nline 2"}]
+        assert frames[("b", 1)]["data"] == [
+            {"type": "stdout", "value": "line 1\nline 2"}
+        ]
+        assert frames[("b", 1)]["session"] == "b"
+
+        # Events after the run finished go to the same rooms
+        task.emit("complete", {"success": True})
+
+        assert [c.kwargs["room"] for c in emit.call_args_list[-2:]] == ["a", "b"]
+        flight.finish.assert_called_once_with("flight:key")
+
+    def test_coalesced_pauses(self, logger: Logger, mocker: MockerFixture) -> None:
+        """A burst of pauses is combined and flushed with the final frame."""
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+        logger.addHandler(handler)
+
+        emit = mocker.patch("matl_online.tasks.socket.emit")
+        mocker.patch(
+            "matl_online.tasks.emitter",
+            CoalescingEmitter(emit, max_messages_per_second=0.01),
+        )
+
+        for index in range(100):
+            logger.info(str(index))
+            logger.info(handler.decoder.encode("PAUSE"))
+
+        handler.send(final=True)
+
+        assert emit.call_count == 2
+
+        frame = emit.call_args.args[1]
+        assert frame["seq"] == 100
+        assert frame["data"] == [
+            {"type": "stdout", "value": "\n" + "\n".join(map(str, range(1, 100)))}
+        ]
+
+
+class TestOutputLimits:
+    """Output beyond the configured limits is truncated."""
+
+    def test_line_limit(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "MATL_OUTPUT_MAX_LINES", 3)
+        mocker.patch.object(config, "MATL_OUTPUT_TAIL_LINES", 2)
+        mocker.patch("matl_online.tasks.socket.emit")
+
+        handler = OutputHandler(OctaveTask())
+
+        for index in range(10):
+            handler.process_message(str(index))
+
+        # The tail is only added once the run completed
+        assert handler.results()["data"] == [{"type": "stdout", "value": "0\n1\n2"}]
+
+        handler.send(final=True)
+        result = handler.results()
+
+        assert result["data"] == [
+            {"type": "stdout", "value": "0\n1\n2"},
+            {"type": "truncated", "value": "5 lines of output omitted"},
+            {"type": "stdout", "value": "8\n9"},
+        ]
+
+    def test_byte_limit(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "MATL_OUTPUT_MAX_BYTES", 100)
+        mocker.patch("matl_online.tasks.socket.emit")
+
+        handler = OutputHandler(OctaveTask())
+        handler.process_message("a" * 50)
+        handler.process_message("b" * 50)
+        handler.process_message("c" * 5)
+
+        assert handler.results()["data"] == [{"type": "stdout", "value": "a" * 50}]
+
+        handler.send(final=True)
+        result = handler.results()
+
+        # Long lines only keep their end
+        assert result["data"][1:] == [
+            {"type": "truncated", "value": "0 lines of output omitted"},
+            {"type": "stdout", "value": "b" * 10 + "\n" + "c" * 5},
+        ]
+
+    def test_clc(self, mocker: MockerFixture) -> None:
+        """Clearing the output resets the limits."""
+        mocker.patch.object(config, "MATL_OUTPUT_MAX_LINES", 1)
+        mocker.patch("matl_online.tasks.socket.emit")
+
+        handler = OutputHandler(OctaveTask())
+        handler.process_message("a")
+        handler.process_message("b")
+        handler.process_message(handler.decoder.encode("CLC"))
+        handler.process_message("c")
+
+        assert not handler.truncated
+        handler.send(final=True)
+        assert handler.results()["data"] == [{"type": "stdout", "value": "c"}]
+
+    def test_stop(self, mocker: MockerFixture) -> None:
+        """Exceeding the total output limit stops the program only once."""
+        mocker.patch.object(config, "MATL_OUTPUT_STOP_BYTES", 10)
+
+        handler = OutputHandler(OctaveTask())
+        handler.process_message("12345")
+
+        with pytest.raises(OutputLimitExceeded):
+            handler.process_message("67890")
+
+        handler.process_message("more")
+
+        # A new run may produce output again
+        handler.reset()
+        handler.process_message("12345")
+
+
+class TestImageFrames:
+    """Unchanged images are only sent to the clients once."""
+
+    def test_duplicates(self, tmp_path: pathlib.Path, mocker: MockerFixture) -> None:
+        emit = mocker.patch("matl_online.tasks.emitter.emit_frame")
+        skipped = mocker.patch("matl_online.tasks.duplicate_images")
+
+        image = tmp_path.joinpath("image.png")
+        image.write_bytes(b"frame")
+
+        task = OctaveTask()
+        task.session_id = "123"
+        handler = OutputHandler(task)
+
+        for _ in range(2):
+            handler.process_message(handler.decoder.encode("IMAGE", image.as_posix()))
+            handler.process_message(handler.decoder.encode("PAUSE"))
+
+        # Cleared output needs the image again
+        handler.process_message(handler.decoder.encode("CLC"))
+        handler.process_message(handler.decoder.encode("IMAGE", image.as_posix()))
+        handler.send(final=True)
+
+        frames = [call.args[0]["data"] for call in emit.call_args_list]
+        sent = [item["type"] for frame in frames for item in frame]
+        assert sent == ["image", "image"]
+        skipped.inc.assert_called_once_with(1)
+
+    def test_results(self, tmp_path: pathlib.Path, mocker: MockerFixture) -> None:
+        """A program which outputs the same figure twice returns both."""
+        mocker.patch("matl_online.tasks.emitter.emit_frame")
+
+        image = tmp_path.joinpath("image.png")
+        image.write_bytes(b"frame")
+
+        handler = OutputHandler(OctaveTask())
+
+        for _ in range(2):
+            handler.process_message(handler.decoder.encode("IMAGE", image.as_posix()))
+            handler.send()
+
+        handler.send(final=True)
+
+        assert [item["type"] for item in handler.results()["data"]] == ["image"] * 2
@@ -1,11 +1,18 @@
 """Unit tests for the module for interacting with Octave."""
 
 import pathlib
+import sys
 from typing import Any, List
+from unittest.mock import Mock
 
+import pexpect  # type: ignore
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+from metakernel import replwrap  # type: ignore[import]
 from pytest_mock.plugin import MockerFixture
 
 from matl_online.octave import OctaveSession, string
+from matl_online.settings import Config
 
 
 class TestOctaveSession:
@@ -210,3 +217,88 @@ class TestString:
         original = "testing \\backslashes\\"
 
         assert string(original) == r'"testing \\backslashes\\"'
+
+
+class TestInterrupt:
+    """Aborting programs without restarting Octave."""
+
+    @pytest.fixture
+    def engine(self, mocker: MockerFixture) -> Mock:
+        engine: Mock = mocker.patch("matl_online.octave.OctaveEngine").return_value
+        return engine
+
+    def test_interrupt(self, engine: Mock) -> None:
+        session = OctaveSession()
+
+        assert session.interrupt()
+        assert session.alive
+
+        engine.repl.child.sendintr.assert_called_once_with()
+        engine.repl.child.expect.assert_called_once_with(
+            [engine.repl.prompt_regex, engine.repl.continuation_prompt_regex],
+            timeout=Config.OCTAVE_INTERRUPT_TIMEOUT,
+        )
+
+    def test_repl(self, engine: Mock) -> None:
+        """The REPL can evaluate code again once it was interrupted."""
+        engine.repl = replwrap.python(sys.executable)
+        session = OctaveSession()
+
+        try:
+            engine.repl.child.sendline("import time; time.sleep(100)")
+
+            assert session.interrupt()
+            assert engine.repl.run_command("print(1 + 1)").strip() == "2"
+        finally:
+            engine.repl.terminate()
+
+    def test_unresponsive(self, engine: Mock) -> None:
+        """Octave is terminated if it doesn't return to its prompt."""
+        engine.repl.child.expect.side_effect = pexpect.TIMEOUT("Timed out")
+
+        session = OctaveSession()
+
+        assert not session.interrupt()
+        assert not session.alive
+
+        engine.repl.terminate.assert_called_once_with()
+
+    def test_eval(self, engine: Mock) -> None:
+        """Evaluations which are aborted interrupt Octave."""
+        engine.eval.side_effect = SoftTimeLimitExceeded()
+
+        session = OctaveSession()
+
+        with pytest.raises(SoftTimeLimitExceeded):
+            session.eval("pause(100)")
+
+        engine.repl.child.sendintr.assert_called_once_with()
+
+    def test_cleanup(self, engine: Mock, tmp_path: pathlib.Path) -> None:
+        """The directory and paths are restored after an interrupted program."""
+        engine.eval.return_value = "/original"
+
+        session = OctaveSession()
+
+        with pytest.raises(SoftTimeLimitExceeded):
+            with session.current_directory(tmp_path), session.paths(tmp_path):
+                raise SoftTimeLimitExceeded()
+
+        commands = [c.args[0] for c in engine.eval.call_args_list]
+        assert commands[-2:] == [
+            f'rmpath("{tmp_path.as_posix()}");\n',
+            'cd("/original");\n',
+        ]
+
+    def test_no_cleanup(self, engine: Mock, tmp_path: pathlib.Path) -> None:
+        """Nothing is restored after Octave was terminated."""
+        engine.eval.return_value = "/original"
+
+        session = OctaveSession()
+
+        with pytest.raises(SoftTimeLimitExceeded):
+            with session.current_directory(tmp_path):
+                session.terminate()
+                raise SoftTimeLimitExceeded()
+
+        assert engine.eval.call_args.args[0] == f'cd("{tmp_path.as_posix()}");\n'
@@ -0,0 +1,254 @@
+"""Unit tests for tracking the readiness of worker processes."""
+
+import os
+import pathlib
+from unittest.mock import Mock
+
+import pytest
+from celery.platforms import EX_OK
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.readiness import (
+    ProcessState,
+    ReadinessStep,
+    WorkerReadiness,
+    clear_process_state,
+    is_ready,
+    process_state,
+    process_states,
+    set_process_state,
+    update_readiness_file,
+)
+from matl_online.settings import config
+from matl_online.tasks import OctaveTask, _initialize_process, _shutdown_process
+
+
+class TestProcessState:
+    def test_set_state(self, tmp_path: pathlib.Path) -> None:
+        set_process_state(ProcessState.STARTING, pid=10, directory=tmp_path)
+
+        assert process_state(10, tmp_path) == ProcessState.STARTING
+
+        set_process_state(ProcessState.READY, pid=10, directory=tmp_path)
+
+        assert process_state(10, tmp_path) == ProcessState.READY
+
+    def test_default_pid(self, tmp_path: pathlib.Path) -> None:
+        set_process_state(ProcessState.READY, directory=tmp_path)
+
+        assert process_state(os.getpid(), tmp_path) == ProcessState.READY
+
+    def test_missing_state(self, tmp_path: pathlib.Path) -> None:
+        assert process_state(10, tmp_path) is None
+
+    def test_corrupt_state(self, tmp_path: pathlib.Path) -> None:
+        tmp_path.joinpath("10.json").write_text("{")
+
+        assert process_state(10, tmp_path) is None
+
+    def test_clear_state(self, tmp_path: pathlib.Path) -> None:
+        set_process_state(ProcessState.READY, pid=10, directory=tmp_path)
+        clear_process_state(10, tmp_path)
+
+        assert process_state(10, tmp_path) is None
+
+        # Clearing again is not an error
+        clear_process_state(10, tmp_path)
+
+    def test_process_states(self, tmp_path: pathlib.Path) -> None:
+        set_process_state(ProcessState.READY, pid=1, directory=tmp_path)
+        set_process_state(ProcessState.RESTARTING, pid=2, directory=tmp_path)
+
+        assert process_states([1, 2, 3], tmp_path) == {
+            1: ProcessState.READY,
+            2: ProcessState.RESTARTING,
+            3: None,
+        }
+
+
+class TestReadiness:
+    def test_all_ready(self, tmp_path: pathlib.Path) -> None:
+        for pid in (1, 2):
+            set_process_state(ProcessState.READY, pid=pid, directory=tmp_path)
+
+        assert is_ready([1, 2], tmp_path)
+
+    def test_partially_ready(self, tmp_path: pathlib.Path) -> None:
+        set_process_state(ProcessState.READY, pid=1, directory=tmp_path)
+        set_process_state(ProcessState.STARTING, pid=2, directory=tmp_path)
+
+        assert not is_ready([1, 2], tmp_path)
+
+    def test_no_processes(self, tmp_path: pathlib.Path) -> None:
+        assert not is_ready([], tmp_path)
+
+    def test_readiness_file(self, tmp_path: pathlib.Path) -> None:
+        readiness_file = tmp_path.joinpath("ready")
+        status_directory = tmp_path.joinpath("status")
+
+        set_process_state(ProcessState.STARTING, pid=1, directory=status_directory)
+        assert not update_readiness_file(readiness_file, [1], False, status_directory)
+        assert not readiness_file.exists()
+
+        set_process_state(ProcessState.READY, pid=1, directory=status_directory)
+        assert update_readiness_file(readiness_file, [1], False, status_directory)
+        assert readiness_file.exists()
+
+        # A restart makes the worker unready again
+        set_process_state(ProcessState.RESTARTING, pid=1, directory=status_directory)
+        assert not update_readiness_file(readiness_file, [1], False, status_directory)
+        assert not readiness_file.exists()
+
+    def test_draining(self, tmp_path: pathlib.Path) -> None:
+        readiness_file = tmp_path.joinpath("ready")
+
+        set_process_state(ProcessState.READY, pid=1, directory=tmp_path)
+
+        assert not update_readiness_file(readiness_file, [1], True, tmp_path)
+        assert not readiness_file.exists()
+
+
+class TestTaskProcessState:
+    def test_initialization(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        """A process is only ready after Octave has been launched and warmed up."""
+        mocker.patch("matl_online.tasks.OctaveSession", return_value=octave_mock)
+        mocker.patch("matl_online.tasks.warm_up")
+        set_state = mocker.patch("matl_online.tasks.set_process_state")
+
+        _initialize_process()
+
+        assert [c.args[0] for c in set_state.call_args_list] == [
+            ProcessState.STARTING,
+            ProcessState.READY,
+        ]
+
+    def test_restart(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        octave_mock.alive = False
+        mocker.patch("matl_online.tasks.warm_up")
+        set_state = mocker.patch("matl_online.tasks.set_process_state")
+
+        OctaveTask().on_term()
+
+        assert [c.args[0] for c in set_state.call_args_list] == [
+            ProcessState.RESTARTING,
+            ProcessState.READY,
+        ]
+
+    def test_shutdown(self, mocker: MockerFixture) -> None:
+        clear_state = mocker.patch("matl_online.tasks.clear_process_state")
+
+        _shutdown_process()
+
+        clear_state.assert_called_once_with()
+
+
+class TestWorkerReadiness:
+    @pytest.fixture
+    def worker_state(self, mocker: MockerFixture) -> Mock:
+        state: Mock = mocker.patch("matl_online.readiness.worker_state")
+        state.active_requests = set()
+        state.reserved_requests = set()
+        state.should_stop = None
+        return state
+
+    @pytest.fixture
+    def consumer(self) -> Mock:
+        consumer = Mock()
+        consumer.pool.info = {"processes": [1, 2]}
+        consumer.task_consumer.queues = [Mock(), Mock()]
+        consumer.task_consumer.queues[0].name = "interactive"
+        consumer.task_consumer.queues[1].name = "batch"
+        return consumer
+
+    def test_not_started(self, tmp_path: pathlib.Path) -> None:
+        """A worker without a consumer (i.e. pool processes) isn't ready."""
+        readiness = WorkerReadiness(tmp_path.joinpath("ready"), tmp_path)
+
+        assert readiness.pool_pids() == []
+        assert not readiness.update()
+
+    def test_update(
+        self, tmp_path: pathlib.Path, consumer: Mock, worker_state: Mock
+    ) -> None:
+        readiness_file = tmp_path.joinpath("ready")
+        readiness = WorkerReadiness(readiness_file, tmp_path)
+        readiness.consumer = consumer
+
+        set_process_state(ProcessState.READY, pid=1, directory=tmp_path)
+        assert not readiness.update()
+
+        set_process_state(ProcessState.READY, pid=2, directory=tmp_path)
+        assert readiness.update()
+        assert readiness_file.exists()
+
+        clear_process_state(2, tmp_path)
+        assert not readiness.update()
+        assert not readiness_file.exists()
+        assert worker_state.should_stop is None
+
+    def test_drain(
+        self, tmp_path: pathlib.Path, consumer: Mock, worker_state: Mock
+    ) -> None:
+        """Draining stops consuming and only exits once in-flight runs completed."""
+        readiness_file = tmp_path.joinpath("ready")
+        readiness = WorkerReadiness(readiness_file, tmp_path)
+        readiness.consumer = consumer
+
+        for pid in (1, 2):
+            set_process_state(ProcessState.READY, pid=pid, directory=tmp_path)
+
+        assert readiness.update()
+
+        worker_state.active_requests = {Mock()}
+        readiness.drain(consumer)
+
+        assert readiness.draining
+        assert not readiness_file.exists()
+        assert [c.args for c in consumer.call_soon.call_args_list] == [
+            (consumer.cancel_task_queue, "interactive"),
+            (consumer.cancel_task_queue, "batch"),
+        ]
+        assert worker_state.should_stop is None
+
+        # Reserved runs are completed as well
+        worker_state.active_requests = set()
+        worker_state.reserved_requests = {Mock()}
+        assert not readiness.update()
+        assert worker_state.should_stop is None
+
+        worker_state.reserved_requests = set()
+        assert not readiness.update()
+        assert not readiness_file.exists()
+        assert worker_state.should_stop == EX_OK
+
+    def test_drain_idle(
+        self, tmp_path: pathlib.Path, consumer: Mock, worker_state: Mock
+    ) -> None:
+        """An idle worker exits as soon as it is drained."""
+        readiness = WorkerReadiness(tmp_path.joinpath("ready"), tmp_path)
+        readiness.drain(consumer)
+
+        assert worker_state.should_stop == EX_OK
+
+
+class TestReadinessStep:
+    def test_timer(self, tmp_path: pathlib.Path) -> None:
+        """The readiness is refreshed by a timer rather than by heartbeats."""
+        readiness = WorkerReadiness(tmp_path.joinpath("ready"), tmp_path)
+
+        class Step(ReadinessStep):
+            pass
+
+        Step.readiness = readiness
+        consumer = Mock()
+        step = Step(consumer)
+
+        step.start(consumer)
+
+        assert readiness.consumer is consumer
+        consumer.timer.call_repeatedly.assert_called_once_with(
+            config.CELERY_WORKER_READINESS_INTERVAL, readiness.update
+        )
+
+        step.stop(consumer)
+        consumer.timer.call_repeatedly.return_value.cancel.assert_called_once_with()
@@ -0,0 +1,74 @@
+"""Unit tests for the registry of the tasks of each client."""
+
+from unittest.mock import Mock
+
+import pytest
+import redis
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.registry import TaskRegistry, get_task_registry
+from matl_online.settings import config
+
+
+@pytest.fixture
+def client() -> Mock:
+    return Mock()
+
+
+class TestTaskRegistry:
+    def test_register(self, client: Mock) -> None:
+        TaskRegistry(client, ttl=60).register("room", "12345", None)
+
+        pipeline = client.pipeline.return_value
+        pipeline.hset.assert_called_once_with(
+            "task:room", mapping={"task": "12345", "shared_key": "", "token": ""}
+        )
+        pipeline.expire.assert_called_once_with("task:room", 60)
+
+    def test_lookup(self, client: Mock) -> None:
+        client.hgetall.return_value = {"task": "", "shared_key": "flight:a"}
+
+        entry = TaskRegistry(client, ttl=60).lookup("room")
+
+        assert entry == {"task": None, "shared_key": "flight:a", "token": None}
+        client.hgetall.assert_called_once_with("task:room")
+
+    def test_unknown_room(self, client: Mock) -> None:
+        client.hgetall.return_value = {}
+
+        assert TaskRegistry(client, ttl=60).lookup("room") is None
+
+    def test_owns(self, client: Mock) -> None:
+        """Only the token handed out for a task proves that it is owned."""
+        client.hgetall.return_value = {"task": "12345", "token": "secret"}
+        registry = TaskRegistry(client, ttl=60)
+
+        assert registry.owns("room", "secret")
+        assert not registry.owns("room", "other")
+        assert not registry.owns("room", None)
+
+        client.hgetall.return_value = {"task": "12345", "token": ""}
+        assert not registry.owns("room", "")
+
+    def test_redis_unavailable(self, client: Mock) -> None:
+        """The Socket.IO session is used if Redis can't be reached."""
+        client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+        client.hgetall.side_effect = redis.ConnectionError()
+        client.delete.side_effect = redis.ConnectionError()
+
+        registry = TaskRegistry(client, ttl=60)
+        registry.register("room", "12345", None)
+        registry.forget("room")
+
+        assert registry.lookup("room") is None
+
+
+def test_get_task_registry(mocker: MockerFixture) -> None:
+    get_task_registry.cache_clear()
+    assert get_task_registry() is None
+
+    mocker.patch.object(config, "TASK_REGISTRY_REDIS_URL", "redis://localhost:6379/2")
+    get_task_registry.cache_clear()
+    assert isinstance(get_task_registry(), TaskRegistry)
+
+    get_task_registry.cache_clear()
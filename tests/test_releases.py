@@ -68,6 +68,46 @@ class TestRelease:
         assert release4.version > release3.version
         assert release5.version > release4.version
 
+    def test_release_ordering_prerelease(self) -> None:
+        """Pre-releases come before the final release of the same version."""
+        release1: Release = ReleaseFactory.build(tag="9.0.0-alpha")
+        release2 = ReleaseFactory.build(tag="9.0.0-beta")
+        release3 = ReleaseFactory.build(tag="9.0.0")
+
+        assert release2.version > release1.version
+        assert release3.version > release2.version
+
+    def test_version_columns(self) -> None:
+        """The version columns are kept in sync with the tag."""
+        release: Release = ReleaseFactory.create(tag="1.2.3")
+
+        assert (release.major, release.minor, release.patch) == (1, 2, 3)
+        assert release.prerelease is None
+        assert release.is_final is True
+
+        release.update(tag="4.5-rc1")
+
+        assert (release.major, release.minor, release.patch) == (4, 5, 0)
+        assert release.prerelease == "rc1"
+        assert release.is_final is False
+
+    def test_invalid_tag(self) -> None:
+        """Tags which are not version numbers are rejected."""
+        with pytest.raises(ValueError):
+            ReleaseFactory.build(tag="not-a-version")
+
+    def test_versions(self) -> None:
+        """All versions are returned newest first by the database."""
+        tags = ["9.1", "10.0.0", "9.0.1", "10.0.0-beta", "9", "9.1.2"]
+
+        for tag in tags:
+            ReleaseFactory.create(tag=tag)
+
+        versions = [release.tag for release in Release.versions()]
+
+        assert versions == ["10.0.0", "10.0.0-beta", "9.1.2", "9.1", "9.0.1", "9"]
+        assert Release.latest() == Release.versions()[0]
+
     def test_remove_release(self) -> None:
         """Make sure that we can delete a release if needed."""
         num = 10
@@ -0,0 +1,99 @@
+"""Unit tests for the serialization of task messages and results."""
+
+import datetime
+from typing import Any
+
+import msgpack  # type: ignore[import]
+import pytest
+from flask import Flask
+from kombu.exceptions import DecodeError, EncodeError
+from kombu.serialization import dumps as kombu_dumps
+from kombu.serialization import loads as kombu_loads
+
+from matl_online.serialization import CONTENT_TYPE, SERIALIZER, dumps, loads
+from matl_online.settings import get_celery_configuration
+from matl_online.types import (
+    MATLExplainTaskParameters,
+    MATLRunTaskParameters,
+    MATLTaskParameters,
+)
+
+
+def roundtrip(value: Any) -> Any:
+    content_type, encoding, data = kombu_dumps(value, serializer=SERIALIZER)
+    assert content_type == CONTENT_TYPE
+    return kombu_loads(data, content_type, encoding, accept=[CONTENT_TYPE])
+
+
+class TestSerialization:
+    @pytest.mark.parametrize(
+        "params",
+        [
+            MATLTaskParameters(code="1D", version="1.0.0"),
+            MATLRunTaskParameters(
+                code="1D\n2D",
+                version="1.0.0",
+                inputs="1\n2",
+                session_id="abc",
+                encoding="msgpack",
+                client="1.2.3.4",
+                shared_key="flight:key",
+            ),
+            MATLRunTaskParameters(code="i", version="1.0.0", cases=("1", "")),
+            MATLExplainTaskParameters(code="1D", version="1.0.0"),
+        ],
+    )
+    def test_parameters(self, params: MATLTaskParameters) -> None:
+        """Task messages (args, kwargs and options) keep their parameters."""
+        args, kwargs, embed = roundtrip(((params,), {}, {"callbacks": None}))
+
+        assert args[0] == params
+        assert type(args[0]) is type(params)
+        assert kwargs == {} and embed == {"callbacks": None}
+
+    def test_result(self) -> None:
+        date = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        meta = {
+            "status": "SUCCESS",
+            "result": {"data": [{"type": "stdout", "value": "1"}], "time": 0.5},
+            "date_done": date,
+        }
+
+        assert roundtrip(meta) == {**meta, "date_done": date.isoformat()}
+
+    def test_older_message(self) -> None:
+        """Fields added since a message was sent get their default value."""
+        fields = msgpack.packb([1, "1D", "1.0.0"])
+        data = msgpack.packb([1, msgpack.ExtType(1, fields)])
+
+        assert loads(data) == MATLRunTaskParameters(code="1D", version="1.0.0")
+
+    def test_unknown_version(self) -> None:
+        data = msgpack.packb([2, {}])
+
+        with pytest.raises(DecodeError):
+            kombu_loads(data, CONTENT_TYPE, "binary", accept=[CONTENT_TYPE])
+
+    def test_unsupported_type(self) -> None:
+        with pytest.raises(EncodeError):
+            kombu_dumps({"value": object()}, serializer=SERIALIZER)
+
+    def test_compact(self) -> None:
+        """Field names aren't part of the messages."""
+        params = MATLRunTaskParameters(code="1D", version="1.0.0")
+        assert b"session_id" not in dumps(params)
+
+    def test_configuration(self, app: Flask) -> None:
+        configuration = get_celery_configuration(app.config)
+
+        assert configuration["task_serializer"] == SERIALIZER
+        assert configuration["result_serializer"] == SERIALIZER
+        assert CONTENT_TYPE in configuration["accept_content"]
+        assert "application/x-python-serialize" not in configuration["accept_content"]
+
+    def test_accept_pickle(self, app: Flask, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Pickled messages are only accepted during a transition."""
+        monkeypatch.setenv("CELERY_ACCEPT_PICKLE", "1")
+        configuration = get_celery_configuration(app.config)
+
+        assert "application/x-python-serialize" in configuration["accept_content"]
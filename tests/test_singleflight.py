@@ -0,0 +1,127 @@
+"""Unit tests for sharing the runs of identical programs."""
+
+from unittest.mock import Mock
+
+import pytest
+import redis
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.settings import config
+from matl_online.singleflight import SingleFlight, get_single_flight
+from matl_online.types import MATLExplainTaskParameters, MATLRunTaskParameters
+
+
+@pytest.fixture
+def client() -> Mock:
+    return Mock()
+
+
+def script(client: Mock) -> Mock:
+    script: Mock = client.register_script.return_value
+    return script
+
+
+class TestKey:
+    def test_identical(self) -> None:
+        params = MATLRunTaskParameters(code="1D", version="1.0.0", inputs="2")
+        key = SingleFlight.key(params)
+
+        assert key is not None and key.startswith("flight:")
+
+        # The session and encoding of the client don't matter
+        assert key == SingleFlight.key(
+            MATLRunTaskParameters(
+                code="1D", version="1.0.0", inputs="2", session_id="a", encoding="v1"
+            )
+        )
+
+    def test_different(self) -> None:
+        key = SingleFlight.key(MATLRunTaskParameters(code="1D", version="1.0.0"))
+
+        assert key != SingleFlight.key(
+            MATLRunTaskParameters(code="1D", version="1.0.0", inputs="2")
+        )
+        assert key != SingleFlight.key(
+            MATLRunTaskParameters(code="1D", version="2.0.0")
+        )
+
+    @pytest.mark.parametrize("code", ["1r", "3Xr", "5Yr", "Z'"])
+    def test_nondeterministic(self, code: str) -> None:
+        params = MATLRunTaskParameters(code=code, version="1.0.0")
+        assert SingleFlight.key(params) is None
+
+    @pytest.mark.parametrize(
+        "code", ["'hello world'", "'it''s r'", "1D % random", "'r'D", "X'"]
+    )
+    def test_literals(self, code: str) -> None:
+        """Functions only count outside of string literals and comments."""
+        params = MATLRunTaskParameters(code=code, version="1.0.0")
+        assert SingleFlight.key(params) is not None
+
+    def test_after_literal(self) -> None:
+        params = MATLRunTaskParameters(code="'abc'Z'", version="1.0.0")
+        assert SingleFlight.key(params) is None
+
+    def test_not_shared(self) -> None:
+        """Explanations and multi-case runs are never shared."""
+        assert (
+            SingleFlight.key(MATLExplainTaskParameters(code="1", version="1")) is None
+        )
+        assert (
+            SingleFlight.key(MATLRunTaskParameters(code="1", version="1", cases=("",)))
+            is None
+        )
+
+
+class TestSingleFlight:
+    def test_join(self, client: Mock) -> None:
+        flight = SingleFlight(client, ttl=60)
+
+        script(client).return_value = 0
+        assert not flight.join("flight:a", "room", "json")
+
+        script(client).assert_called_with(
+            keys=["flight:a", "flight:a:rooms"], args=["room", "json", 60]
+        )
+
+        script(client).return_value = 1
+        assert flight.join("flight:a", "other", "json")
+
+    def test_finish(self, client: Mock) -> None:
+        script(client).return_value = ["a", "json", "b", "v1"]
+
+        rooms = SingleFlight(client, ttl=60).finish("flight:a")
+        assert rooms == {"a": "json", "b": "v1"}
+
+    def test_leave(self, client: Mock) -> None:
+        """The run is only stopped once nobody is subscribed anymore."""
+        flight = SingleFlight(client, ttl=60)
+
+        script(client).return_value = None
+        assert flight.leave("flight:a", "room", "task") is None
+
+        script(client).return_value = "task"
+        assert flight.leave("flight:a", "room", "other") == "task"
+
+    def test_redis_unavailable(self, client: Mock) -> None:
+        """Every program is run separately if Redis can't be reached."""
+        script(client).side_effect = redis.ConnectionError()
+        client.hgetall.side_effect = redis.ConnectionError()
+
+        flight = SingleFlight(client, ttl=60)
+
+        assert not flight.join("flight:a", "room", "json")
+        assert flight.subscribers("flight:a") is None
+        assert flight.finish("flight:a") is None
+        assert flight.leave("flight:a", "room", "task") == "task"
+
+
+def test_get_single_flight(mocker: MockerFixture) -> None:
+    get_single_flight.cache_clear()
+    assert get_single_flight() is None
+
+    mocker.patch.object(config, "SINGLE_FLIGHT_REDIS_URL", "redis://localhost:6379/2")
+    get_single_flight.cache_clear()
+    assert isinstance(get_single_flight(), SingleFlight)
+
+    get_single_flight.cache_clear()
@@ -1,12 +1,17 @@
 """Unit tests for socket interaction between server and client."""
 
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+from unittest.mock import Mock
 
+import pytest
+from flask import Flask
 from flask_socketio import SocketIOTestClient  # type: ignore
 from flask_sqlalchemy import SQLAlchemy
 from pytest_mock.plugin import MockerFixture
 
+from matl_online.errors import Throttled
 from matl_online.extensions import socketio
+from matl_online.registry import TaskRegistry
 
 from .helpers import session_id_for_client
 
@@ -71,7 +76,7 @@ class TestSockets:
         socketio_client.get_received()
         # The task ID should be stored in the session
 
-        task = mocker.patch("matl_online.public.views.matl_task.delay")
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
 
         task_id = "12345"
         task.return_value = type("obj", (object,), {"id": task_id})
@@ -87,6 +92,301 @@ class TestSockets:
 
         assert task.call_count == 1
         assert session(socketio_client).get("taskid") == task_id
+        assert task.call_args.args[0][0].encoding == "json"
+
+    @pytest.mark.parametrize(
+        "encoding, expected",
+        [("msgpack", "msgpack"), ("json", "json"), ("unknown", "json")],
+    )
+    def test_submit_encoding(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+        encoding: str,
+        expected: str,
+    ) -> None:
+        """Clients may request a compact encoding of the output frames."""
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+
+        socketio_client.emit(
+            "submit",
+            {
+                "uid": session_id_for_client(socketio_client),
+                "code": "0",
+                "encoding": encoding,
+            },
+        )
+
+        assert task.call_args.args[0][0].encoding == expected
+
+    def test_submit_throttled(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Rejected submissions complete right away with an explanation."""
+        socketio_client.get_received()
+
+        throttle = mocker.patch("matl_online.public.views.get_throttle").return_value
+        throttle.acquire.side_effect = Throttled("Too many submissions")
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+
+        socketio_client.emit(
+            "submit",
+            {"uid": session_id_for_client(socketio_client), "code": "0"},
+        )
+
+        task.assert_not_called()
+
+        events = socketio_client.get_received()
+        assert events[-1]["name"] == "complete"
+        assert events[-1]["args"][0] == {
+            "success": False,
+            "message": "Too many submissions",
+            "throttled": True,
+        }
+
+    def test_submit_tracked(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Accepted submissions count against the client until they finish."""
+        throttle = mocker.patch("matl_online.public.views.get_throttle").return_value
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+        task.return_value.id = "12345"
+
+        socketio_client.emit(
+            "submit",
+            {"uid": session_id_for_client(socketio_client), "code": "0"},
+        )
+
+        # The task is counted before it is queued (under its ID)
+        address = task.call_args.args[0][0].client
+        (task_id,) = throttle.acquire.call_args.args[2]
+
+        assert throttle.acquire.call_args.args[1] == address
+        assert task.call_args.kwargs["task_id"] == task_id
+
+    def test_submit_shared(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """The first of several identical submissions runs the program."""
+        flight = mocker.patch("matl_online.public.views.get_single_flight").return_value
+        flight.join.return_value = False
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+        task.return_value.id = "12345"
+
+        uid = session_id_for_client(socketio_client)
+        socketio_client.emit("submit", {"uid": uid, "code": "0"})
+
+        params = task.call_args.args[0][0]
+        assert params.shared_key is not None
+
+        flight.join.assert_called_once_with(params.shared_key, uid, "json")
+        flight.set_task.assert_called_once_with(params.shared_key, "12345")
+
+    def test_submit_shared_failure(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Shared runs which couldn't be queued are ended right away."""
+        flight = mocker.patch("matl_online.public.views.get_single_flight").return_value
+        flight.join.return_value = False
+        throttle = mocker.patch("matl_online.public.views.get_throttle").return_value
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+        task.side_effect = ConnectionError()
+
+        uid = session_id_for_client(socketio_client)
+        with pytest.raises(ConnectionError):
+            socketio_client.emit("submit", {"uid": uid, "code": "0"})
+
+        key = flight.join.call_args.args[0]
+        flight.finish.assert_called_once_with(key)
+        flight.set_task.assert_not_called()
+
+        (task_id,) = throttle.acquire.call_args.args[2]
+        throttle.release.assert_called_once_with(
+            throttle.acquire.call_args.args[1], task_id
+        )
+
+    def test_submit_joined(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Identical submissions receive the output of the running program."""
+        flight = mocker.patch("matl_online.public.views.get_single_flight").return_value
+        flight.join.return_value = True
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+
+        socketio_client.emit(
+            "submit", {"uid": session_id_for_client(socketio_client), "code": "0"}
+        )
+
+        task.assert_not_called()
+        assert session(socketio_client).get("taskid") is None
+        assert session(socketio_client).get("shared_key") is not None
+
+    def test_submit_joined_released(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Joining a shared run doesn't count against the client."""
+        flight = mocker.patch("matl_online.public.views.get_single_flight").return_value
+        flight.join.return_value = True
+        throttle = mocker.patch("matl_online.public.views.get_throttle").return_value
+
+        socketio_client.emit(
+            "submit", {"uid": session_id_for_client(socketio_client), "code": "0"}
+        )
+
+        (task_id,) = throttle.acquire.call_args.args[2]
+        throttle.release.assert_called_once_with(
+            throttle.acquire.call_args.args[1], task_id
+        )
+
+    def test_kill_shared_task(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Shared runs keep going while other clients are subscribed."""
+        flight = mocker.patch("matl_online.public.views.get_single_flight").return_value
+        flight.join.return_value = True
+        flight.leave.return_value = None
+        revoke = mocker.patch("matl_online.public.views.celery.control.revoke")
+
+        uid = session_id_for_client(socketio_client)
+        socketio_client.emit("submit", {"uid": uid, "code": "0"})
+        socketio_client.get_received()
+
+        key = session(socketio_client).get("shared_key")
+        socketio_client.emit("kill", {})
+
+        flight.leave.assert_called_once_with(key, uid, None)
+        revoke.assert_not_called()
+
+        # The client is told that its run was stopped regardless
+        payload = socketio_client.get_received()[-1]["args"][0]
+        assert payload.get("message") == "User terminated the job"
+
+    def test_submit_registered(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Submitted tasks are recorded for every web process."""
+        registry = mocker.patch("matl_online.public.views.get_task_registry")
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+        task.return_value.id = "12345"
+
+        uid = session_id_for_client(socketio_client)
+        socketio_client.emit("submit", {"uid": uid, "code": "0"})
+
+        registry.return_value.register.assert_called_once_with(
+            uid, "12345", None, mocker.ANY
+        )
+
+    def test_kill_task_registered(
+        self,
+        socketio_client: SocketIOTestClient,
+        mocker: MockerFixture,
+    ) -> None:
+        """Tasks submitted through another web process are killed as well."""
+        socketio_client.get_received()
+
+        registry = mocker.patch("matl_online.public.views.get_task_registry")
+        registry.return_value.lookup.return_value = {
+            "task": "12345",
+            "shared_key": None,
+        }
+        revoke = mocker.patch("matl_online.public.views.celery.control.revoke")
+
+        # This process never saw the submission
+        assert session(socketio_client).get("taskid") is None
+
+        uid = session_id_for_client(socketio_client)
+        socketio_client.emit("kill", {"uid": uid})
+
+        registry.return_value.lookup.assert_called_once_with(uid)
+        registry.return_value.forget.assert_called_once_with(uid)
+        revoke.assert_called_once_with("12345", terminate=True, signal="SIGUSR2")
+
+    @pytest.fixture
+    def registry(self, mocker: MockerFixture) -> TaskRegistry:
+        """A registry whose Redis remembers the last entry."""
+        client = Mock()
+        registry = TaskRegistry(client, ttl=60)
+
+        def register(name: str, mapping: Dict[str, str]) -> None:
+            client.hgetall.return_value = mapping
+
+        client.pipeline.return_value.hset.side_effect = register
+        mocker.patch(
+            "matl_online.public.views.get_task_registry", return_value=registry
+        )
+        return registry
+
+    def test_kill_task_reconnected(
+        self,
+        app: Flask,
+        socketio_client: SocketIOTestClient,
+        registry: TaskRegistry,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Tasks can be killed from a new connection with their token."""
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+        task.return_value.id = "12345"
+        revoke = mocker.patch("matl_online.public.views.celery.control.revoke")
+
+        uid = session_id_for_client(socketio_client)
+        ack = socketio_client.emit("submit", {"uid": uid, "code": "0"}, callback=True)
+        socketio_client.disconnect()
+
+        reconnected = SocketIOTestClient(app, socketio)
+        assert session_id_for_client(reconnected) != uid
+
+        reconnected.emit("kill", {"uid": uid, "token": ack["token"]})
+
+        revoke.assert_called_once_with("12345", terminate=True, signal="SIGUSR2")
+
+    @pytest.mark.parametrize("token", [None, "", "guessed"])
+    def test_kill_task_other_room(
+        self,
+        app: Flask,
+        socketio_client: SocketIOTestClient,
+        registry: TaskRegistry,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+        token: Optional[str],
+    ) -> None:
+        """Clients can't kill the tasks of other rooms without their token."""
+        task = mocker.patch("matl_online.public.views.matl_task.apply_async")
+        task.return_value.id = "12345"
+        revoke = mocker.patch("matl_online.public.views.celery.control.revoke")
+
+        uid = session_id_for_client(socketio_client)
+        socketio_client.emit("submit", {"uid": uid, "code": "0"})
+
+        other = SocketIOTestClient(app, socketio)
+        other.emit("kill", {"uid": uid, "token": token})
+
+        revoke.assert_not_called()
 
     def test_kill_task_no_task(
         self,
@@ -136,7 +436,7 @@ class TestSockets:
         socketio_client.emit("kill", {})
 
         # Make sure that a message was sent to kill the tasks
-        revoke.assert_called_once_with(taskid, terminate=True, signal="SIGTERM")
+        revoke.assert_called_once_with(taskid, terminate=True, signal="SIGUSR2")
 
         received = socketio_client.get_received()
 
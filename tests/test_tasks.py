@@ -1,17 +1,32 @@
 """Unit tests for basic celery task functionality."""
 
 import pathlib
-from typing import Callable
+import signal
+from collections import Counter
+from typing import Callable, Optional
 from unittest.mock import Mock
 
 import pytest
 from celery.exceptions import SoftTimeLimitExceeded
 from flask_socketio import SocketIO, SocketIOTestClient  # type: ignore[import]
+from flask_sqlalchemy import SQLAlchemy
+from prometheus_client import REGISTRY
 from pytest_mock.plugin import MockerFixture
 
-from matl_online.tasks import OctaveTask, _initialize_process, matl_task
+from matl_online import tasks
+from matl_online.errors import MissingDirectory, TaskCancelled
+from matl_online.settings import config
+from matl_online.tasks import (
+    OctaveTask,
+    _cancel,
+    _initialize_process,
+    matl_task,
+    warm_up,
+    warm_up_versions,
+)
 from matl_online.types import MATLRunTaskParameters
 
+from .factories import ReleaseFactory
 from .helpers import session_id_for_client
 
 
@@ -20,12 +35,48 @@ class TestOctaveTask:
 
     def test_on_term(self, octave_mock: Mock) -> None:
         """Ensure cleanup is performed as expected when a task is terminated."""
+        octave_mock.alive = False
         task = OctaveTask()
 
         task.on_term()
 
         octave_mock.restart.assert_called_once()
 
+    def test_on_term_interrupted(self, octave_mock: Mock) -> None:
+        """Octave isn't restarted if the program was interrupted."""
+        octave_mock.alive = True
+        restarted = REGISTRY.get_sample_value(
+            "matl_octave_recoveries_total", {"outcome": "restarted"}
+        )
+
+        OctaveTask().on_term()
+
+        octave_mock.restart.assert_not_called()
+        assert REGISTRY.get_sample_value(
+            "matl_octave_recoveries_total", {"outcome": "interrupted"}
+        )
+        assert restarted == REGISTRY.get_sample_value(
+            "matl_octave_recoveries_total", {"outcome": "restarted"}
+        )
+
+    def test_after_return(self, mocker: MockerFixture) -> None:
+        """Finished tasks stop counting against the client."""
+        throttle = mocker.patch("matl_online.tasks.get_throttle").return_value
+        params = MATLRunTaskParameters(code="1D", version="1", client="1.2.3.4")
+
+        OctaveTask().after_return("SUCCESS", None, "12345", (params,), {}, None)
+
+        throttle.release.assert_called_once_with("1.2.3.4", "12345")
+
+    def test_on_term_warm_up(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        """Octave is warmed up again after being restarted."""
+        octave_mock.alive = False
+        warm_up_mock = mocker.patch("matl_online.tasks.warm_up")
+
+        OctaveTask().on_term()
+
+        warm_up_mock.assert_called_once_with(octave_mock)
+
 
 def _get_socketio_for_client(client: SocketIOTestClient) -> Callable[[], SocketIO]:
     return lambda: client.socketio
@@ -49,6 +100,113 @@ class TestProcessInitialization:
         patch.assert_called_once()
 
 
+class TestCancel:
+    def test_running(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(matl_task, "running", True)
+
+        with pytest.raises(TaskCancelled):
+            _cancel(signal.SIGUSR2, None)
+
+    def test_idle(self, mocker: MockerFixture) -> None:
+        """A signal arriving after the task finished is ignored."""
+        mocker.patch.object(matl_task, "running", False)
+
+        _cancel(signal.SIGUSR2, None)
+
+
+class TestWarmUp:
+    @pytest.fixture(autouse=True)
+    def warm_up_config(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "MATL_WARMUP_CODE", "1D")
+        mocker.patch.object(config, "MATL_WARMUP_POPULAR_VERSIONS", 2)
+        mocker.patch.object(tasks, "version_usage", Counter())
+        mocker.patch.object(config, "MATL_WARMUP_TIMEOUT", 15)
+        mocker.patch("matl_online.tasks.get_matl_folder")
+
+    def test_latest_version(self, db: SQLAlchemy) -> None:
+        ReleaseFactory.create(tag="1.0.0")
+        ReleaseFactory.create(tag="2.0.0")
+
+        assert warm_up_versions() == ["2.0.0"]
+
+    def test_popular_versions(self, db: SQLAlchemy) -> None:
+        ReleaseFactory.create(tag="2.0.0")
+
+        tasks.version_usage.update(["1.0.0"] * 3 + ["1.5.0"] * 2 + ["0.1.0"])
+
+        assert warm_up_versions() == ["2.0.0", "1.0.0", "1.5.0"]
+
+    def test_no_database(self, mocker: MockerFixture) -> None:
+        """The warm-up still works if the releases are not available."""
+        tasks.version_usage.update(["1.0.0"])
+
+        assert warm_up_versions() == ["1.0.0"]
+
+    def test_warm_up(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        mocker.patch("matl_online.tasks.warm_up_versions", return_value=["1", "2"])
+        matl = mocker.patch("matl_online.tasks.matl")
+
+        warm_up(octave_mock)
+
+        assert matl.call_count == 2
+
+        params = matl.call_args[0][1]
+        assert params.code == "1D"
+        assert params.version == "2"
+
+    def test_warm_up_failure(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        """Failure to warm up one version does not prevent the others."""
+        mocker.patch("matl_online.tasks.warm_up_versions", return_value=["1", "2"])
+        matl = mocker.patch("matl_online.tasks.matl", side_effect=Exception)
+
+        warm_up(octave_mock)
+
+        assert matl.call_count == 2
+
+    def test_not_installed(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        """Versions are never downloaded to warm them up."""
+        mocker.patch("matl_online.tasks.warm_up_versions", return_value=["1", "2"])
+        mocker.patch(
+            "matl_online.tasks.get_matl_folder",
+            side_effect=[MissingDirectory(), pathlib.Path("2")],
+        )
+        matl = mocker.patch("matl_online.tasks.matl")
+
+        warm_up(octave_mock)
+
+        assert matl.call_count == 1
+        assert matl.call_args[0][1].version == "2"
+
+    def test_timeout(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        """No more versions are warmed up once the time is up."""
+        mocker.patch("matl_online.tasks.warm_up_versions", return_value=["1", "2"])
+        mocker.patch("matl_online.tasks.time.monotonic", side_effect=[0, 1, 16])
+        matl = mocker.patch("matl_online.tasks.matl")
+
+        warm_up(octave_mock)
+
+        assert matl.call_count == 1
+        assert matl.call_args[0][1].version == "1"
+
+    def test_disabled(self, octave_mock: Mock, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "MATL_WARMUP_CODE", "")
+        matl = mocker.patch("matl_online.tasks.matl")
+
+        warm_up(octave_mock)
+
+        matl.assert_not_called()
+
+    def test_process_initialization(
+        self, octave_mock: Mock, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("matl_online.tasks.OctaveSession", return_value=octave_mock)
+        warm_up_mock = mocker.patch("matl_online.tasks.warm_up")
+
+        _initialize_process()
+
+        warm_up_mock.assert_called_once_with(octave_mock)
+
+
 class TestMATLTask:
     """Tests for the MATLTask subclass of OctaveTask."""
 
@@ -206,3 +364,94 @@ class TestMATLTask:
         assert payload["data"][0]["value"] == "Operation timed out"
 
         assert received[-1]["args"][0] == {"success": False}
+
+    def test_cancelled(
+        self,
+        mocker: MockerFixture,
+        octave_mock: Mock,
+        socketio_client: SocketIOTestClient,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """Cancelled programs are interrupted without restarting Octave."""
+        socketio_client.get_received()
+
+        mocker.patch(
+            "matl_online.tasks.socket",
+            new_callable=_get_socketio_for_client(socketio_client),
+        )
+
+        ev = mocker.patch("matl_online.tasks.matl_task.octave.run")
+        ev.side_effect = [TaskCancelled, ""]
+
+        mocker.patch("matl_online.matl.core.get_matl_folder", return_value=tmp_path)
+
+        matl_task.apply(
+            args=(
+                MATLRunTaskParameters(
+                    code="1D",
+                    version="20.0.0",
+                    session_id=session_id_for_client(socketio_client),
+                ),
+            ),
+        )
+
+        received = socketio_client.get_received()
+
+        assert received[0]["args"][0]["data"][0]["value"] == "Job cancelled"
+        assert received[-1]["args"][0] == {"success": False}
+
+        assert ev.call_args.args == ("matlCleanup",)
+        octave_mock.restart.assert_not_called()
+
+    def test_output_limit(
+        self,
+        mocker: MockerFixture,
+        octave_mock: Mock,
+        socketio_client: SocketIOTestClient,
+        tmp_path: pathlib.Path,
+    ) -> None:
+        """Programs producing too much output are stopped but still succeed."""
+        socketio_client.get_received()
+
+        mocker.patch(
+            "matl_online.tasks.socket",
+            new_callable=_get_socketio_for_client(socketio_client),
+        )
+        mocker.patch.object(config, "MATL_OUTPUT_STOP_BYTES", 100)
+
+        def run(
+            *args: str, line_handler: Optional[Callable[[str], None]] = None
+        ) -> str:
+            while line_handler is not None:
+                line_handler("spam")
+
+            return ""
+
+        ev = mocker.patch("matl_online.tasks.matl_task.octave.run")
+        ev.side_effect = run
+
+        mocker.patch("matl_online.matl.core.get_matl_folder", return_value=tmp_path)
+
+        matl_task.apply(
+            args=(
+                MATLRunTaskParameters(
+                    code="1D",
+                    version="20.0.0",
+                    session_id=session_id_for_client(socketio_client),
+                ),
+            ),
+        )
+
+        # The program was interrupted, which leaves Octave ready to be used
+        octave_mock.restart.assert_not_called()
+        assert ev.call_args.args == ("matlCleanup",)
+
+        received = socketio_client.get_received()
+
+        payload = received[-2]["args"][0]
+        assert payload["data"][-1] == {
+            "type": "stderr",
+            "value": "Output limit exceeded",
+        }
+
+        assert received[-1]["args"][0] == {"message": "", "success": True}
@@ -0,0 +1,122 @@
+"""Unit tests for rate limiting the submissions of clients."""
+
+from unittest.mock import Mock
+
+import pytest
+import redis
+from pytest_mock.plugin import MockerFixture
+
+from matl_online.errors import Throttled
+from matl_online.settings import config
+from matl_online.throttle import SubmissionThrottle, get_throttle
+
+
+@pytest.fixture
+def client() -> Mock:
+    client = Mock()
+    client.register_script.return_value.return_value = [b"ok", b"0"]
+    return client
+
+
+def admit(client: Mock) -> Mock:
+    script: Mock = client.register_script.return_value
+    return script
+
+
+def throttle(
+    client: Mock, rate: float = 1.0, max_in_flight: int = 2
+) -> SubmissionThrottle:
+    return SubmissionThrottle(
+        client,
+        rate=rate,
+        burst=3,
+        max_in_flight=max_in_flight,
+        in_flight_ttl=60,
+        batch_max_in_flight=10,
+        batch_ttl=300,
+    )
+
+
+class TestSubmissionThrottle:
+    def test_allowed(self, client: Mock) -> None:
+        """Checking and counting the tasks happens at once."""
+        throttle(client).acquire("session", "1.2.3.4", ["task"])
+
+        admit(client).assert_called_once_with(
+            keys=[
+                "throttle:in_flight:1.2.3.4",
+                "throttle:session:session",
+                "throttle:address:1.2.3.4",
+            ],
+            args=[1.0, 3, 2, 60, "task"],
+        )
+
+    def test_rate(self, client: Mock) -> None:
+        """Clients without tokens are told how long to wait."""
+        admit(client).return_value = [b"rate", b"1.2"]
+
+        with pytest.raises(Throttled, match="try again in 2 seconds"):
+            throttle(client).acquire("session", "1.2.3.4", ["task"])
+
+    def test_in_flight(self, client: Mock) -> None:
+        admit(client).return_value = [b"in_flight", b"0"]
+
+        with pytest.raises(Throttled, match="Only 2 programs"):
+            throttle(client).acquire("session", "1.2.3.4", ["task"])
+
+    def test_batch(self, client: Mock) -> None:
+        """Batches have a limit of their own and no session."""
+        throttle(client).acquire(None, "1.2.3.4", ["a", "b"], batch=True)
+
+        admit(client).assert_called_once_with(
+            keys=["throttle:in_flight:1.2.3.4", "throttle:address:1.2.3.4"],
+            args=[1.0, 3, 10, 300, "a", "b"],
+        )
+
+    def test_disabled_limits(self, client: Mock) -> None:
+        throttle(client, rate=0, max_in_flight=0).acquire("session", "1.2.3.4", ["a"])
+
+        admit(client).assert_called_once_with(
+            keys=["throttle:in_flight:1.2.3.4"], args=[0, 3, 0, 60, "a"]
+        )
+
+    def test_redis_unavailable(self, client: Mock) -> None:
+        """Submissions are allowed if Redis can't be reached."""
+        admit(client).side_effect = redis.ConnectionError()
+
+        throttle(client).acquire("session", "1.2.3.4", ["task"])
+
+    def test_release(self, client: Mock) -> None:
+        throttle(client).release("1.2.3.4", "task")
+
+        client.zrem.assert_called_once_with("throttle:in_flight:1.2.3.4", "task")
+
+    def test_unknown_address(self, client: Mock) -> None:
+        """Tasks of clients without an address are never counted."""
+        limiter = throttle(client)
+
+        limiter.acquire("session", None, ["task"])
+        limiter.release(None, "task")
+
+        assert admit(client).call_args.kwargs["args"][2] == 0
+        client.zrem.assert_not_called()
+
+
+class TestGetThrottle:
+    def test_disabled(self) -> None:
+        get_throttle.cache_clear()
+        assert get_throttle() is None
+
+    def test_enabled(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(config, "SUBMIT_RATE", 1.0)
+        from_url = mocker.patch("redis.Redis.from_url")
+
+        get_throttle.cache_clear()
+
+        try:
+            limiter = get_throttle()
+        finally:
+            get_throttle.cache_clear()
+
+        assert limiter is not None
+        assert limiter.client == from_url.return_value
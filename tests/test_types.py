@@ -44,6 +44,13 @@ class TestMATLTaskParameters:
         # The code lines are as expected
         assert params.code_lines == ["input1", " input2"]
 
+    def test_cases(self) -> None:
+        # Given params with the inputs of several cases
+        params = MATLTaskParameters(code="", version="", cases=("1\n2", "", "3"))
+
+        # Each case has its own input lines
+        assert params.case_input_lines == [["1", "2"], [], ["3"]]
+
 
 class TestMATLRunTaskParameters:
     def test_flags(self) -> None:
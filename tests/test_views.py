@@ -3,12 +3,20 @@
 import json
 import operator
 import pathlib
+from typing import Any, Dict, List
+from unittest.mock import Mock
 
+import redis
+from celery.exceptions import SoftTimeLimitExceeded
 from flask import Flask, url_for
 from flask_sqlalchemy import SQLAlchemy
 from pytest_mock.plugin import MockerFixture
 from webtest import TestApp  # type: ignore
 
+from matl_online.artifacts import LocalArtifactStore, RedisArtifactStore
+from matl_online.errors import Throttled
+from matl_online.matl.io import FrameDecoder
+from matl_online.public.cache import invalidate
 from matl_online.public.models import Release
 
 from .factories import ReleaseFactory
@@ -90,6 +98,77 @@ class TestShare:
         assert response.json.get("success") is False
 
 
+class TestArtifacts:
+    """Tests the /artifacts route for serving program output."""
+
+    def test_artifact(
+        self, testapp: TestApp, mocker: MockerFixture, tmp_path: pathlib.Path
+    ) -> None:
+        store = LocalArtifactStore(tmp_path, ttl=60)
+        mocker.patch("matl_online.public.views.get_artifact_store", return_value=store)
+
+        url = store.put(b"image", ".png")
+        response = testapp.get(url)
+
+        assert response.status_code == 200
+        assert response.body == b"image"
+        assert response.content_type == "image/png"
+        assert "immutable" in response.headers["Cache-Control"]
+
+        # Browsers are able to revalidate their cached copy
+        response = testapp.get(url, headers={"If-None-Match": response.headers["ETag"]})
+
+        assert response.status_code == 304
+
+    def test_missing_artifact(
+        self, testapp: TestApp, mocker: MockerFixture, tmp_path: pathlib.Path
+    ) -> None:
+        store = LocalArtifactStore(tmp_path, ttl=60)
+        mocker.patch("matl_online.public.views.get_artifact_store", return_value=store)
+
+        url = url_for("public.artifact", key="0" * 64 + ".png")
+        response = testapp.get(url, expect_errors=True)
+
+        assert response.status_code == 404
+
+    def test_artifact_redis_unavailable(
+        self, testapp: TestApp, mocker: MockerFixture
+    ) -> None:
+        """Artifacts which can't be retrieved are reported as missing."""
+        mocker.patch("redis.Redis.from_url").return_value.get.side_effect = (
+            redis.ConnectionError()
+        )
+        store = RedisArtifactStore("redis://localhost", ttl=60)
+        mocker.patch("matl_online.public.views.get_artifact_store", return_value=store)
+
+        url = url_for("public.artifact", key="0" * 64 + ".png")
+        response = testapp.get(url, expect_errors=True)
+
+        assert response.status_code == 404
+
+    def test_invalid_key(self, testapp: TestApp) -> None:
+        url = url_for("public.artifact", key="database.db")
+        response = testapp.get(url, expect_errors=True)
+
+        assert response.status_code == 404
+
+    def test_share_artifact(
+        self, testapp: TestApp, mocker: MockerFixture, tmp_path: pathlib.Path
+    ) -> None:
+        """Images are uploaded to imgur directly from the artifact store."""
+        mocker.patch("matl_online.public.views.validate_csrf")
+
+        store = LocalArtifactStore(tmp_path, ttl=60)
+        mocker.patch("matl_online.public.views.get_artifact_store", return_value=store)
+
+        post = mocker.patch("matl_online.public.views.requests.post")
+        post.return_value.text = json.dumps({"success": True, "data": {"link": ""}})
+
+        testapp.post(url_for("public.share", data=store.put(b"image", ".png")))
+
+        assert post.call_args.args[1] == {"image": "aW1hZ2U=", "type": "base64"}
+
+
 class TestHome:
     """Test the main page of the site."""
 
@@ -125,7 +204,39 @@ class TestHome:
         releases = Release.query.all()
         releases = sorted(releases, key=operator.attrgetter("tag"))
 
-        assert versions == releases
+        assert [(v.tag, v.date) for v in versions] == [
+            (r.tag, r.date) for r in releases
+        ]
+        assert params.get("latest") == latest_release.tag
+        assert str(params.get("versions_menu")).count('class="version"') == 10
+
+    def test_cached_versions(
+        self,
+        testapp: TestApp,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """The versions are only queried once while they are cached."""
+        mocker.patch.dict(testapp.app.config, {"PAGE_CACHE_TTL": 60})
+        invalidate()
+        ReleaseFactory.create_batch(size=3)  # type: ignore[attr-defined]
+
+        render = mocker.patch("matl_online.public.views.render_template")
+        render.return_value = ""
+        query = mocker.spy(Release, "versions")
+
+        testapp.get(url_for("public.home"))
+        testapp.get(url_for("public.home", version="not a version"))
+
+        assert query.call_count == 1
+        assert len(render.call_args.kwargs["versions"]) == 3
+
+        # Clearing the cache queries the versions again
+        invalidate()
+        testapp.get(url_for("public.home"))
+
+        assert query.call_count == 2
+        invalidate()
 
     def test_non_existent_version(
         self,
@@ -242,6 +353,155 @@ class TestExplain:
         assert task.call_args[0][0].version == releases[-1].tag
 
 
+class TestRunAPI:
+    """Test the /api/run route for running batches of programs."""
+
+    @staticmethod
+    def fake_matl(octave: Mock, params: Any, line_handler: Any, **kwargs: Any) -> None:
+        """Print the code and inputs of each program instead of running it."""
+        if params.code == "timeout":
+            raise SoftTimeLimitExceeded()
+
+        line_handler(f"{params.code} {params.inputs} {params.version}")
+
+        decoder = FrameDecoder(kwargs["token"])
+
+        for index, inputs in enumerate(params.cases):
+            line_handler(decoder.encode("CASE", str(index)))
+            line_handler(inputs)
+
+    def test_run(
+        self,
+        testapp: TestApp,
+        mocker: MockerFixture,
+        octave_mock: Mock,
+        db: SQLAlchemy,
+    ) -> None:
+        """Each program is run and returns its output and timing."""
+        ReleaseFactory.create(tag="1.0.0")
+        ReleaseFactory.create(tag="2.0.0")
+        emit = mocker.patch("matl_online.tasks.emitter")
+        mocker.patch("matl_online.tasks.matl", side_effect=self.fake_matl)
+
+        programs = [
+            {"code": "1D", "inputs": "3", "version": "1.0.0"},
+            {"code": "2D", "inputs": ["4", "5"]},
+            {"code": "timeout"},
+        ]
+
+        resp = testapp.post_json(url_for("public.run_programs"), {"programs": programs})
+
+        assert resp.status_code == 200
+
+        results = resp.json["results"]
+        assert len(results) == 3
+
+        assert results[0]["success"]
+        assert results[0]["output"] == [{"type": "stdout", "value": "1D 3 1.0.0"}]
+        assert results[0]["time"] >= 0
+
+        # The latest version is used by default
+        assert results[1]["output"] == [{"type": "stdout", "value": "2D 4\n5 2.0.0"}]
+
+        assert results[2] == {"success": False, "error": "SoftTimeLimitExceeded()"}
+
+        # Nothing is sent over the sockets
+        emit.emit.assert_not_called()
+        emit.emit_frame.assert_not_called()
+
+    def test_cases(
+        self,
+        testapp: TestApp,
+        mocker: MockerFixture,
+        octave_mock: Mock,
+        db: SQLAlchemy,
+    ) -> None:
+        """The output of each case is reported separately."""
+        ReleaseFactory.create(tag="1.0.0")
+        mocker.patch("matl_online.tasks.matl", side_effect=self.fake_matl)
+
+        programs = [{"code": "1D", "cases": ["3", ["4", "5"]]}]
+
+        resp = testapp.post_json(url_for("public.run_programs"), {"programs": programs})
+
+        (result,) = resp.json["results"]
+        assert result["output"] == [{"type": "stdout", "value": "1D  1.0.0"}]
+        assert [case["output"] for case in result["cases"]] == [
+            [{"type": "stdout", "value": "3"}],
+            [{"type": "stdout", "value": "4\n5"}],
+        ]
+
+    def test_invalid(self, testapp: TestApp, db: SQLAlchemy) -> None:
+        url = url_for("public.run_programs")
+
+        payloads: List[Dict[str, Any]] = [
+            {},
+            {"programs": []},
+            {"programs": [{"inputs": "1"}]},
+            {"programs": [{"code": "1", "inputs": 2}]},
+            {"programs": [{"code": "1", "cases": "1"}]},
+        ]
+
+        for payload in payloads:
+            assert testapp.post_json(url, payload, status=400).status_code == 400
+
+    def test_throttled(
+        self,
+        testapp: TestApp,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        """Batches count against the client like any other submission."""
+        throttle = mocker.patch("matl_online.public.views.get_throttle").return_value
+        throttle.acquire.side_effect = Throttled("Only 500 programs may run at once")
+        task = mocker.patch("matl_online.public.views.matl_task")
+
+        resp = testapp.post_json(
+            url_for("public.run_programs"),
+            {"programs": [{"code": "1"}, {"code": "2"}]},
+            status=429,
+        )
+
+        assert resp.status_code == 429
+        assert len(throttle.acquire.call_args.args[2]) == 2
+        assert throttle.acquire.call_args.kwargs == {"batch": True}
+        task.s.assert_not_called()
+
+    def test_released(
+        self,
+        testapp: TestApp,
+        mocker: MockerFixture,
+        octave_mock: Mock,
+        db: SQLAlchemy,
+    ) -> None:
+        """The tasks of a batch are released as they finish."""
+        ReleaseFactory.create(tag="1.0.0")
+        mocker.patch("matl_online.tasks.matl", side_effect=self.fake_matl)
+        throttle = mocker.patch("matl_online.public.views.get_throttle").return_value
+        release = mocker.patch("matl_online.tasks.get_throttle").return_value.release
+
+        testapp.post_json(url_for("public.run_programs"), {"programs": [{"code": "1"}]})
+
+        (task_id,) = throttle.acquire.call_args.args[2]
+        release.assert_called_once_with(throttle.acquire.call_args.args[1], task_id)
+
+    def test_too_many(
+        self,
+        app: Flask,
+        testapp: TestApp,
+        mocker: MockerFixture,
+        db: SQLAlchemy,
+    ) -> None:
+        mocker.patch.dict(app.config, {"API_MAX_PROGRAMS": 2})
+        programs = [{"code": "1"}] * 3
+
+        resp = testapp.post_json(
+            url_for("public.run_programs"), {"programs": programs}, status=413
+        )
+
+        assert resp.status_code == 413
+
+
 def test_fetch_help(
     testapp: TestApp,
     mocker: MockerFixture,
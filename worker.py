@@ -3,12 +3,22 @@
 """Worker module for creating celery workers."""
 
 from matl_online.app import celery, create_app
-from typing import Any
+from typing import Any, Dict
 from matl_online.settings import config
 
 from pathlib import Path
 
-from celery.signals import heartbeat_sent, worker_ready, worker_shutdown
+from celery.signals import (
+    heartbeat_sent,
+    worker_ready,
+    worker_shutdown,
+    worker_shutting_down,
+)
+from celery.worker.consumer import Consumer
+from celery.worker.control import control_command, inspect_command
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+from matl_online.readiness import ReadinessStep, WorkerReadiness, process_states
 
 app = create_app(config)
 app.app_context().push()
@@ -18,18 +28,64 @@ celery.conf.update(app.config)
 HEARTBEAT_FILE = Path(config.CELERY_WORKER_HEARTBEAT_FILE)
 READINESS_FILE = Path(config.CELERY_WORKER_READINESS_FILE)
 
+readiness = WorkerReadiness(READINESS_FILE)
+
+
+class ReadinessTimer(ReadinessStep):
+    readiness = readiness
+
+
+celery.steps["consumer"].add(ReadinessTimer)
+
 
 @heartbeat_sent.connect
 def heartbeat(**_: Any) -> None:
     HEARTBEAT_FILE.touch()
 
 
+def start_metrics_server() -> None:
+    """Expose the metrics collected by all pool processes."""
+    if not config.CELERY_WORKER_METRICS_PORT:
+        return
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    start_http_server(config.CELERY_WORKER_METRICS_PORT, registry=registry)
+
+
 @worker_ready.connect
-def worker_ready_callback(**_: Any) -> None:
-    READINESS_FILE.touch()
+def worker_ready_callback(sender: Consumer, **_: Any) -> None:
+    readiness.consumer = sender
+    readiness.update()
+    start_metrics_server()
+
+
+@worker_shutting_down.connect
+def worker_shutting_down_callback(**_: Any) -> None:
+    # Stop routing traffic here as soon as a shutdown is requested
+    READINESS_FILE.unlink(missing_ok=True)
 
 
 @worker_shutdown.connect
 def worker_shutdown_callback(**_: Any) -> None:
     for f in (HEARTBEAT_FILE, READINESS_FILE):
-        f.unlink()
+        f.unlink(missing_ok=True)
+
+
+@control_command()  # type: ignore[untyped-decorator]
+def drain(state: Any, **_: Any) -> Dict[str, str]:
+    """Stop consuming, finish all in-flight runs and then exit."""
+    readiness.drain(state.consumer)
+    return {"ok": "draining"}
+
+
+@inspect_command()  # type: ignore[untyped-decorator]
+def octave_status(state: Any, **_: Any) -> Dict[str, Any]:
+    """Report the Octave session state of every pool process."""
+    return {
+        "draining": readiness.draining,
+        "processes": {
+            str(pid): None if status is None else status.value
+            for pid, status in process_states(readiness.pool_pids()).items()
+        },
+    }